@@ -1,8 +1,13 @@
 from django.contrib import admin
 
+from core.services import history, topics
+
 from .models import (
     TelegramUser,
     UserSettings,
+    ReminderSchedule,
+    SentReminder,
+    BotState,
     DailyEntry,
     QuestionTemplate,
     Answer,
@@ -10,6 +15,8 @@ from .models import (
     WeeklyCycle,
     NudgePhrase,
     StreakState,
+    StatsRollup,
+    TermCount,
 )
 
 
@@ -25,6 +32,26 @@ class UserSettingsAdmin(admin.ModelAdmin):
     list_filter = ("timezone", "morning_enabled", "evening_enabled")
 
 
+@admin.register(ReminderSchedule)
+class ReminderScheduleAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "next_run_at")
+    list_filter = ("kind",)
+    search_fields = ("user__username", "user__telegram_id")
+
+
+@admin.register(SentReminder)
+class SentReminderAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "local_date", "created_at")
+    list_filter = ("kind", "local_date")
+    search_fields = ("user__username", "user__telegram_id")
+
+
+@admin.register(BotState)
+class BotStateAdmin(admin.ModelAdmin):
+    list_display = ("telegram_id", "key", "updated_at")
+    search_fields = ("telegram_id", "key")
+
+
 @admin.register(DailyEntry)
 class DailyEntryAdmin(admin.ModelAdmin):
     list_display = ("user", "date", "completed_morning", "completed_evening", "mood")
@@ -41,10 +68,37 @@ class QuestionTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
-    list_display = ("daily_entry", "question", "created_at")
-    list_filter = ("created_at", "question__period")
+    list_display = ("daily_entry", "question", "period", "created_at")
+    list_filter = ("created_at", "period")
     search_fields = ("answer_text", "question_text", "daily_entry__user__username")
 
+    # правка ответа руками меняет день: пересчитываем темы и сбрасываем кэш «Истории»
+    @staticmethod
+    def _days(answers) -> set:
+        return set(answers.values_list("daily_entry__user_id", "daily_entry__date"))
+
+    @staticmethod
+    def _days_changed(days: set) -> None:
+        for user_id, day in days:
+            topics.refresh_day(user_id, day)
+            history.day_changed(user_id, day)
+
+    def save_model(self, request, obj, form, change):
+        # ответ могли перенести в другой день — старый день тоже пересчитываем
+        days = self._days(Answer.objects.filter(pk=obj.pk)) if change else set()
+        super().save_model(request, obj, form, change)
+        self._days_changed(days | self._days(Answer.objects.filter(pk=obj.pk)))
+
+    def delete_model(self, request, obj):
+        days = self._days(Answer.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        self._days_changed(days)
+
+    def delete_queryset(self, request, queryset):
+        days = self._days(queryset)
+        super().delete_queryset(request, queryset)
+        self._days_changed(days)
+
 
 @admin.register(WeeklyTask)
 class WeeklyTaskAdmin(admin.ModelAdmin):
@@ -71,3 +125,16 @@ class StreakStateAdmin(admin.ModelAdmin):
     list_display = ("user", "current_streak", "best_streak", "last_completed_date")
     list_filter = ("last_completed_date",)
     search_fields = ("user__username",)
+
+
+@admin.register(StatsRollup)
+class StatsRollupAdmin(admin.ModelAdmin):
+    list_display = ("user", "total_days", "days_any", "days_full", "weeks_total", "weeks_completed", "updated_at")
+    search_fields = ("user__username", "user__telegram_id")
+
+
+@admin.register(TermCount)
+class TermCountAdmin(admin.ModelAdmin):
+    list_display = ("user", "date", "term", "count")
+    list_filter = ("date",)
+    search_fields = ("term", "user__username", "user__telegram_id")
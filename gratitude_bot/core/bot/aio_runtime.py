@@ -0,0 +1,172 @@
+# gratitude_bot/core/bot/aio_runtime.py
+"""
+Asyncio-рантайм обработки обновлений (BOT_RUNTIME = "asyncio").
+
+Хендлеры PTB 13 синхронные и ходят в Django ORM, поэтому сами они
+выполняются в ограниченном пуле потоков (BOT_UPDATE_WORKERS), а очередь,
+ожидание и порядок держит event loop: на каждый чат — цепочка задач,
+следующее сообщение чата стартует только после предыдущего.
+
+В отличие от UpdatePipeline (core.bot.webhook) поток не закреплён за чатом:
+ожидающие чаты не занимают потоков, и медленный чат не задерживает
+соседей по хэшу. Тысячи открытых диалогов — это тысячи записей в словаре,
+а не тысячи потоков.
+
+Интерфейс тот же, что у UpdatePipeline (start/stop/join/submit/submit_json),
+плюс run_polling() для запуска без webhook.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from telegram import Update
+from telegram.error import NetworkError, TimedOut
+
+from core.bot.webhook import PipelineFull, UpdatePipeline
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUpdateRuntime:
+    def __init__(self, dispatcher, workers: int = 8, queue_size: int = 1000):
+        self.dispatcher = dispatcher
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bot-aio")
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        # chat key -> последняя задача цепочки этого чата
+        self._chains: dict[int, asyncio.Task] = {}
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._idle: asyncio.Event | None = None
+
+    # --- жизненный цикл (loop в отдельном потоке, чтобы submit можно было звать из view) ---
+
+    def start(self) -> "AsyncUpdateRuntime":
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._idle = asyncio.Event()
+            self._idle.set()
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="bot-aio-loop", daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info("Asyncio update runtime started (workers=%s)", self.workers)
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        if self._loop is None:
+            return
+        self.join()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        self._loop = None
+        if self.dispatcher.persistence:
+            self.dispatcher.persistence.flush()
+
+    def join(self) -> None:
+        """
+        Дождаться, пока все уже принятые обновления будут обработаны.
+        """
+        asyncio.run_coroutine_threadsafe(self._wait_idle(), self._loop).result()
+
+    async def _wait_idle(self) -> None:
+        await self._idle.wait()
+
+    # --- приём обновлений ---
+
+    def submit(self, update: Update) -> None:
+        """
+        Потокобезопасно поставить обновление в обработку.
+        """
+        with self._pending_lock:
+            if self._pending >= self.queue_size:
+                raise PipelineFull(f"update queue is full (update_id={update.update_id})")
+            self._pending += 1
+        self._loop.call_soon_threadsafe(self._enqueue, update)
+
+    def submit_json(self, data: dict) -> Update:
+        update = Update.de_json(data, self.dispatcher.bot)
+        self.submit(update)
+        return update
+
+    def _enqueue(self, update: Update) -> None:
+        # выполняется в loop: достраиваем цепочку чата
+        key = UpdatePipeline.route_key(update)
+        task = self._loop.create_task(self._run_after(self._chains.get(key), update))
+        self._chains[key] = task
+        self._idle.clear()
+        task.add_done_callback(lambda t, k=key: self._done(k, t))
+
+    async def _run_after(self, previous: asyncio.Task | None, update: Update) -> None:
+        if previous is not None:
+            # ошибки предыдущего сообщения уже залогированы — нам важен только порядок
+            await asyncio.wait([previous])
+        await self._loop.run_in_executor(self._executor, self._process, update)
+
+    def _done(self, key: int, task: asyncio.Task) -> None:
+        if self._chains.get(key) is task:
+            del self._chains[key]
+        with self._pending_lock:
+            self._pending -= 1
+            idle = self._pending == 0
+        if idle:
+            self._idle.set()
+
+    def _process(self, update: Update) -> None:
+        try:
+            close_old_connections()
+            self.dispatcher.process_update(update)
+        except Exception:
+            logger.exception("Error while processing update %s", update.update_id)
+        finally:
+            close_old_connections()
+
+    # --- long polling без Updater ---
+
+    def run_polling(self, poll_timeout: int = 30) -> None:
+        """
+        Блокирующий long polling: getUpdates в пуле loop, обработка — через submit.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._poll(poll_timeout), self._loop)
+        try:
+            future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+
+    async def _poll(self, poll_timeout: int) -> None:
+        bot = self.dispatcher.bot
+        # как и Updater.start_polling: при установленном webhook getUpdates не работает
+        await self._loop.run_in_executor(None, bot.delete_webhook)
+        offset = None
+        while True:
+            try:
+                updates = await self._loop.run_in_executor(
+                    None, lambda: bot.get_updates(offset=offset, timeout=poll_timeout),
+                )
+            except (TimedOut, NetworkError):
+                logger.warning("getUpdates failed, retrying", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                while True:
+                    try:
+                        self.submit(update)
+                        break
+                    except PipelineFull:
+                        # не забираем новые обновления, пока не разгребём очередь
+                        await asyncio.sleep(0.1)
@@ -15,6 +15,8 @@ from telegram.ext import (
 from telegram.ext import MessageHandler, Filters, CommandHandler
 
 from core.bot.handlers.common import start, back_to_main_menu, today_menu
+from core.bot.persistence import build_persistence, refresh_handler
+from core.bot.router import ExactTextHandler
 from telegram.ext import ConversationHandler
 
 from telegram.ext import ConversationHandler
@@ -32,12 +34,12 @@ from core.bot.handlers.morning_flow import (
 
 from core.bot.handlers.evening_flow import (
     evening_start,
+    evening_redo,
     evening_handle_answer,
     evening_cancel,
-    EV_GRAT_1,
-    EV_GRAT_2,
-    EV_GRAT_3,
-    EV_BEST,
+    EVENING_ANSWER,
+    EVENING_REDO_BUTTON,
+    LEGACY_EVENING_STATES,
 )
 from core.bot.handlers.week_flow import (
     week_menu,
@@ -64,16 +66,24 @@ from core.bot.handlers.history_flow import (
     history_progress,
     history_search_start,
     history_search_input,
+    history_search_more,
+    history_export_start,
+    history_export_range,
+    history_export_format,
     history_cancel,
     HISTORY_MENU,
     HISTORY_DATE_CHOOSE,
     HISTORY_DATE_INPUT,
     HISTORY_SEARCH_INPUT,
+    HISTORY_EXPORT_RANGE,
+    HISTORY_EXPORT_FORMAT,
 )
 from core.bot.keyboards.main_menu import (
     HISTORY_BY_DATE_BUTTON,
     HISTORY_PROGRESS_BUTTON,
     HISTORY_SEARCH_BUTTON,
+    HISTORY_SEARCH_MORE_BUTTON,
+    HISTORY_EXPORT_BUTTON,
 )
 from core.bot.handlers.statistics_flow import (
     statistics_menu,
@@ -88,6 +98,11 @@ from core.bot.handlers.statistics_flow import (
     STATS_TOPICS_BUTTON,
     STATS_WEEKDAYS_BUTTON,
 )
+from core.bot.keyboards.main_menu import (
+    STATS_TOPICS_WEEK_BUTTON,
+    STATS_TOPICS_MONTH_BUTTON,
+    STATS_TOPICS_YEAR_BUTTON,
+)
 from core.bot.handlers.settings_flow import (
     settings_menu,
     settings_cancel,
@@ -157,62 +172,97 @@ logger = logging.getLogger(__name__)
 #     )
 
 
-def build_updater() -> Updater:
+def build_updater(workers: int = 4) -> Updater:
     # токен берём из настроек Django
     token = getattr(settings, "TELEGRAM_BOT_TOKEN", None) or os.getenv("TELEGRAM_BOT_TOKEN")
     if not token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN не задан ни в settings, ни в переменных окружения")
 
-    updater = Updater(token=token, use_context=True)
+    # user_data и шаги диалогов — во внешнем хранилище (Redis/БД), см. core.bot.persistence
+    persistence = build_persistence()
+    persistent = persistence is not None
+
+    # каждому воркеру обработки — своё соединение для ответов + запас для служебных запросов
+    updater = Updater(
+        token=token,
+        use_context=True,
+        workers=workers,
+        base_url=getattr(settings, "TELEGRAM_API_BASE_URL", None) or None,
+        request_kwargs={"con_pool_size": workers + 4},
+        persistence=persistence,
+    )
     dp = updater.dispatcher
 
+    if persistent:
+        dp.add_handler(refresh_handler(), group=-1)
+
     # /start
     dp.add_handler(CommandHandler("start", start))
     history_conv = ConversationHandler(
+    name="history",
+    persistent=persistent,
     entry_points=[
-        MessageHandler(Filters.regex(r"^История$"), history_menu),
+        ExactTextHandler({"История": history_menu}),
     ],
     states={
         HISTORY_MENU: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), history_cancel),
-
-            MessageHandler(Filters.regex(rf"^{HISTORY_BY_DATE_BUTTON}$"), history_by_date_start),
-            MessageHandler(Filters.regex(rf"^{HISTORY_PROGRESS_BUTTON}$"), history_progress),
-            MessageHandler(Filters.regex(rf"^{HISTORY_SEARCH_BUTTON}$"), history_search_start),
+            ExactTextHandler({
+                BACK_BUTTON: history_cancel,
+                HISTORY_BY_DATE_BUTTON: history_by_date_start,
+                HISTORY_PROGRESS_BUTTON: history_progress,
+                HISTORY_SEARCH_BUTTON: history_search_start,
+                HISTORY_EXPORT_BUTTON: history_export_start,
+            }),
         ],
         HISTORY_DATE_CHOOSE: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), history_menu),  # назад в историю
+            ExactTextHandler({BACK_BUTTON: history_menu}),  # назад в историю
             MessageHandler(Filters.text & ~Filters.command, history_date_choose),
         ],
         HISTORY_DATE_INPUT: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), history_menu),
+            ExactTextHandler({BACK_BUTTON: history_menu}),
             MessageHandler(Filters.text & ~Filters.command, history_date_input),
         ],
         HISTORY_SEARCH_INPUT: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), history_menu),
+            ExactTextHandler({BACK_BUTTON: history_menu, HISTORY_SEARCH_MORE_BUTTON: history_search_more}),
             MessageHandler(Filters.text & ~Filters.command, history_search_input),
         ],
+        HISTORY_EXPORT_RANGE: [
+            ExactTextHandler({BACK_BUTTON: history_menu}),
+            MessageHandler(Filters.text & ~Filters.command, history_export_range),
+        ],
+        HISTORY_EXPORT_FORMAT: [
+            ExactTextHandler({BACK_BUTTON: history_menu}),
+            MessageHandler(Filters.text & ~Filters.command, history_export_format),
+        ],
     },
     fallbacks=[],
     allow_reentry=True,
     )
     dp.add_handler(history_conv)
 
-    dp.add_handler(MessageHandler(Filters.regex(r"^Сегодня$"), today_menu))
+    dp.add_handler(ExactTextHandler({
+        "Сегодня": today_menu,
+        "Неделя": week_menu,
+    }))
     # dp.add_handler(MessageHandler(Filters.regex(r"^Утро$"), morning_start))
     # dp.add_handler(MessageHandler(Filters.regex(r"^Вечер$"), evening_start))
-    dp.add_handler(MessageHandler(Filters.regex(r"^Неделя$"), week_menu))
     # dp.add_handler(MessageHandler(Filters.regex(r"^История$"), history_menu))
     stats_conv = ConversationHandler(
-    entry_points=[MessageHandler(Filters.regex(r"^Статистика$"), statistics_menu)],
+    name="statistics",
+    persistent=persistent,
+    entry_points=[ExactTextHandler({"Статистика": statistics_menu})],
     states={
         STATS_MENU: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), statistics_cancel),
-
-            MessageHandler(Filters.regex(rf"^{STATS_GENERAL_BUTTON}$"), statistics_general),
-            MessageHandler(Filters.regex(rf"^{STATS_CHART_BUTTON}$"), statistics_fill_chart),
-            MessageHandler(Filters.regex(rf"^{STATS_TOPICS_BUTTON}$"), statistics_topics),
-            MessageHandler(Filters.regex(rf"^{STATS_WEEKDAYS_BUTTON}$"), statistics_weekdays),
+            ExactTextHandler({
+                BACK_BUTTON: statistics_cancel,
+                STATS_GENERAL_BUTTON: statistics_general,
+                STATS_CHART_BUTTON: statistics_fill_chart,
+                STATS_TOPICS_BUTTON: statistics_topics,
+                STATS_TOPICS_WEEK_BUTTON: statistics_topics,
+                STATS_TOPICS_MONTH_BUTTON: statistics_topics,
+                STATS_TOPICS_YEAR_BUTTON: statistics_topics,
+                STATS_WEEKDAYS_BUTTON: statistics_weekdays,
+            }),
         ],
     },
     fallbacks=[],
@@ -221,23 +271,27 @@ def build_updater() -> Updater:
     dp.add_handler(stats_conv)
 
     settings_conv = ConversationHandler(
+    name="settings",
+    persistent=persistent,
     entry_points=[
-        MessageHandler(Filters.regex(r"^Настройки$"), settings_menu),
+        ExactTextHandler({"Настройки": settings_menu}),
     ],
     states={
         SETTINGS_MENU: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), settings_cancel),
+            ExactTextHandler({
+                BACK_BUTTON: settings_cancel,
 
-            MessageHandler(Filters.regex(rf"^{SET_TZ_BUTTON}$"), timezone_start),
+                SET_TZ_BUTTON: timezone_start,
 
-            MessageHandler(Filters.regex(rf"^{SET_MORNING_TIME_BUTTON}$"), set_morning_time_start),
-            MessageHandler(Filters.regex(rf"^{SET_EVENING_TIME_BUTTON}$"), set_evening_time_start),
+                SET_MORNING_TIME_BUTTON: set_morning_time_start,
+                SET_EVENING_TIME_BUTTON: set_evening_time_start,
 
-            MessageHandler(Filters.regex(rf"^{SET_WEEK_START_BUTTON}$"), set_week_start_start),
+                SET_WEEK_START_BUTTON: set_week_start_start,
 
-            MessageHandler(Filters.regex(rf"^{TOGGLE_MORNING_BUTTON}$"), toggle_morning),
-            MessageHandler(Filters.regex(rf"^{TOGGLE_EVENING_BUTTON}$"), toggle_evening),
-            MessageHandler(Filters.regex(rf"^{TOGGLE_MISSED_BUTTON}$"), toggle_missed),
+                TOGGLE_MORNING_BUTTON: toggle_morning,
+                TOGGLE_EVENING_BUTTON: toggle_evening,
+                TOGGLE_MISSED_BUTTON: toggle_missed,
+            }),
         ],
         SETTINGS_TZ_CHOOSE: [
             MessageHandler(Filters.text & ~Filters.command, timezone_choose),
@@ -262,13 +316,17 @@ def build_updater() -> Updater:
     dp.add_handler(settings_conv)
 
     morning_conv = ConversationHandler(
+    name="morning",
+    persistent=persistent,
     entry_points=[
-        MessageHandler(Filters.regex(r"^Утро$"), morning_start),
-        MessageHandler(Filters.regex(r"^Заполнить утро$"), morning_start),
+        ExactTextHandler({
+            "Утро": morning_start,
+            "Заполнить утро": morning_start,
+        }),
     ],
     states={
         MORNING_ANSWER: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), morning_cancel),  # <-- ВАЖНО: первым
+            ExactTextHandler({BACK_BUTTON: morning_cancel}),  # <-- ВАЖНО: первым
             MessageHandler(Filters.text & ~Filters.command, morning_handle_answer),
         ],
     },
@@ -279,31 +337,28 @@ def build_updater() -> Updater:
 
 
     # Кнопки вне активного диалога (когда утро уже заполнено)
-    dp.add_handler(MessageHandler(Filters.regex(rf"^{MORNING_REDO_BUTTON}$"), morning_redo))
-    dp.add_handler(MessageHandler(Filters.regex(rf"^{VIEW_TODAY_ANSWERS}$"), view_today_answers))
+    dp.add_handler(ExactTextHandler({
+        MORNING_REDO_BUTTON: morning_redo,
+        VIEW_TODAY_ANSWERS: view_today_answers,
+    }))
 
     evening_conv = ConversationHandler(
+    name="evening",
+    persistent=persistent,
     entry_points=[
-        MessageHandler(Filters.regex(r"^Вечер$"), evening_start),
-        MessageHandler(Filters.regex(r"^Заполнить вечер$"), evening_start),
+        ExactTextHandler({
+            "Вечер": evening_start,
+            "Заполнить вечер": evening_start,
+            EVENING_REDO_BUTTON: evening_redo,
+        }),
     ],
     states={
-    EV_GRAT_1: [
-        MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), evening_cancel),
-        MessageHandler(Filters.text & ~Filters.command, evening_handle_answer),
-    ],
-    EV_GRAT_2: [
-        MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), evening_cancel),
-        MessageHandler(Filters.text & ~Filters.command, evening_handle_answer),
-    ],
-    EV_GRAT_3: [
-        MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), evening_cancel),
-        MessageHandler(Filters.text & ~Filters.command, evening_handle_answer),
-    ],
-    EV_BEST: [
-        MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), evening_cancel),
-        MessageHandler(Filters.text & ~Filters.command, evening_handle_answer),
-    ],
+        # старые состояния ведут туда же: шаг всё равно берётся из evening_step
+        state: [
+            ExactTextHandler({BACK_BUTTON: evening_cancel}),
+            MessageHandler(Filters.text & ~Filters.command, evening_handle_answer),
+        ]
+        for state in (EVENING_ANSWER, *LEGACY_EVENING_STATES)
     },
     fallbacks=[],
     allow_reentry=True,
@@ -344,17 +399,21 @@ def build_updater() -> Updater:
     #     MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), back_to_main_menu)
     # )
     week_conv = ConversationHandler(
+    name="week",
+    persistent=persistent,
     entry_points=[
-        MessageHandler(Filters.regex(rf"^{WEEK_FILL_BUTTON}$"), week_fill_start),
-        MessageHandler(Filters.regex(r"^Заполнить неделю$"), week_fill_start),  # если у тебя так в клавиатуре
+        ExactTextHandler({
+            WEEK_FILL_BUTTON: week_fill_start,
+            "Заполнить неделю": week_fill_start,  # если у тебя так в клавиатуре
+        }),
     ],
     states={
         WEEK_MID: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), week_cancel),
+            ExactTextHandler({BACK_BUTTON: week_cancel}),
             MessageHandler(Filters.text & ~Filters.command, week_handle_mid),
         ],
         WEEK_FINAL: [
-            MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), week_cancel),
+            ExactTextHandler({BACK_BUTTON: week_cancel}),
             MessageHandler(Filters.text & ~Filters.command, week_handle_final),
         ],
     },
@@ -363,12 +422,12 @@ def build_updater() -> Updater:
     )
     dp.add_handler(week_conv)
 
-    dp.add_handler(MessageHandler(Filters.regex(rf"^{WEEK_VIEW_BUTTON}$"), week_view))
-    dp.add_handler(MessageHandler(Filters.regex(rf"^{WEEK_TASK_BUTTON}$"), week_task_show))
-    dp.add_handler(MessageHandler(Filters.regex(rf"^{WEEK_REDO_BUTTON}$"), week_redo))
-    dp.add_handler(
-        MessageHandler(Filters.regex(rf"^{BACK_BUTTON}$"), back_to_main_menu)
-    )
+    dp.add_handler(ExactTextHandler({
+        WEEK_VIEW_BUTTON: week_view,
+        WEEK_TASK_BUTTON: week_task_show,
+        WEEK_REDO_BUTTON: week_redo,
+        BACK_BUTTON: back_to_main_menu,
+    }))
         
     logger.info("Handlers registered")
     return updater
\ No newline at end of file
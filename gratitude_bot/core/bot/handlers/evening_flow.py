@@ -1,4 +1,6 @@
 # gratitude_bot/core/bot/handlers/evening_flow.py
+import logging
+
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 
@@ -8,22 +10,29 @@ from core.bot.keyboards.main_menu import (
     get_main_menu_keyboard,
 )
 from core.bot.handlers.utils import get_or_create_tg_user, get_or_create_today_entry
+from core.services import answers as answer_buffer
+from core.services import questions as question_registry
+from core.services import history, stats_rollup, topics
 from core.services.streak import update_streak_on_activity
-from core.models import Answer, DailyEntry
+from core.models import Answer, DailyEntry, QuestionTemplate
+
+logger = logging.getLogger(__name__)
 
 
-# Состояния (int)
-EV_GRAT_1, EV_GRAT_2, EV_GRAT_3, EV_BEST = range(4)
+# Состояние одно, как у утра: шаги двигаем сами по числу вопросов (evening_q_ids)
+EVENING_ANSWER = 0
+# раньше было четыре фиксированных состояния — в сохранённых диалогах они ещё встречаются
+LEGACY_EVENING_STATES = (1, 2, 3)
+
+NO_QUESTIONS_TEXT = "🌙 Вопросы вечера сейчас не настроены. Загляни чуть позже."
 
 EVENING_REDO_BUTTON = "Заполнить вечер заново"
 VIEW_TODAY_ANSWERS = "Посмотреть сегодняшние ответы"
 
-EVENING_QUESTIONS = [
-    ("gratitude_1", "🌙 Вечер\n\n1) За что ты сегодня благодарна?"),
-    ("gratitude_2", "2) Прекрасные моменты дня сегодня — какие они?"),
-    ("gratitude_3", "3) Что я смогу сделать завтра, чтобы сделать свой день лучше?"),
-    ("best_event", "✨ Что было самым хорошим/тёплым событием дня?"),
-]
+
+def get_evening_questions() -> list[QuestionTemplate]:
+    # вопросы вечера — QuestionTemplate(period=evening) из реестра (по умолчанию те же четыре)
+    return question_registry.for_period(QuestionTemplate.PERIOD_EVENING)
 
 
 def get_evening_completed_keyboard():
@@ -50,8 +59,16 @@ def evening_start(update: Update, context: CallbackContext):
         )
         return ConversationHandler.END
 
+    questions = get_evening_questions()
+    if not questions:
+        # все вечерние шаблоны выключены или удалены
+        update.message.reply_text(NO_QUESTIONS_TEXT, reply_markup=get_main_menu_keyboard())
+        return ConversationHandler.END
+
     context.user_data["evening_entry_id"] = entry.id
+    context.user_data["evening_q_ids"] = [q.id for q in questions]
     context.user_data["evening_step"] = 0
+    context.user_data.pop("evening_answers", None)
 
     update.message.reply_text(
         "🌙 Вечерняя рефлексия займёт 2–3 минуты.\n\n"
@@ -59,60 +76,59 @@ def evening_start(update: Update, context: CallbackContext):
         reply_markup=get_cancel_keyboard(),
     )
 
-    _, text = EVENING_QUESTIONS[0]
-    update.message.reply_text(text)
-    return EV_GRAT_1
-
-
-def _save_answer(entry_id: int, question_text: str, answer_text: str):
-    Answer.objects.create(
-        daily_entry_id=entry_id,
-        question=None,  # вечер сейчас сохраняется без QuestionTemplate
-        question_text=question_text,
-        answer_text=answer_text.strip(),
-    )
-
-
-def _state_by_step(step: int):
-    if step == 0:
-        return EV_GRAT_1
-    if step == 1:
-        return EV_GRAT_2
-    if step == 2:
-        return EV_GRAT_3
-    return EV_BEST
+    update.message.reply_text(questions[0].text)
+    return EVENING_ANSWER
 
 
 def evening_handle_answer(update: Update, context: CallbackContext):
     entry_id = context.user_data.get("evening_entry_id")
     step = context.user_data.get("evening_step", 0)
+    # сессии, начатые до реестра, хранят только шаг — берём текущие вопросы
+    q_ids = context.user_data.get("evening_q_ids") or [q.id for q in get_evening_questions()]
 
-    if not entry_id:
-        update.message.reply_text(
-            "Похоже, сессия вечера потерялась. Нажми «Вечер», чтобы начать заново.",
-            reply_markup=get_main_menu_keyboard(),
-        )
-        return ConversationHandler.END
+    if not entry_id or step >= len(q_ids):
+        return _session_lost(update, context)
 
     user_text = (update.message.text or "").strip()
     if not user_text:
         update.message.reply_text("Можно коротко, но не пусто 🙂")
-        return _state_by_step(step)
+        return EVENING_ANSWER
 
     # сохраняем текущий ответ
-    _, q_text = EVENING_QUESTIONS[step]
-    _save_answer(entry_id, q_text, user_text)
+    q = question_registry.get(q_ids[step])
+    if q is None:
+        # шаблон удалили посреди опросника
+        return _session_lost(update, context)
+    if answer_buffer.buffering_enabled():
+        answer_buffer.buffer_answer(context.user_data, "evening_answers", q.id, q.text, user_text)
+    else:
+        user_id, day = answer_buffer.save_answer(entry_id, q, user_text)
+        # частоты слов — сразу: брошенный на середине вечер тоже остаётся в ответах
+        topics.refresh_day(user_id, day)
 
     step += 1
-    context.user_data["evening_step"] = step
 
-    if step >= len(EVENING_QUESTIONS):
-        DailyEntry.objects.filter(id=entry_id).update(completed_evening=True)
+    if step >= len(q_ids):
+        buffered = context.user_data.get("evening_answers")
+        if buffered:
+            # ответы, отметка вечера и стрик — одной транзакцией
+            try:
+                answer_buffer.commit_block(get_or_create_tg_user(update), entry_id, "completed_evening", buffered)
+            except Exception:
+                # шаг не сдвигаем: последний ответ пользователь пришлёт ещё раз
+                logger.exception("Failed to commit evening answers for entry %s", entry_id)
+                buffered.pop()
+                update.message.reply_text(answer_buffer.COMMIT_FAILED_TEXT)
+                return EVENING_ANSWER
+        else:
+            DailyEntry.objects.filter(id=entry_id).update(completed_evening=True)
 
-        # ✅ стрик
-        entry = DailyEntry.objects.get(id=entry_id)
-        user = entry.user
-        update_streak_on_activity(user, entry.date)
+            # ✅ стрик
+            entry = DailyEntry.objects.get(id=entry_id)
+            stats_rollup.entry_changed(entry)
+            history.day_changed(entry.user_id, entry.date)
+            user = entry.user
+            update_streak_on_activity(user, entry.date)
 
         _clear_evening_context(context)
 
@@ -122,19 +138,34 @@ def evening_handle_answer(update: Update, context: CallbackContext):
         )
         return ConversationHandler.END
 
-    _, next_text = EVENING_QUESTIONS[step]
-    update.message.reply_text(next_text)
-    return _state_by_step(step)
+    context.user_data["evening_step"] = step
+    next_q = question_registry.get(q_ids[step])
+    if next_q is None:
+        return _session_lost(update, context)
+    update.message.reply_text(next_q.text)
+    return EVENING_ANSWER
+
+
+def _session_lost(update: Update, context: CallbackContext):
+    _clear_evening_context(context)
+    update.message.reply_text(
+        "Похоже, сессия вечера потерялась. Нажми «Вечер», чтобы начать заново.",
+        reply_markup=get_main_menu_keyboard(),
+    )
+    return ConversationHandler.END
 
 
 def evening_redo(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     entry = get_or_create_today_entry(user)
 
-    evening_texts = [q[1] for q in EVENING_QUESTIONS]
-    Answer.objects.filter(daily_entry=entry, question_text__in=evening_texts).delete()
+    Answer.objects.filter(daily_entry=entry, period=QuestionTemplate.PERIOD_EVENING).delete()
 
     DailyEntry.objects.filter(id=entry.id).update(completed_evening=False)
+    entry.completed_evening = False
+    stats_rollup.entry_changed(entry)
+    topics.refresh_day(user.id, entry.date)
+    history.day_changed(user.id, entry.date)
 
     update.message.reply_text("Ок, заполним заново 🌙")
     return evening_start(update, context)
@@ -155,7 +186,8 @@ def view_today_answers(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     entry = get_or_create_today_entry(user)
 
-    answers = Answer.objects.filter(daily_entry=entry).order_by("created_at")
+    # у ответов одного блока, записанных пачкой, created_at совпадает — порядок по id
+    answers = Answer.objects.filter(daily_entry=entry).order_by("created_at", "id")
     if not answers.exists():
         update.message.reply_text(
             "Сегодня пока нет ответов.\nНажми «Заполнить утро» или «Заполнить вечер».",
@@ -163,19 +195,13 @@ def view_today_answers(update: Update, context: CallbackContext):
         )
         return ConversationHandler.END
 
-    # Вечерные тексты — чтобы отличать вечер от "другое"
-    evening_texts = {q[1] for q in EVENING_QUESTIONS}
-
     morning, evening, other = [], [], []
 
+    # утро/вечер/другое — по Answer.period
     for a in answers:
-        period = getattr(a.question, "period", None)
-        if period == "morning":
+        if a.period == QuestionTemplate.PERIOD_MORNING:
             morning.append(a)
-            continue
-
-        # вечер: либо period=evening, либо совпало по тексту вопроса
-        if period == "evening" or (a.question_text in evening_texts):
+        elif a.period == QuestionTemplate.PERIOD_EVENING:
             evening.append(a)
         else:
             other.append(a)
@@ -203,4 +229,6 @@ def view_today_answers(update: Update, context: CallbackContext):
 
 def _clear_evening_context(context: CallbackContext):
     context.user_data.pop("evening_entry_id", None)
+    context.user_data.pop("evening_q_ids", None)
     context.user_data.pop("evening_step", None)
+    context.user_data.pop("evening_answers", None)
@@ -4,19 +4,27 @@ from __future__ import annotations
 import re
 from datetime import date, datetime, timedelta
 
-from django.db.models import Q
 
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 
-from core.models import DailyEntry, Answer, WeeklyCycle, QuestionTemplate
+from core.models import Answer, WeeklyCycle, QuestionTemplate
 from core.bot.handlers.utils import get_or_create_tg_user, user_local_date
+from core.services import export, history, search, stats
 from core.bot.keyboards.main_menu import (
     get_main_menu_keyboard,
     BACK_BUTTON,
     HISTORY_BY_DATE_BUTTON,
     HISTORY_PROGRESS_BUTTON,
     HISTORY_SEARCH_BUTTON,
+    HISTORY_SEARCH_MORE_BUTTON,
+    HISTORY_EXPORT_BUTTON,
+    EXPORT_WEEK_BUTTON,
+    EXPORT_MONTH_BUTTON,
+    EXPORT_ALL_BUTTON,
+    EXPORT_TXT_BUTTON,
+    EXPORT_MD_BUTTON,
+    EXPORT_JSON_BUTTON,
 )
 
 # ---------- states ----------
@@ -24,8 +32,21 @@ HISTORY_MENU = 301
 HISTORY_DATE_CHOOSE = 302
 HISTORY_DATE_INPUT = 303
 HISTORY_SEARCH_INPUT = 304
+HISTORY_EXPORT_RANGE = 305
+HISTORY_EXPORT_FORMAT = 306
+
+# период выгрузки: дней назад от сегодня (None — всё)
+EXPORT_RANGES = {
+    EXPORT_WEEK_BUTTON: 7,
+    EXPORT_MONTH_BUTTON: 30,
+    EXPORT_ALL_BUTTON: None,
+}
+EXPORT_FORMATS = {
+    EXPORT_TXT_BUTTON: "txt",
+    EXPORT_MD_BUTTON: "md",
+    EXPORT_JSON_BUTTON: "json",
+}
 
-_NUM_PREFIX_RE = re.compile(r"^\s*\d+\)\s*")
 _DATE_RE = re.compile(r"^\s*(\d{2})\.(\d{2})\.(\d{4})\s*$")
 
 
@@ -39,49 +60,12 @@ def _parse_date_ddmmyyyy(text: str) -> date | None:
         return None
 
 
-# ---------- text helpers ----------
-def _clean_question_text(text: str) -> str:
-    text = (text or "").strip()
-    if not text:
-        return "—"
-
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    if not lines:
-        return "—"
-
-    if len(lines) >= 2 and lines[0] in ("☀️ Утро", "🌙 Вечер", "🗓️ Неделя", "Неделя"):
-        candidate = lines[1]
-    else:
-        candidate = lines[0]
-
-    candidate = _NUM_PREFIX_RE.sub("", candidate).strip()
-    return candidate or "—"
-
-
-def _infer_period(answer: Answer) -> str:
-    period = getattr(answer.question, "period", None)
-    if period in (
-        QuestionTemplate.PERIOD_MORNING,
-        QuestionTemplate.PERIOD_EVENING,
-        QuestionTemplate.PERIOD_WEEKLY,
-    ):
-        return period
-
-    qt = (answer.question_text or "").lower()
-    if "утро" in qt or "☀️" in qt:
-        return QuestionTemplate.PERIOD_MORNING
-    if "вечер" in qt or "🌙" in qt:
-        return QuestionTemplate.PERIOD_EVENING
-
-    return "other"
-
-
 def _format_answers_block(title: str, answers: list[Answer]) -> str:
     if not answers:
         return ""
     parts = [title]
     for a in answers:
-        q = _clean_question_text(a.question_text)
+        q = history.clean_question_text(a.question_text)
         parts.append(f"❓ {q}\n→ {a.answer_text}")
     return "\n".join(parts)
 
@@ -92,6 +76,7 @@ def get_history_menu_keyboard():
         [
             [HISTORY_BY_DATE_BUTTON],
             [HISTORY_PROGRESS_BUTTON, HISTORY_SEARCH_BUTTON],
+            [HISTORY_EXPORT_BUTTON],
             [BACK_BUTTON],
         ],
         resize_keyboard=True,
@@ -117,6 +102,37 @@ def get_date_input_keyboard():
     return ReplyKeyboardMarkup([[BACK_BUTTON]], resize_keyboard=True, one_time_keyboard=False)
 
 
+def get_search_results_keyboard():
+    return ReplyKeyboardMarkup(
+        [[HISTORY_SEARCH_MORE_BUTTON], [BACK_BUTTON]],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+    )
+
+
+def get_export_range_keyboard():
+    return ReplyKeyboardMarkup(
+        [
+            [EXPORT_WEEK_BUTTON, EXPORT_MONTH_BUTTON],
+            [EXPORT_ALL_BUTTON],
+            [BACK_BUTTON],
+        ],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+    )
+
+
+def get_export_format_keyboard():
+    return ReplyKeyboardMarkup(
+        [
+            [EXPORT_TXT_BUTTON, EXPORT_MD_BUTTON, EXPORT_JSON_BUTTON],
+            [BACK_BUTTON],
+        ],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+    )
+
+
 # ---------- entry ----------
 def history_menu(update: Update, context: CallbackContext):
     update.message.reply_text(
@@ -128,6 +144,8 @@ def history_menu(update: Update, context: CallbackContext):
 
 def history_cancel(update: Update, context: CallbackContext):
     context.user_data.pop("history_date", None)
+    context.user_data.pop("history_export_range", None)
+    _clear_search_context(context)
     update.message.reply_text("Ок, верну в меню 👇", reply_markup=get_main_menu_keyboard())
     return ConversationHandler.END
 
@@ -146,24 +164,15 @@ def history_show_by_date(update: Update, context: CallbackContext, picked_date:
     """
     user = get_or_create_tg_user(update)
 
-    parts: list[str] = [f"📅 {picked_date:%d.%m.%Y}\n"]
+    # прошедший день меняется только при «заполнить заново» — берём готовый текст
+    cacheable = picked_date < user_local_date(user)
+    text = history.get_cached(user.id, picked_date) if cacheable else None
+    if text is None:
+        text = _render_day(*history.load_day(user.id, picked_date), picked_date)
+        if cacheable:
+            history.set_cached(user.id, picked_date, text)
 
-    entry = DailyEntry.objects.filter(user=user, date=picked_date).first()
-    if entry:
-        parts.append(_format_daily_entry(entry))
-    else:
-        parts.append(f"За {picked_date:%d.%m.%Y} записей нет.")
-
-    cycle = (
-        WeeklyCycle.objects.filter(user=user, week_start__lte=picked_date, week_end__gte=picked_date)
-        .select_related("task")
-        .first()
-    )
-    if cycle:
-        parts.append("")
-        parts.append(_format_weekly_cycle(cycle))
-
-    update.message.reply_text("\n".join(parts))
+    update.message.reply_text(text)
 
     # ✅ всегда возвращаем в CHOOSE
     update.message.reply_text("Выбери дату 👇", reply_markup=get_date_choose_keyboard())
@@ -236,23 +245,13 @@ def history_progress(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     today = user_local_date(user)
 
-    start = today - timedelta(days=13)
-    entries = (
-        DailyEntry.objects.filter(user=user, date__gte=start, date__lte=today)
-        .order_by("date")
-    )
-    filled_days = sum(1 for e in entries if e.completed_morning or e.completed_evening)
-
-    cycles = (
-        WeeklyCycle.objects.filter(user=user, week_start__gte=today - timedelta(weeks=8))
-        .order_by("-week_start")
-    )
-    completed_weeks = sum(1 for c in cycles if c.is_completed)
+    days = stats.entry_counts(user.id, today, recent_days=14)
+    weeks = stats.week_counts(user.id, since=today - timedelta(weeks=8))
 
     update.message.reply_text(
         "📈 Прогресс\n\n"
-        f"• Заполненных дней за последние 14 дней: {filled_days}/14\n"
-        f"• Завершённых недель за последние 8 недель: {completed_weeks}/{cycles.count()}\n",
+        f"• Заполненных дней за последние 14 дней: {days['recent_any']}/14\n"
+        f"• Завершённых недель за последние 8 недель: {weeks['weeks_completed']}/{weeks['weeks_total']}\n",
         reply_markup=get_history_menu_keyboard(),
     )
     return HISTORY_MENU
@@ -278,47 +277,128 @@ def history_search_input(update: Update, context: CallbackContext):
         update.message.reply_text("Напиши слово/фразу 🙂", reply_markup=get_date_input_keyboard())
         return HISTORY_SEARCH_INPUT
 
+    context.user_data["history_search_query"] = text
+    context.user_data["history_search_page"] = 0
+    return _show_search_page(update, context)
+
+
+def history_search_more(update: Update, context: CallbackContext):
+    if "history_search_query" not in context.user_data:
+        return history_search_start(update, context)
+    context.user_data["history_search_page"] = context.user_data.get("history_search_page", 0) + 1
+    return _show_search_page(update, context)
+
+
+def _show_search_page(update: Update, context: CallbackContext):
+    text = context.user_data["history_search_query"]
+    page = context.user_data["history_search_page"]
     user = get_or_create_tg_user(update)
 
-    answers = (
-        Answer.objects.filter(daily_entry__user=user)
-        .filter(Q(answer_text__icontains=text) | Q(question_text__icontains=text))
-        .select_related("daily_entry", "question")
-        .order_by("-daily_entry__date", "-created_at")[:10]
-    )
+    answers, has_more = search.search_answers(user.id, text, page=page)
 
     if not answers:
+        _clear_search_context(context)
         update.message.reply_text(f'Ничего не нашла по запросу: “{text}”.', reply_markup=get_history_menu_keyboard())
         return HISTORY_MENU
 
-    lines = [f'🔎 Результаты по запросу: “{text}” (последние 10)\n']
+    first = page * search.PAGE_SIZE + 1
+    lines = [f'🔎 Результаты по запросу: “{text}” ({first}–{first + len(answers) - 1})\n']
     for a in answers:
         d = a.daily_entry.date
-        q = _clean_question_text(a.question_text)
+        q = history.clean_question_text(a.question_text)
         ans = (a.answer_text or "").strip() or "—"
         lines.append(f"• {d:%d.%m.%Y}\n  ❓ {q}\n  → {ans}")
 
+    if has_more:
+        # остаёмся в поиске: «Ещё результаты» — следующая страница, новый текст — новый поиск
+        update.message.reply_text("\n".join(lines), reply_markup=get_search_results_keyboard())
+        return HISTORY_SEARCH_INPUT
+
+    _clear_search_context(context)
     update.message.reply_text("\n".join(lines), reply_markup=get_history_menu_keyboard())
     return HISTORY_MENU
 
 
-# ---------- formatting helpers ----------
-def _format_daily_entry(entry: DailyEntry) -> str:
-    answers = (
-        Answer.objects.filter(daily_entry=entry)
-        .select_related("question")
-        .order_by("created_at")
+def _clear_search_context(context: CallbackContext):
+    context.user_data.pop("history_search_query", None)
+    context.user_data.pop("history_search_page", None)
+
+
+# ---------- export ----------
+def history_export_start(update: Update, context: CallbackContext):
+    context.user_data.pop("history_export_range", None)
+    update.message.reply_text("За какой период выгрузить записи? 👇", reply_markup=get_export_range_keyboard())
+    return HISTORY_EXPORT_RANGE
+
+
+def history_export_range(update: Update, context: CallbackContext):
+    text = (update.message.text or "").strip()
+    if text not in EXPORT_RANGES:
+        update.message.reply_text("Выбери период кнопкой 👇", reply_markup=get_export_range_keyboard())
+        return HISTORY_EXPORT_RANGE
+
+    context.user_data["history_export_range"] = text
+    update.message.reply_text(
+        "В каком формате?\nTXT — просто текст, Markdown — с заголовками, JSON — для программ.",
+        reply_markup=get_export_format_keyboard(),
     )
+    return HISTORY_EXPORT_FORMAT
+
+
+def history_export_format(update: Update, context: CallbackContext):
+    text = (update.message.text or "").strip()
+    range_button = context.user_data.get("history_export_range")
+    if range_button not in EXPORT_RANGES:
+        return history_export_start(update, context)
+    if text not in EXPORT_FORMATS:
+        update.message.reply_text("Выбери формат кнопкой 👇", reply_markup=get_export_format_keyboard())
+        return HISTORY_EXPORT_FORMAT
+
+    user = get_or_create_tg_user(update)
+    end = user_local_date(user)
+    days = EXPORT_RANGES[range_button]
+    start = end - timedelta(days=days - 1) if days else None
+    fmt = EXPORT_FORMATS[text]
+    context.user_data.pop("history_export_range", None)
+
+    # файл пишется потоком во временный файл и удаляется после отправки
+    with export.export_file(user.id, start, end, fmt) as (document, counts):
+        if counts.empty:
+            update.message.reply_text("За этот период записей нет.", reply_markup=get_history_menu_keyboard())
+            return HISTORY_MENU
+        update.message.reply_document(
+            document=document,
+            filename=export.filename(start, end, fmt),
+            caption=f"Твои записи 📖 Ответов: {counts.answers}, недель: {counts.weeks}",
+            reply_markup=get_history_menu_keyboard(),
+        )
+    return HISTORY_MENU
+
+
+# ---------- formatting helpers ----------
+def _render_day(answers: list[Answer], cycle: WeeklyCycle | None, picked_date: date) -> str:
+    # результат кэшируется (core.services.history): меняя вид — увеличьте history.RENDER_VERSION
+    parts: list[str] = [f"📅 {picked_date:%d.%m.%Y}\n"]
+
+    if answers:
+        parts.append(_format_day_answers(answers))
+    else:
+        parts.append(f"За {picked_date:%d.%m.%Y} записей нет.")
+
+    if cycle:
+        parts.append("")
+        parts.append(_format_weekly_cycle(cycle))
+
+    return "\n".join(parts)
 
-    if not answers:
-        return "Записей нет."
 
+def _format_day_answers(answers: list[Answer]) -> str:
     morning: list[Answer] = []
     evening: list[Answer] = []
     other: list[Answer] = []
 
     for a in answers:
-        p = _infer_period(a)
+        p = a.period
         if p == QuestionTemplate.PERIOD_MORNING:
             morning.append(a)
         elif p == QuestionTemplate.PERIOD_EVENING:
@@ -1,11 +1,12 @@
 # gratitude_bot/core/bot/handlers/morning_flow.py
+import logging
+
 from telegram import Update
 from telegram.ext import CallbackContext, ConversationHandler
 
 from core.bot.handlers.utils import (
     get_or_create_tg_user,
     get_or_create_today_entry,
-    get_morning_questions,
 )
 from core.bot.keyboards.main_menu import (
     get_cancel_keyboard,
@@ -13,9 +14,14 @@ from core.bot.keyboards.main_menu import (
     get_morning_completed_keyboard,
     BACK_BUTTON,
 )
-from core.models import Answer, DailyEntry
+from core.models import Answer, DailyEntry, QuestionTemplate
+from core.services import answers as answer_buffer
+from core.services import questions as question_registry
+from core.services import history, stats_rollup
 from core.services.streak import update_streak_on_activity
 
+logger = logging.getLogger(__name__)
+
 
 # Состояние одно: мы всегда принимаем текст и двигаем шаги сами
 MORNING_ANSWER = 1
@@ -43,11 +49,19 @@ def morning_start(update: Update, context: CallbackContext):
         )
         return ConversationHandler.END
 
-    questions = get_morning_questions()
+    questions = question_registry.for_period(QuestionTemplate.PERIOD_MORNING)
+    if not questions:
+        # все утренние шаблоны выключены или удалены
+        update.message.reply_text(
+            "☀️ Вопросы утра сейчас не настроены. Загляни чуть позже.",
+            reply_markup=get_main_menu_keyboard(),
+        )
+        return ConversationHandler.END
 
     context.user_data["morning_entry_id"] = entry.id
     context.user_data["morning_q_ids"] = [q.id for q in questions]
     context.user_data["morning_step"] = 0
+    context.user_data.pop("morning_answers", None)
 
     update.message.reply_text(
         "☀️ Утренний блок — 2 минуты.\n"
@@ -65,12 +79,8 @@ def morning_handle_answer(update: Update, context: CallbackContext):
     q_ids = context.user_data.get("morning_q_ids")
     step = context.user_data.get("morning_step", 0)
 
-    if not entry_id or not q_ids:
-        update.message.reply_text(
-            "Похоже, сессия утра потерялась. Нажми «Утро», чтобы начать заново.",
-            reply_markup=get_main_menu_keyboard(),
-        )
-        return ConversationHandler.END
+    if not entry_id or not q_ids or step >= len(q_ids):
+        return _session_lost(update, context)
 
     text = (update.message.text or "").strip()
     if not text:
@@ -81,28 +91,41 @@ def morning_handle_answer(update: Update, context: CallbackContext):
     question_id = q_ids[step]
 
     # чтобы корректно сохранять question_text даже если потом поменяют шаблон
-    from core.models import QuestionTemplate
-    q = QuestionTemplate.objects.get(id=question_id)
-
-    Answer.objects.create(
-        daily_entry_id=entry_id,
-        question=q,
-        question_text=q.text,
-        answer_text=text,
-    )
+    q = question_registry.get(question_id)
+    if q is None:
+        # шаблон удалили посреди опросника
+        return _session_lost(update, context)
+
+    if answer_buffer.buffering_enabled():
+        answer_buffer.buffer_answer(context.user_data, "morning_answers", q.id, q.text, text)
+    else:
+        answer_buffer.save_answer(entry_id, q, text)
 
     step += 1
-    context.user_data["morning_step"] = step
 
     # конец опросника
     if step >= len(q_ids):
-        entry = DailyEntry.objects.get(id=entry_id)
-        entry.completed_morning = True
-        entry.save(update_fields=["completed_morning"])
-
-        # ✅ стрик: мягко — день засчитан, если заполнено хоть что-то
         user = get_or_create_tg_user(update)
-        update_streak_on_activity(user, entry.date)
+        buffered = context.user_data.get("morning_answers")
+        if buffered:
+            # ответы, отметка утра и стрик — одной транзакцией
+            try:
+                answer_buffer.commit_block(user, entry_id, "completed_morning", buffered)
+            except Exception:
+                # шаг не сдвигаем: последний ответ пользователь пришлёт ещё раз
+                logger.exception("Failed to commit morning answers for entry %s", entry_id)
+                buffered.pop()
+                update.message.reply_text(answer_buffer.COMMIT_FAILED_TEXT)
+                return MORNING_ANSWER
+        else:
+            entry = DailyEntry.objects.get(id=entry_id)
+            entry.completed_morning = True
+            entry.save(update_fields=["completed_morning"])
+            stats_rollup.entry_changed(entry)
+            history.day_changed(entry.user_id, entry.date)
+
+            # ✅ стрик: мягко — день засчитан, если заполнено хоть что-то
+            update_streak_on_activity(user, entry.date)
 
         _clear_morning_context(context)
 
@@ -121,12 +144,23 @@ def morning_handle_answer(update: Update, context: CallbackContext):
         # return ConversationHandler.END
 
     # следующий вопрос
-    from core.models import QuestionTemplate
-    next_q = QuestionTemplate.objects.get(id=q_ids[step])
+    context.user_data["morning_step"] = step
+    next_q = question_registry.get(q_ids[step])
+    if next_q is None:
+        return _session_lost(update, context)
     update.message.reply_text(next_q.text)
     return MORNING_ANSWER
 
 
+def _session_lost(update: Update, context: CallbackContext):
+    _clear_morning_context(context)
+    update.message.reply_text(
+        "Похоже, сессия утра потерялась. Нажми «Утро», чтобы начать заново.",
+        reply_markup=get_main_menu_keyboard(),
+    )
+    return ConversationHandler.END
+
+
 def morning_cancel(update: Update, context: CallbackContext):
     _clear_morning_context(context)
     update.message.reply_text(
@@ -144,22 +178,13 @@ def morning_redo(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     entry = get_or_create_today_entry(user)
 
-    # удаляем только утренние ответы: по question.period == morning
-    Answer.objects.filter(
-        daily_entry=entry,
-        question__period="morning",
-    ).delete()
-
-    # На всякий случай удалим и те ответы, где question мог стать null, но это утро:
-    # (если ты когда-то удалишь QuestionTemplate — связь станет null)
-    # Мы определим "утро" по префиксу в question_text (у нас первый вопрос начинается с ☀️ Утро)
-    Answer.objects.filter(
-        daily_entry=entry,
-        question__isnull=True,
-        question_text__icontains="утро",
-    ).delete()
+    # удаляем только утренние ответы (Answer.period ставится при записи и не зависит от шаблона)
+    Answer.objects.filter(daily_entry=entry, period=QuestionTemplate.PERIOD_MORNING).delete()
 
     DailyEntry.objects.filter(id=entry.id).update(completed_morning=False)
+    entry.completed_morning = False
+    stats_rollup.entry_changed(entry)
+    history.day_changed(user.id, entry.date)
 
     update.message.reply_text("Ок, заполним заново ☀️")
     return morning_start(update, context)
@@ -221,7 +246,8 @@ def view_today_answers(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     entry = get_or_create_today_entry(user)
 
-    answers = Answer.objects.filter(daily_entry=entry).order_by("created_at")
+    # у ответов одного блока, записанных пачкой, created_at совпадает — порядок по id
+    answers = Answer.objects.filter(daily_entry=entry).order_by("created_at", "id")
     if not answers.exists():
         update.message.reply_text(
             "Сегодня пока нет ответов.\nНажми «Заполнить утро» или «Заполнить вечер».",
@@ -229,21 +255,15 @@ def view_today_answers(update: Update, context: CallbackContext):
         )
         return
 
-    # Группировка: утро/вечер/другое
+    # Группировка: утро/вечер/другое — по Answer.period
     morning = []
     evening = []
     other = []
 
     for a in answers:
-        period = getattr(a.question, "period", None)
-
-        if period == "morning":
+        if a.period == QuestionTemplate.PERIOD_MORNING:
             morning.append(a)
-            continue
-
-        # вечер у тебя часто question=None, распознаём по question_text
-        qt = (a.question_text or "").lower()
-        if "🌙" in (a.question_text or "") or "вечер" in qt or "благодар" in qt:
+        elif a.period == QuestionTemplate.PERIOD_EVENING:
             evening.append(a)
         else:
             other.append(a)
@@ -272,3 +292,4 @@ def _clear_morning_context(context: CallbackContext):
     context.user_data.pop("morning_entry_id", None)
     context.user_data.pop("morning_q_ids", None)
     context.user_data.pop("morning_step", None)
+    context.user_data.pop("morning_answers", None)
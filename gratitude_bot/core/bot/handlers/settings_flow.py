@@ -4,11 +4,16 @@ from __future__ import annotations
 
 import re
 from datetime import time
+from typing import Any, Callable
 
+from django.db import transaction
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 
 from core.bot.handlers.utils import get_or_create_tg_user, get_user_settings
+from core.models import UserSettings
+from core.services import user_cache
+from core.services.reminders import sync_user_reminders
 from core.bot.keyboards.main_menu import (
     BACK_BUTTON,
     get_main_menu_keyboard,
@@ -141,12 +146,29 @@ def _format_time(t: time) -> str:
     return f"{t.hour:02}:{t.minute:02}"
 
 
+# ---------- saving ----------
+def _change_setting(update: Update, field: str, value: Any | Callable[[UserSettings], Any]) -> UserSettings:
+    """
+    Поменять одно поле настроек. Строку перечитываем под блокировкой, а не берём
+    из user_cache: копия в кэше процесса может быть старой (настройки меняли
+    в другом процессе или в админке), и её save() / sync_user_reminders
+    вернули бы чужие поля и время напоминаний к старым значениям.
+    value — новое значение или функция от свежей строки (для переключателей).
+    """
+    user = get_or_create_tg_user(update)
+    with transaction.atomic():
+        s = UserSettings.objects.select_for_update().get(user_id=user.id)
+        setattr(s, field, value(s) if callable(value) else value)
+        s.save(update_fields=[field])
+        if field != "week_start":
+            sync_user_reminders(s)
+    user_cache.forget(user.telegram_id)
+    return s
+
+
 # ---------- toggles ----------
 def toggle_morning(update: Update, context: CallbackContext):
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.morning_enabled = not s.morning_enabled
-    s.save(update_fields=["morning_enabled"])
+    s = _change_setting(update, "morning_enabled", lambda s: not s.morning_enabled)
     status = "включены ✅" if s.morning_enabled else "выключены ❌"
     update.message.reply_text(
         f"☀️ Утренние напоминания {status}",
@@ -156,10 +178,7 @@ def toggle_morning(update: Update, context: CallbackContext):
 
 
 def toggle_evening(update: Update, context: CallbackContext):
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.evening_enabled = not s.evening_enabled
-    s.save(update_fields=["evening_enabled"])
+    s = _change_setting(update, "evening_enabled", lambda s: not s.evening_enabled)
     status = "включены ✅" if s.evening_enabled else "выключены ❌"
     update.message.reply_text(
         f"🌙 Вечерние напоминания {status}",
@@ -169,10 +188,7 @@ def toggle_evening(update: Update, context: CallbackContext):
 
 
 def toggle_missed(update: Update, context: CallbackContext):
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.notify_missed_days = not s.notify_missed_days
-    s.save(update_fields=["notify_missed_days"])
+    s = _change_setting(update, "notify_missed_days", lambda s: not s.notify_missed_days)
     status = "включены ✅" if s.notify_missed_days else "выключены ❌"
     update.message.reply_text(
         f"🔔 Уведомления о пропусках {status}",
@@ -203,10 +219,7 @@ def set_morning_time_input(update: Update, context: CallbackContext):
         update.message.reply_text("❌ Не поняла. Введи время как HH:MM (например 08:30) или нажми «Назад».")
         return SETTINGS_MORNING_TIME_INPUT
 
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.morning_time = t
-    s.save(update_fields=["morning_time"])
+    _change_setting(update, "morning_time", t)
 
     update.message.reply_text(
         f"✅ Утреннее напоминание установлено на {_format_time(t)}",
@@ -237,10 +250,7 @@ def set_evening_time_input(update: Update, context: CallbackContext):
         update.message.reply_text("❌ Не поняла. Введи время как HH:MM (например 21:00) или нажми «Назад».")
         return SETTINGS_EVENING_TIME_INPUT
 
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.evening_time = t
-    s.save(update_fields=["evening_time"])
+    _change_setting(update, "evening_time", t)
 
     update.message.reply_text(
         f"✅ Вечернее напоминание установлено на {_format_time(t)}",
@@ -282,10 +292,7 @@ def set_week_start_choose(update: Update, context: CallbackContext):
         update.message.reply_text("Не понял выбор. Нажми кнопку 👇", reply_markup=get_week_start_keyboard())
         return SETTINGS_WEEK_START_CHOOSE
 
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.week_start = _WEEK_START_MAP[text]
-    s.save(update_fields=["week_start"])
+    _change_setting(update, "week_start", _WEEK_START_MAP[text])
 
     update.message.reply_text(
         f"✅ Неделя теперь начинается с: {text}",
@@ -313,12 +320,8 @@ def timezone_choose(update: Update, context: CallbackContext):
     if text == BACK_BUTTON:
         return settings_menu(update, context)
 
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-
     if text == TZ_CHOOSE_MOSCOW:
-        s.timezone = TZ_MOSCOW
-        s.save(update_fields=["timezone"])
+        s = _change_setting(update, "timezone", TZ_MOSCOW)
         update.message.reply_text(
             f"✅ Часовой пояс установлен: {s.timezone}",
             reply_markup=get_settings_menu_keyboard(),
@@ -326,8 +329,7 @@ def timezone_choose(update: Update, context: CallbackContext):
         return SETTINGS_MENU
 
     if text == TZ_CHOOSE_UTC:
-        s.timezone = TZ_UTC
-        s.save(update_fields=["timezone"])
+        s = _change_setting(update, "timezone", TZ_UTC)
         update.message.reply_text(
             f"✅ Часовой пояс установлен: {s.timezone}",
             reply_markup=get_settings_menu_keyboard(),
@@ -361,8 +363,7 @@ def timezone_choose(update: Update, context: CallbackContext):
         offset = val if sign == "+" else -val
         tz_name = _utc_offset_to_iana(offset)
 
-        s.timezone = tz_name
-        s.save(update_fields=["timezone"])
+        s = _change_setting(update, "timezone", tz_name)
 
         update.message.reply_text(
             f"✅ Часовой пояс установлен: {text} ({s.timezone})",
@@ -389,10 +390,7 @@ def timezone_input(update: Update, context: CallbackContext):
         )
         return SETTINGS_TZ_INPUT
 
-    user = get_or_create_tg_user(update)
-    s = get_user_settings(user)
-    s.timezone = text
-    s.save(update_fields=["timezone"])
+    s = _change_setting(update, "timezone", text)
 
     update.message.reply_text(
         f"✅ Часовой пояс установлен: {s.timezone}",
@@ -2,22 +2,23 @@
 
 from __future__ import annotations
 
-import re
-from collections import Counter, defaultdict
 from datetime import timedelta
 
-from django.db.models import Q
-from django.utils import timezone
+from django.conf import settings
 
-from telegram import Update, ReplyKeyboardMarkup
+from telegram import Update
 from telegram.ext import CallbackContext, ConversationHandler
 
-from core.models import DailyEntry, Answer, WeeklyCycle, QuestionTemplate, StreakState
+from core.services import stats, stats_rollup, topics
 from core.bot.handlers.utils import get_or_create_tg_user, user_local_date
 from core.bot.keyboards.main_menu import (
     BACK_BUTTON,
+    STATS_TOPICS_WEEK_BUTTON,
+    STATS_TOPICS_MONTH_BUTTON,
+    STATS_TOPICS_YEAR_BUTTON,
     get_main_menu_keyboard,
     get_statistics_menu_keyboard,
+    get_statistics_topics_keyboard,
 )
 
 # ---------- buttons text-----
@@ -26,21 +27,17 @@ STATS_CHART_BUTTON = "График заполнений"
 STATS_TOPICS_BUTTON = "Частые темы благодарности"
 STATS_WEEKDAYS_BUTTON = "Статистика по дням недели"
 
+# окно «Частых тем» по кнопке: дней и подпись
+TOPIC_WINDOWS = {
+    STATS_TOPICS_BUTTON: (30, "30 дней"),
+    STATS_TOPICS_WEEK_BUTTON: (7, "7 дней"),
+    STATS_TOPICS_MONTH_BUTTON: (30, "30 дней"),
+    STATS_TOPICS_YEAR_BUTTON: (365, "год"),
+}
+
 # ---------- states ----------
 STATS_MENU = 401
 
-_WORD_RE = re.compile(r"[A-Za-zА-Яа-яЁё]+", re.UNICODE)
-
-# Можно расширить,
-RU_STOPWORDS = {
-    "и", "а", "но", "или", "что", "это", "как", "я", "мы", "ты", "он", "она", "они",
-    "в", "во", "на", "за", "к", "ко", "с", "со", "у", "о", "об", "от", "для", "по",
-    "из", "до", "без", "при", "же", "ли", "бы", "то", "там", "тут", "здесь",
-    "сегодня", "вчера", "завтра", "очень", "просто", "еще", "уже", "все", "всё",
-    "мне", "меня", "мой", "моя", "мои", "тебя", "твой", "твоя", "его", "ее", "её",
-    "быть", "была", "был", "были",
-}
-
 WEEKDAY_RU = {
     1: "Пн",
     2: "Вт",
@@ -65,49 +62,49 @@ def statistics_cancel(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 
+def _fill_flags(user, start, days: int) -> list[tuple]:
+    """
+    [(день, утро, вечер), ...] за days дней начиная со start:
+    из сводки StatsRollup или одним запросом по DailyEntry (STATS_USE_ROLLUP).
+    """
+    dates = [start + timedelta(days=i) for i in range(days)]
+    if getattr(settings, "STATS_USE_ROLLUP", True):
+        rollup = stats_rollup.get_rollup(user)
+        return [(d, *stats_rollup.day_flags(rollup, d)[1:]) for d in dates]
+    flags = stats.day_flags(user.id, dates[0], dates[-1])
+    return [(d, *flags.get(d, (False, False))) for d in dates]
+
+
 # -------------------- handlers for menu buttons --------------------
 def statistics_general(update: Update, context: CallbackContext):
     user = get_or_create_tg_user(update)
     today = user_local_date(user)
 
-    # За всё время
-    all_entries = DailyEntry.objects.filter(user=user)
-    total_days = all_entries.count()
-    days_with_any = all_entries.filter(Q(completed_morning=True) | Q(completed_evening=True)).count()
-    days_full = all_entries.filter(completed_morning=True, completed_evening=True).count()
-
-    # Последние 30 дней
-    since_30 = today - timedelta(days=29)
-    last30 = all_entries.filter(date__gte=since_30, date__lte=today).order_by("date")
-    last30_total = last30.count()
-    last30_any = last30.filter(Q(completed_morning=True) | Q(completed_evening=True)).count()
-    last30_full = last30.filter(completed_morning=True, completed_evening=True).count()
-
-    # Недельные циклы
-    cycles = WeeklyCycle.objects.filter(user=user)
-    weeks_total = cycles.count()
-    weeks_completed = cycles.filter(is_completed=True).count()
+    # одно чтение сводки или два агрегирующих запроса — цифры одни и те же
+    if getattr(settings, "STATS_USE_ROLLUP", True):
+        summary = stats_rollup.general_summary(user, today)
+    else:
+        summary = stats.general_summary(user.id, today)
 
     # Стрик (если таблица есть)
-    streak = StreakState.objects.filter(user=user).first()
-    if streak:
-        streak_line = f"🔥 Стрик: {streak.current_streak} (рекорд: {streak.best_streak})"
+    if summary["current_streak"] is not None:
+        streak_line = f"🔥 Стрик: {summary['current_streak']} (рекорд: {summary['best_streak']})"
     else:
         streak_line = "🔥 Стрик: пока не считаем (таблица StreakState пустая)"
 
     msg = (
         "📊 Общая статистика\n\n"
         f"🗓️ За всё время:\n"
-        f"• Дней в базе: {total_days}\n"
-        f"• Дней с любым заполнением (утро или вечер): {days_with_any}\n"
-        f"• Дней полностью (утро + вечер): {days_full}\n\n"
+        f"• Дней в базе: {summary['total_days']}\n"
+        f"• Дней с любым заполнением (утро или вечер): {summary['days_any']}\n"
+        f"• Дней полностью (утро + вечер): {summary['days_full']}\n\n"
         f"🕒 Последние 30 дней:\n"
-        f"• Дней: {last30_total}\n"
-        f"• С заполнением: {last30_any}/30\n"
-        f"• Полностью: {last30_full}/30\n\n"
+        f"• Дней: {summary['last30_total']}\n"
+        f"• С заполнением: {summary['last30_any']}/30\n"
+        f"• Полностью: {summary['last30_full']}/30\n\n"
         f"🗓️ Недели:\n"
-        f"• Недель создано: {weeks_total}\n"
-        f"• Недель завершено: {weeks_completed}\n\n"
+        f"• Недель создано: {summary['weeks_total']}\n"
+        f"• Недель завершено: {summary['weeks_completed']}\n\n"
         f"{streak_line}"
     )
 
@@ -120,25 +117,14 @@ def statistics_fill_chart(update: Update, context: CallbackContext):
     today = user_local_date(user)
     start = today - timedelta(days=13)
 
-    entries = {
-        e.date: e
-        for e in DailyEntry.objects.filter(user=user, date__gte=start, date__lte=today)
-    }
-
     lines = ["📈 График заполнений (последние 14 дней)\n"]
-    for i in range(14):
-        d = start + timedelta(days=i)
-        e = entries.get(d)
-
-        if not e:
-            box = "⬜️"
+    for d, morning, evening in _fill_flags(user, start, 14):
+        if morning and evening:
+            box = "🟩"
+        elif morning or evening:
+            box = "🟨"
         else:
-            if e.completed_morning and e.completed_evening:
-                box = "🟩"
-            elif e.completed_morning or e.completed_evening:
-                box = "🟨"
-            else:
-                box = "⬜️"
+            box = "⬜️"
 
         # квадратик всегда в одной и той же позиции (в начале строки)
         lines.append(f"{box}  {d:%d.%m} {WEEKDAY_RU[d.isoweekday()]}")
@@ -164,28 +150,22 @@ def statistics_weekdays(update: Update, context: CallbackContext):
     today = user_local_date(user)
     start = today - timedelta(days=55)
 
-    qs = DailyEntry.objects.filter(user=user, date__gte=start, date__lte=today)
-    stats = {i: {"total": 0, "any": 0, "full": 0} for i in range(1, 8)}
+    by_weekday = {i: {"total": 0, "any": 0, "full": 0} for i in range(1, 8)}
 
-    # посчитаем по календарным дням (даже если записи не создавались)
-    for i in range(56):
-        d = start + timedelta(days=i)
-        wd = d.isoweekday()
-        stats[wd]["total"] += 1
-
-    # теперь наложим реальные заполнения
-    for e in qs:
-        wd = e.date.isoweekday()
-        if e.completed_morning or e.completed_evening:
-            stats[wd]["any"] += 1
-        if e.completed_morning and e.completed_evening:
-            stats[wd]["full"] += 1
+    # считаем по календарным дням (даже если записи не создавались)
+    for d, morning, evening in _fill_flags(user, start, 56):
+        counts = by_weekday[d.isoweekday()]
+        counts["total"] += 1
+        if morning or evening:
+            counts["any"] += 1
+        if morning and evening:
+            counts["full"] += 1
 
     lines = ["📅 Статистика по дням недели (последние 8 недель)\n"]
     for wd in range(1, 8):
-        t = stats[wd]["total"]
-        any_ = stats[wd]["any"]
-        full = stats[wd]["full"]
+        t = by_weekday[wd]["total"]
+        any_ = by_weekday[wd]["any"]
+        full = by_weekday[wd]["full"]
         # простая “полоска” из 10 символов по доле any
         filled = int(round((any_ / t) * 10)) if t else 0
         bar = "🟩" * filled + "⬜️" * (10 - filled)
@@ -198,64 +178,27 @@ def statistics_weekdays(update: Update, context: CallbackContext):
 def statistics_topics(update: Update, context: CallbackContext):
     """
     Частые темы благодарности:
-    - берём ответы ВЕЧЕРА (period=evening)
-    - вынимаем слова, фильтруем стоп-слова
-    - показываем топ-10
+    - слова вечерних ответов уже посчитаны по дням (core.services.topics)
+    - топ-10 за окно кнопки (7/30/365 дней) — один запрос
     """
     user = get_or_create_tg_user(update)
     today = user_local_date(user)
-    start = today - timedelta(days=30)  # последние 31 день
+    days, label = TOPIC_WINDOWS.get(update.message.text, TOPIC_WINDOWS[STATS_TOPICS_BUTTON])
+    start = today - timedelta(days=days - 1)
 
-    answers = (
-        Answer.objects
-        .filter(daily_entry__user=user, daily_entry__date__gte=start, daily_entry__date__lte=today)
-        .select_related("question", "daily_entry")
-        .order_by("-created_at")
-    )
+    top = topics.top_terms(user.id, start, today)
 
-    # отфильтруем вечерние ответы
-    evening_answers = []
-    for a in answers:
-        period = getattr(a.question, "period", None)
-        if period == QuestionTemplate.PERIOD_EVENING:
-            evening_answers.append(a)
-            continue
-        # fallback: если вопрос удалили, попробуем по тексту
-        qt = (a.question_text or "").lower()
-        if "вечер" in qt or "🌙" in qt:
-            evening_answers.append(a)
-
-    if not evening_answers:
+    if not top:
         update.message.reply_text(
-            "Пока нет вечерних ответов за последние 30 дней.\n"
+            f"Пока нет тем в вечерних ответах за {label}.\n"
             "Заполни пару вечеров — и я покажу частые темы 🌙",
-            reply_markup=get_statistics_menu_keyboard(),
-        )
-        return STATS_MENU
-
-    counter = Counter()
-
-    for a in evening_answers:
-        text = (a.answer_text or "").lower()
-        words = _WORD_RE.findall(text)
-        for w in words:
-            if len(w) < 3:
-                continue
-            if w in RU_STOPWORDS:
-                continue
-            counter[w] += 1
-
-    if not counter:
-        update.message.reply_text(
-            "Не смогла выделить темы (слишком короткие ответы или только стоп-слова).",
-            reply_markup=get_statistics_menu_keyboard(),
+            reply_markup=get_statistics_topics_keyboard(),
         )
         return STATS_MENU
 
-    top = counter.most_common(10)
-    lines = ["✨ Частые темы благодарности (по вечерним ответам, 30 дней)\n"]
+    lines = [f"✨ Частые темы благодарности (по вечерним ответам, {label})\n"]
     for i, (w, c) in enumerate(top, 1):
         lines.append(f"{i}) {w} — {c}")
 
-    update.message.reply_text("\n".join(lines), reply_markup=get_statistics_menu_keyboard())
+    update.message.reply_text("\n".join(lines), reply_markup=get_statistics_topics_keyboard())
     return STATS_MENU
@@ -6,18 +6,25 @@ from turtle import update
 from django.utils import timezone
 
 from core.models import (
-    TelegramUser, DailyEntry, QuestionTemplate, UserSettings,
+    TelegramUser, DailyEntry, UserSettings,
     WeeklyCycle, WeeklyTask,
 )
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-
-import re
-from datetime import timezone as dt_timezone, timedelta
-
+from core.services import history, stats_rollup, user_cache
+from core.services.timezones import parse_user_timezone
 
 
 def get_or_create_tg_user(update) -> TelegramUser:
+    """
+    Пользователь с уже подгруженным user.settings.
+    Обычно берётся из user_cache без единого запроса к БД.
+    """
     tg = update.effective_user
+    cached = user_cache.get(tg.id)
+    if cached is not None and (cached.username, cached.first_name, cached.last_name) == (
+        tg.username, tg.first_name, tg.last_name,
+    ):
+        return cached
+
     user, _ = TelegramUser.objects.get_or_create(
         telegram_id=tg.id,
         defaults={
@@ -40,52 +47,32 @@ def get_or_create_tg_user(update) -> TelegramUser:
     if changed:
         user.save(update_fields=["username", "first_name", "last_name"])
 
-    # гарантируем настройки
-    UserSettings.objects.get_or_create(user=user)
+    # гарантируем настройки; индекс напоминаний для новых строит core.signals
+    settings, _ = UserSettings.objects.get_or_create(user=user)
 
+    user.settings = settings
+    user_cache.put(user, settings)
     return user
 
 
 def get_user_settings(user: TelegramUser) -> UserSettings:
-    settings, _ = UserSettings.objects.get_or_create(user=user)
-    return settings
+    # после get_or_create_tg_user настройки уже лежат в user.settings — без запроса
+    try:
+        return user.settings
+    except UserSettings.DoesNotExist:
+        settings, _ = UserSettings.objects.get_or_create(user=user)
+        return settings
 
 
 def get_or_create_today_entry(user: TelegramUser) -> DailyEntry:
     today = user_local_date(user)
-    entry, _ = DailyEntry.objects.get_or_create(user=user, date=today)
+    entry, created = DailyEntry.objects.get_or_create(user=user, date=today)
+    if created:
+        stats_rollup.entry_changed(entry)
+        history.day_changed(user.id, today)
     return entry
 
 
-def ensure_default_morning_questions():
-    if QuestionTemplate.objects.filter(period=QuestionTemplate.PERIOD_MORNING).exists():
-        return
-
-    defaults = [
-        ("intention", "☀️ Утро\n\n1) Какое намерение/фокус ты выбираешь на сегодня?", 1),
-        ("affirmation", "2) Положительная установка на день (1 фраза).", 2),
-        ("one_step", "3) Один маленький шаг, который точно сделаешь сегодня?", 3),
-    ]
-    for code, text, order in defaults:
-        QuestionTemplate.objects.create(
-            code=f"morning_{code}",
-            text=text,
-            period=QuestionTemplate.PERIOD_MORNING,
-            order=order,
-            is_active=True,
-        )
-
-
-def get_morning_questions():
-    ensure_default_morning_questions()
-    return list(
-        QuestionTemplate.objects.filter(
-            period=QuestionTemplate.PERIOD_MORNING,
-            is_active=True,
-        ).order_by("order")
-    )
-
-
 def get_week_start_for_user(today: date, week_start_iso: int) -> date:
     delta = (today.isoweekday() - week_start_iso) % 7
     return today - timedelta(days=delta)
@@ -106,11 +93,16 @@ def get_or_create_current_week_cycle(user: TelegramUser, today: date | None = No
         week_start=week_start,
         defaults={"week_end": week_end},
     )
+    if created:
+        stats_rollup.weeks_changed(user.id)
+    # неделя видна в «Истории» на каждом её дне
+    changed = created
 
     # поддержим актуальный week_end
     if cycle.week_end != week_end:
         cycle.week_end = week_end
         cycle.save(update_fields=["week_end"])
+        changed = True
 
     # подцепим задание по iso_year/iso_week
     if created or cycle.task_id is None:
@@ -123,7 +115,10 @@ def get_or_create_current_week_cycle(user: TelegramUser, today: date | None = No
         if task and cycle.task_id != task.id:
             cycle.task = task
             cycle.save(update_fields=["task"])
+            changed = True
 
+    if changed:
+        history.user_changed(user.id)
     return cycle
 
 
@@ -131,47 +126,8 @@ def get_or_create_current_week_cycle(user: TelegramUser, today: date | None = No
 
 
 
-_UTC_OFFSET_RE = re.compile(r"^UTC(?:(?P<sign>[+-])(?P<h>\d{1,2})(?::(?P<m>\d{2}))?)?$")
-
-
-def parse_user_timezone(tz_value: str):
-    """
-    Поддерживаем:
-    - "UTC"
-    - "UTC+3", "UTC-9", "UTC+9:30"
-    - IANA: "Europe/Moscow", "Europe/Nicosia", ...
-    Возвращает tzinfo.
-    """
-    tz_value = (tz_value or "").strip()
-    if not tz_value:
-        return ZoneInfo("UTC")
-
-    m = _UTC_OFFSET_RE.match(tz_value)
-    if m:
-        sign = m.group("sign")
-        if not sign:
-            return dt_timezone.utc
-
-        hours = int(m.group("h"))
-        minutes = int(m.group("m") or 0)
-        if hours > 14 or minutes not in (0, 15, 30, 45):
-            # чуть строже, чтобы не было мусора
-            return dt_timezone.utc
-
-        delta = timedelta(hours=hours, minutes=minutes)
-        if sign == "-":
-            delta = -delta
-        return dt_timezone(delta)
-
-    # IANA
-    try:
-        return ZoneInfo(tz_value)
-    except Exception:
-        return ZoneInfo("UTC")
-
-
 def get_user_tz(user: TelegramUser):
-    settings = UserSettings.objects.get_or_create(user=user)[0]
+    settings = get_user_settings(user)
     return parse_user_timezone(getattr(settings, "timezone", "UTC"))
 
 
@@ -13,6 +13,7 @@ from core.bot.keyboards.main_menu import (
     BACK_BUTTON,
 )
 from core.models import WeeklyCycle
+from core.services import history, stats_rollup
 # from core.bot.handlers.utils import get_or_create_tg_user, get_or_create_current_week_cycle
 
 
@@ -92,6 +93,7 @@ def week_handle_mid(update: Update, context: CallbackContext):
 
     cycle.mid_reflection = text
     cycle.save(update_fields=["mid_reflection"])
+    history.user_changed(cycle.user_id)
 
     update.message.reply_text(
         "2) Итог недели:\n"
@@ -116,6 +118,8 @@ def week_handle_final(update: Update, context: CallbackContext):
     cycle.final_reflection = text
     cycle.is_completed = True
     cycle.save(update_fields=["final_reflection", "is_completed"])
+    stats_rollup.weeks_changed(cycle.user_id)
+    history.user_changed(cycle.user_id)
 
     context.user_data.pop("week_cycle_id", None)
 
@@ -194,6 +198,8 @@ def week_redo(update: Update, context: CallbackContext):
     cycle.final_reflection = ""
     cycle.is_completed = False
     cycle.save(update_fields=["mid_reflection", "final_reflection", "is_completed"])
+    stats_rollup.weeks_changed(cycle.user_id)
+    history.user_changed(cycle.user_id)
 
     update.message.reply_text("Ок, заполним заново ❤️")
     return week_fill_start(update, context)
@@ -8,12 +8,25 @@ BACK_BUTTON = "⬅️ Назад в меню"
 HISTORY_BY_DATE_BUTTON = "Посмотреть ответы за дату"
 HISTORY_PROGRESS_BUTTON = "Посмотреть прогресс"
 HISTORY_SEARCH_BUTTON = "Поиск по записям"
+HISTORY_SEARCH_MORE_BUTTON = "Ещё результаты"
+HISTORY_EXPORT_BUTTON = "Экспорт записей"
+# период и формат выгрузки (core.services.export)
+EXPORT_WEEK_BUTTON = "За неделю"
+EXPORT_MONTH_BUTTON = "За месяц"
+EXPORT_ALL_BUTTON = "За всё время"
+EXPORT_TXT_BUTTON = "TXT"
+EXPORT_MD_BUTTON = "Markdown"
+EXPORT_JSON_BUTTON = "JSON"
 
 # --- Statistics buttons ---
 STATS_GENERAL_BUTTON = "Общая статистика"
 STATS_CHART_BUTTON = "График заполнений"
 STATS_TOPICS_BUTTON = "Частые темы благодарности"
 STATS_WEEKDAYS_BUTTON = "Статистика по дням недели"
+# окна «Частых тем» (сам STATS_TOPICS_BUTTON — 30 дней)
+STATS_TOPICS_WEEK_BUTTON = "Темы за 7 дней"
+STATS_TOPICS_MONTH_BUTTON = "Темы за 30 дней"
+STATS_TOPICS_YEAR_BUTTON = "Темы за год"
 
 # --- Settings buttons (вариант с тумблерами “вкл/выкл” в одном тексте) ---
 SET_TZ_BUTTON = "Часовой пояс"
@@ -83,6 +96,7 @@ def get_history_menu_keyboard():
         [
             [HISTORY_BY_DATE_BUTTON],
             [HISTORY_PROGRESS_BUTTON, HISTORY_SEARCH_BUTTON],
+            [HISTORY_EXPORT_BUTTON],
             [BACK_BUTTON],
         ],
         resize_keyboard=True,
@@ -103,6 +117,19 @@ def get_statistics_menu_keyboard():
     )
 
 
+def get_statistics_topics_keyboard():
+    return ReplyKeyboardMarkup(
+        [
+            [STATS_TOPICS_WEEK_BUTTON, STATS_TOPICS_MONTH_BUTTON, STATS_TOPICS_YEAR_BUTTON],
+            [STATS_GENERAL_BUTTON, STATS_CHART_BUTTON],
+            [STATS_WEEKDAYS_BUTTON],
+            [BACK_BUTTON],
+        ],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+    )
+
+
 def get_settings_menu_keyboard():
     return ReplyKeyboardMarkup(
         [
@@ -0,0 +1,317 @@
+# gratitude_bot/core/bot/persistence.py
+"""
+Внешнее хранилище состояния диалогов: context.user_data и шаги ConversationHandler.
+
+Без него morning_step, evening_step, week_cycle_id и т.п. живут только
+в памяти процесса: рестарт бота обрывает все начатые диалоги, а второй
+процесс бота не видит состояние первого.
+
+Хранилище — Redis (хэш bot:state:<telegram_id>), при недоступном Redis — БД
+(модель BotState). Выбор делается при старте (BOT_PERSISTENCE), чтобы данные
+не расходились между двумя хранилищами.
+
+- чтение: перед каждым обновлением одним запросом подтягиваем состояние
+  пользователя (refresh_user_data) — так процесс видит изменения других процессов;
+- запись: синхронная (write-through) — шаг диалога и user_data уходят в
+  хранилище до того, как обработка обновления закончится, поэтому следующее
+  сообщение пользователя, попавшее в другой процесс, видит актуальный шаг.
+  Неизменившиеся user_data не пишутся вовсе. Если хранилище не ответило,
+  изменения остаются в памяти и повторяются раз в BOT_PERSISTENCE_FLUSH_INTERVAL
+  секунд; до повтора refresh_user_data этого процесса подмешивает их сам.
+
+Ключи диалогов считаются по пользователю (key[-1] — user_id): у всех наших
+ConversationHandler per_user=True и per_message=False.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.conf import settings as dj_settings
+from django.db import close_old_connections
+
+from telegram import Update
+from telegram.ext import BasePersistence, TypeHandler
+
+from core.models import BotState
+from core.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CONV_PREFIX = "conv:"
+REDIS_PREFIX = "bot:state:"
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in bot state")
+
+
+def _object_hook(obj: dict):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_default, ensure_ascii=False, sort_keys=True)
+
+
+def loads(raw: str):
+    return json.loads(raw, object_hook=_object_hook)
+
+
+def conv_field(name: str, key: tuple) -> str:
+    return f"{CONV_PREFIX}{name}:{json.dumps(list(key))}"
+
+
+def parse_conv_field(field: str) -> tuple[str, tuple]:
+    name, _, key = field[len(CONV_PREFIX):].partition(":")
+    return name, tuple(json.loads(key))
+
+
+# --- хранилища ---
+
+class RedisStateStore:
+    def __init__(self, client=None, ttl_days: int = 30):
+        self.client = client or get_redis()
+        self.ttl_ms = ttl_days * 24 * 3600 * 1000
+
+    def load(self, telegram_id: int) -> dict[str, str]:
+        raw = self.client.hgetall(f"{REDIS_PREFIX}{telegram_id}")
+        return {k.decode(): v.decode() for k, v in raw.items()}
+
+    def save(self, changes: dict[int, dict[str, str | None]]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for telegram_id, fields in changes.items():
+            key = f"{REDIS_PREFIX}{telegram_id}"
+            to_set = {f: v for f, v in fields.items() if v is not None}
+            to_delete = [f for f, v in fields.items() if v is None]
+            if to_set:
+                pipe.hset(key, mapping=to_set)
+            if to_delete:
+                pipe.hdel(key, *to_delete)
+            # брошенные диалоги не должны жить вечно
+            pipe.pexpire(key, self.ttl_ms)
+        pipe.execute()
+
+
+class DbStateStore:
+    def load(self, telegram_id: int) -> dict[str, str]:
+        return dict(BotState.objects.filter(telegram_id=telegram_id).values_list("key", "value"))
+
+    def save(self, changes: dict[int, dict[str, str | None]]) -> None:
+        rows = [
+            BotState(telegram_id=telegram_id, key=field, value=value)
+            for telegram_id, fields in changes.items()
+            for field, value in fields.items()
+            if value is not None
+        ]
+        if rows:
+            BotState.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["telegram_id", "key"],
+                update_fields=["value", "updated_at"],
+            )
+        for telegram_id, fields in changes.items():
+            deleted = [f for f, v in fields.items() if v is None]
+            if deleted:
+                BotState.objects.filter(telegram_id=telegram_id, key__in=deleted).delete()
+
+
+# --- persistence для Dispatcher ---
+
+class StatePersistence(BasePersistence):
+    def __init__(self, store, flush_interval: float = 0.2):
+        super().__init__(store_user_data=True, store_chat_data=False, store_bot_data=False)
+        self.store = store
+        self.flush_interval = flush_interval
+        self._conversations: dict[str, dict] = {}
+        # какие ключи диалогов уже есть в памяти у пользователя — чтобы снимать завершённые в другом процессе
+        self._user_conv: dict[int, set[tuple[str, tuple]]] = defaultdict(set)
+        # последний записанный/прочитанный user_data (JSON) — не пишем то же самое повторно
+        self._last_user_data: dict[int, str | None] = {}
+        # то, что не удалось записать: повторяет фоновый поток
+        self._pending: dict[int, dict[str, str | None]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        # запись обработчика и повтор из фонового потока не должны обгонять друг друга
+        self._save_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    # запуск фоновых повторов — при первом set_bot (его вызывает Dispatcher)
+    def set_bot(self, bot) -> None:
+        super().set_bot(bot)
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="bot-state-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            if not self._pending:
+                continue
+            # поток живёт долго — сами следим за соединением с БД (DbStateStore)
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.flush()
+
+    # --- загрузка при старте: всё подтягиваем лениво в refresh_user_data ---
+
+    def get_user_data(self):
+        return defaultdict(dict)
+
+    def get_chat_data(self):
+        return defaultdict(dict)
+
+    def get_bot_data(self):
+        return {}
+
+    def get_conversations(self, name: str) -> dict:
+        return self._conversations.setdefault(name, {})
+
+    # --- чтение перед обработкой обновления ---
+
+    def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        try:
+            stored = self.store.load(user_id)
+        except Exception:
+            # хранилище недоступно — продолжаем с тем, что есть в памяти
+            logger.exception("Failed to load bot state for %s", user_id)
+            return
+
+        with self._lock:
+            # ещё не записанные изменения этого процесса новее того, что в хранилище
+            stored.update(self._pending.get(user_id, {}))
+
+            raw = stored.get(USER_DATA)
+            self._last_user_data[user_id] = raw
+            user_data.clear()
+            if raw is not None:
+                user_data.update(loads(raw))
+
+            seen = set()
+            for field, value in stored.items():
+                if not field.startswith(CONV_PREFIX):
+                    continue
+                name, key = parse_conv_field(field)
+                conversations = self._conversations.get(name)
+                if conversations is None:
+                    continue
+                if value is None:
+                    conversations.pop(key, None)
+                else:
+                    conversations[key] = loads(value)
+                    seen.add((name, key))
+
+            for name, key in self._user_conv[user_id] - seen:
+                self._conversations[name].pop(key, None)
+            self._user_conv[user_id] = seen
+
+    # --- запись после обработки (write-through) ---
+
+    def update_user_data(self, user_id: int, data: dict) -> None:
+        raw = dumps(data) if data else None
+        with self._lock:
+            if self._last_user_data.get(user_id) == raw:
+                return
+            self._last_user_data[user_id] = raw
+        self._write(user_id, {USER_DATA: raw})
+
+    def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        user_id = key[-1]
+        with self._lock:
+            if new_state is None:
+                self._user_conv[user_id].discard((name, key))
+            else:
+                self._user_conv[user_id].add((name, key))
+        self._write(user_id, {conv_field(name, key): None if new_state is None else dumps(new_state)})
+
+    def _write(self, user_id: int, fields: dict[str, str | None]) -> None:
+        with self._save_lock:
+            with self._lock:
+                # заодно дописываем то, что не ушло раньше; новые значения важнее
+                fields = {**self._pending.pop(user_id, {}), **fields}
+            try:
+                self.store.save({user_id: fields})
+            except Exception:
+                logger.exception("Failed to save bot state for %s, will retry", user_id)
+                with self._lock:
+                    self._pending[user_id] = {**fields, **self._pending.get(user_id, {})}
+
+    def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    def update_bot_data(self, data) -> None:
+        pass
+
+    def flush(self) -> None:
+        """
+        Повторить запись того, что не удалось записать сразу.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, defaultdict(dict)
+
+            try:
+                self.store.save(dict(batch))
+            except Exception:
+                logger.exception("Failed to save bot state for %s users, will retry", len(batch))
+                with self._lock:
+                    # вернуть в очередь, не затирая то, что успело измениться после
+                    for user_id, fields in batch.items():
+                        for field, value in fields.items():
+                            self._pending[user_id].setdefault(field, value)
+
+
+def _noop(update, context):
+    pass
+
+
+def refresh_handler() -> TypeHandler:
+    """
+    Хендлер на группу -1: срабатывает на любое обновление раньше ConversationHandler,
+    поэтому refresh_user_data успевает подтянуть состояние диалога до того,
+    как ConversationHandler решит, на каком шаге пользователь.
+    """
+    return TypeHandler(Update, _noop)
+
+
+def build_persistence() -> StatePersistence | None:
+    """
+    BOT_PERSISTENCE: "redis" (по умолчанию; если Redis не отвечает — БД), "db" или "" (выключено).
+    """
+    backend = getattr(dj_settings, "BOT_PERSISTENCE", "redis")
+    if not backend:
+        return None
+
+    flush_interval = getattr(dj_settings, "BOT_PERSISTENCE_FLUSH_INTERVAL", 0.2)
+    if backend == "redis":
+        store = RedisStateStore(ttl_days=getattr(dj_settings, "BOT_STATE_TTL_DAYS", 30))
+        try:
+            store.client.ping()
+        except Exception:
+            logger.warning("Redis is unavailable, storing bot state in the database", exc_info=True)
+        else:
+            return StatePersistence(store, flush_interval)
+    elif backend != "db":
+        raise ValueError(f"Unknown BOT_PERSISTENCE {backend!r}, expected 'redis', 'db' or ''")
+
+    return StatePersistence(DbStateStore(), flush_interval)
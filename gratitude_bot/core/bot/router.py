@@ -0,0 +1,57 @@
+# gratitude_bot/core/bot/router.py
+"""
+Маршрутизация кнопок по точному тексту через словарь.
+
+Раньше каждая кнопка была отдельным MessageHandler(Filters.regex(rf"^{TEXT}$")),
+и входящий текст прогонялся через регулярку за регуляркой — в каждом
+ConversationHandler (allow_reentry=True проверяет ещё и entry_points).
+ExactTextHandler заменяет подряд идущие такие хендлеры одним поиском в dict.
+
+Порядок хендлеров не меняется: ExactTextHandler стоит там же, где стояла
+первая из заменённых регулярок, а хендлеры вида Filters.text & ~Filters.command
+остаются после него как запасной вариант — семантика шагов диалогов та же.
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable
+
+from telegram import Update
+from telegram.ext import Filters, Handler, MessageHandler
+
+
+class ExactTextHandler(Handler):
+    """
+    ExactTextHandler({BACK_BUTTON: settings_cancel, SET_TZ_BUTTON: timezone_start})
+    """
+
+    def __init__(self, routes: dict[str, Callable]):
+        # callback базового Handler не используется: колбэк выбирается в check_update
+        super().__init__(callback=self._unused)
+        self.routes = dict(routes)
+
+    @staticmethod
+    def _unused(update, context):  # pragma: no cover
+        raise RuntimeError("ExactTextHandler dispatches via check_update")
+
+    def check_update(self, update: object):
+        # те же типы обновлений, что и у MessageHandler по умолчанию (Filters.update)
+        if not isinstance(update, Update):
+            return None
+        message = update.message or update.edited_message or update.channel_post or update.edited_channel_post
+        if message is None or not message.text:
+            return None
+        return self.routes.get(message.text)
+
+    def handle_update(self, update, dispatcher, check_result, context):
+        self.collect_additional_context(context, update, dispatcher, check_result)
+        return check_result(update, context)
+
+    def as_regex_handlers(self) -> list[MessageHandler]:
+        """
+        Эквивалентная цепочка регулярок (как было до роутера) — для бенчмарка.
+        """
+        return [
+            MessageHandler(Filters.regex(rf"^{re.escape(text)}$"), callback)
+            for text, callback in self.routes.items()
+        ]
@@ -0,0 +1,146 @@
+# gratitude_bot/core/bot/webhook.py
+"""
+Приём обновлений через webhook внутри Django-приложения.
+
+View (core.views.telegram_webhook) только разбирает JSON и кладёт Update
+в UpdatePipeline, а отвечает Telegram сразу. Обработкой занимаются
+BOT_UPDATE_WORKERS потоков; чат всегда попадает в один и тот же поток
+(chat_id % workers), поэтому сообщения одного чата обрабатываются строго
+по порядку и состояние ConversationHandler не ломается, а разные чаты
+идут параллельно.
+
+BOT_RUNTIME = "asyncio" подменяет пул потоков на AsyncUpdateRuntime
+(core.bot.aio_runtime) с тем же интерфейсом.
+
+Шаги диалогов и user_data хранятся вне процесса (core.bot.persistence,
+BOT_PERSISTENCE): запись синхронная, а перед каждым обновлением состояние
+пользователя перечитывается. Поэтому рестарт не обрывает начатые диалоги,
+и приложение можно запускать несколькими процессами — следующее сообщение
+чата, попавшее в другой процесс, увидит актуальный шаг. Строгий порядок
+сообщений одного чата пайплайн гарантирует только внутри процесса: если два
+сообщения чата придут в разные процессы одновременно, порядок не определён
+(для строгого порядка — один процесс или run_bot --set-webhook --max-connections 1).
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+
+from django.conf import settings as dj_settings
+from django.db import close_old_connections
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineFull(Exception):
+    """Очередь воркера переполнена — пусть Telegram повторит доставку позже."""
+
+
+class UpdatePipeline:
+    def __init__(self, dispatcher, workers: int = 8, queue_size: int = 1000):
+        self.dispatcher = dispatcher
+        self.workers = max(1, workers)
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> "UpdatePipeline":
+        for i, q in enumerate(self._queues):
+            t = threading.Thread(target=self._run, args=(q,), name=f"bot-update-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Update pipeline started (workers=%s)", self.workers)
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        if self.dispatcher.persistence:
+            self.dispatcher.persistence.flush()
+
+    def join(self) -> None:
+        """
+        Дождаться, пока все уже принятые обновления будут обработаны.
+        """
+        for q in self._queues:
+            q.join()
+
+    @staticmethod
+    def route_key(update: Update) -> int:
+        # порядок важен внутри чата; у апдейтов без чата (inline и т.п.) — по пользователю
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return update.update_id
+
+    def submit(self, update: Update) -> None:
+        q = self._queues[self.route_key(update) % self.workers]
+        try:
+            q.put_nowait(update)
+        except queue.Full:
+            raise PipelineFull(f"update queue is full (update_id={update.update_id})") from None
+
+    def submit_json(self, data: dict) -> Update:
+        update = Update.de_json(data, self.dispatcher.bot)
+        self.submit(update)
+        return update
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            update = q.get()
+            try:
+                if update is None:
+                    return
+                # поток живёт долго — не держим протухшие соединения с БД
+                close_old_connections()
+                self.dispatcher.process_update(update)
+            except Exception:
+                logger.exception("Error while processing update %s", getattr(update, "update_id", None))
+            finally:
+                close_old_connections()
+                q.task_done()
+
+
+RUNTIMES = ("threads", "asyncio")
+
+
+def make_pipeline(dispatcher, runtime: str | None = None, workers: int | None = None, queue_size: int | None = None):
+    """
+    UpdatePipeline ("threads") или AsyncUpdateRuntime ("asyncio"), ещё не запущенный.
+    """
+    runtime = runtime or getattr(dj_settings, "BOT_RUNTIME", "threads")
+    workers = workers or getattr(dj_settings, "BOT_UPDATE_WORKERS", 8)
+    queue_size = queue_size or getattr(dj_settings, "BOT_UPDATE_QUEUE_SIZE", 1000)
+    if runtime == "asyncio":
+        from core.bot.aio_runtime import AsyncUpdateRuntime
+
+        return AsyncUpdateRuntime(dispatcher, workers=workers, queue_size=queue_size)
+    if runtime == "threads":
+        return UpdatePipeline(dispatcher, workers=workers, queue_size=queue_size)
+    raise ValueError(f"Unknown BOT_RUNTIME {runtime!r}, expected one of {RUNTIMES}")
+
+
+_lock = threading.Lock()
+_pipeline = None
+
+
+def get_pipeline():
+    """
+    Пайплайн процесса: Updater с хендлерами строится при первом обращении.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _lock:
+            if _pipeline is None:
+                # импорт здесь, чтобы URLConf не тянул все хендлеры при старте
+                from core.bot.bot import build_updater
+
+                updater = build_updater(workers=getattr(dj_settings, "BOT_UPDATE_WORKERS", 8))
+                _pipeline = make_pipeline(updater.dispatcher).start()
+    return _pipeline
@@ -0,0 +1,117 @@
+# gratitude_bot/core/management/commands/bench_answers.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from telegram import Update
+
+from core.bot.bot import build_updater
+from core.models import StreakState, TelegramUser
+from core.services import questions, user_cache
+from core.services.fake_telegram import FakeTelegramServer
+
+# заведомо не пересекается с настоящими telegram_id
+FIRST_CHAT_ID = 9_100_000_000
+
+
+class RoundTrips:
+    """
+    Считает обращения к БД: каждый SQL-запрос плюс BEGIN и COMMIT
+    у явных транзакций (в автокоммите их нет).
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.transactions = 0
+        self._outer_atomic = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql == "BEGIN":
+            # SQLite открывает транзакцию явным запросом — он уже учтён в transactions
+            return execute(sql, params, many, context)
+        blocks = context["connection"].atomic_blocks
+        if blocks and blocks[0] is not self._outer_atomic:
+            self.transactions += 1
+        self._outer_atomic = blocks[0] if blocks else None
+        self.statements += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def total(self) -> int:
+        return self.statements + 2 * self.transactions
+
+
+def _update(update_id: int, chat_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+class Command(BaseCommand):
+    help = "DB round-trips per completed evening: answers written one by one vs buffered (BOT_BUFFER_ANSWERS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+
+    def handle(self, *args, **options):
+        server = FakeTelegramServer(("127.0.0.1", 0), latency=0).start()
+        settings.TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN or "123456:bench"
+        settings.TELEGRAM_API_BASE_URL = server.base_url
+        # считаем только записи ответов, состояние диалога держим в памяти
+        settings.BOT_PERSISTENCE = ""
+
+        chat_ids = range(FIRST_CHAT_ID, FIRST_CHAT_ID + options["users"])
+        answers = [f"Ответ {n}" for n in range(len(questions.for_period("evening")))]
+        try:
+            for buffered in (False, True):
+                TelegramUser.objects.filter(telegram_id__in=chat_ids).delete()
+                user_cache.clear()
+                self._run(buffered, chat_ids, answers)
+        finally:
+            server.stop()
+            TelegramUser.objects.filter(telegram_id__in=chat_ids).delete()
+
+    def _run(self, buffered: bool, chat_ids, answers: list[str]):
+        settings.BOT_BUFFER_ANSWERS = buffered
+        dispatcher = build_updater(workers=1).dispatcher
+        update_id = 0
+
+        def send(chat_id: int, text: str):
+            nonlocal update_id
+            update_id += 1
+            dispatcher.process_update(Update.de_json(_update(update_id, chat_id, text), dispatcher.bot))
+
+        # регистрация и вход в вечер — вне замера; стрик уже есть, как у постоянных пользователей
+        for chat_id in chat_ids:
+            send(chat_id, "/start")
+            send(chat_id, "Вечер")
+        StreakState.objects.bulk_create([
+            StreakState(user=user) for user in TelegramUser.objects.filter(telegram_id__in=chat_ids)
+        ])
+
+        counter = RoundTrips()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for chat_id in chat_ids:
+                for text in answers:
+                    send(chat_id, text)
+        elapsed = time.perf_counter() - started
+
+        completed = TelegramUser.objects.filter(
+            telegram_id__in=chat_ids, daily_entries__completed_evening=True,
+        ).count()
+        per_evening = max(completed, 1)
+        self.stdout.write(
+            f"{'buffered' if buffered else 'direct':8} evenings={completed} "
+            f"round_trips/evening={counter.total / per_evening:.1f} "
+            f"(statements={counter.statements / per_evening:.1f}, transactions={counter.transactions / per_evening:.1f}) "
+            f"time/evening={elapsed / per_evening * 1000:.1f}ms"
+        )
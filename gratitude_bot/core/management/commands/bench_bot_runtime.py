@@ -0,0 +1,99 @@
+# gratitude_bot/core/management/commands/bench_bot_runtime.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.bot.bot import build_updater
+from core.bot.keyboards.main_menu import BACK_BUTTON
+from core.bot.webhook import RUNTIMES, make_pipeline
+from core.models import TelegramUser
+from core.services.fake_telegram import FakeTelegramServer
+
+# диалог, который прогоняем в каждом чате: открыть настройки и вернуться
+SCRIPT = ["/start", "Настройки", BACK_BUTTON]
+# ответы бота на SCRIPT по порядку (начало текста) — для проверки порядка внутри чата
+EXPECTED_PREFIXES = ["Привет", "Настройки", "Ок"]
+
+# заведомо не пересекается с настоящими telegram_id
+FIRST_CHAT_ID = 9_000_000_000
+
+
+def _update(update_id: int, chat_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare update runtimes (threads vs asyncio) on the real handlers "
+        "against a local fake Telegram API"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runtime", choices=RUNTIMES, action="append", help="Default: all runtimes")
+        parser.add_argument("--chats", type=int, default=200)
+        parser.add_argument("--rounds", type=int, default=2, help="How many times each chat repeats the script")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--latency", type=float, default=0.05, help="Fake API latency per request, seconds")
+
+    def handle(self, *args, **options):
+        server = FakeTelegramServer(("127.0.0.1", 0), latency=options["latency"]).start()
+        settings.TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN or "123456:bench"
+        settings.TELEGRAM_API_BASE_URL = server.base_url
+
+        chat_ids = range(FIRST_CHAT_ID, FIRST_CHAT_ID + options["chats"])
+        try:
+            for runtime in options["runtime"] or RUNTIMES:
+                self._run(runtime, server, chat_ids, options)
+        finally:
+            server.stop()
+            TelegramUser.objects.filter(telegram_id__in=chat_ids).delete()
+
+    def _run(self, runtime: str, server: FakeTelegramServer, chat_ids, options):
+        workers = options["workers"]
+        updater = build_updater(workers=workers)
+        updates = [
+            _update(0, chat_id, text)
+            for _ in range(options["rounds"])
+            for text in SCRIPT
+            for chat_id in chat_ids
+        ]
+        for n, data in enumerate(updates, start=1):
+            data["update_id"] = data["message"]["message_id"] = n
+
+        # очередь с запасом — бенчмарк не должен упираться в backpressure
+        pipeline = make_pipeline(updater.dispatcher, runtime=runtime, workers=workers, queue_size=len(updates))
+        pipeline.start()
+
+        server.reset()
+        started = time.perf_counter()
+        for data in updates:
+            pipeline.submit_json(data)
+        pipeline.join()
+        elapsed = time.perf_counter() - started
+        pipeline.stop()
+
+        replies: dict[int, list[str]] = {}
+        for message in server.messages:
+            replies.setdefault(int(message["chat_id"]), []).append(message["text"])
+        out_of_order = sum(
+            1 for chat_id in chat_ids
+            if not all(
+                text.startswith(prefix)
+                for text, prefix in zip(replies.get(chat_id, []), EXPECTED_PREFIXES * options["rounds"])
+            )
+        )
+
+        self.stdout.write(
+            f"{runtime:8} updates={len(updates)} time={elapsed:.2f}s rate={len(updates) / elapsed:.0f}/s "
+            f"replies={len(server.messages)} out_of_order_chats={out_of_order}"
+        )
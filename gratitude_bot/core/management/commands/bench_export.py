@@ -0,0 +1,119 @@
+# gratitude_bot/core/management/commands/bench_export.py
+import io
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.models import Answer, DailyEntry, QuestionTemplate, TelegramUser, WeeklyCycle
+from core.services import export
+from core.services.questions import DEFAULT_QUESTIONS
+
+# заведомо не пересекается с настоящими telegram_id
+BENCH_CHAT_ID = 9_300_000_000
+
+WORDS = [
+    "мама", "папа", "сестра", "друг", "подруга", "работа", "проект", "коллеги", "отпуск", "море",
+    "солнце", "утро", "прогулка", "парк", "кофе", "чай", "завтрак", "книга", "фильм", "музыка",
+    "спорт", "йога", "отдых", "здоровье", "спокойствие", "радость", "поддержка", "тишина", "дом",
+    "благодарна", "спасибо", "за", "и", "сегодня", "очень", "тёплый",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark history export on a synthetic multi-year history of one user: "
+        "loading everything into memory vs the streamed export (time and peak Python memory)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, default=5)
+        parser.add_argument("--words-per-answer", type=int, default=25)
+        parser.add_argument("--format", choices=export.FORMATS, default="md")
+        parser.add_argument("--chunk-size", type=int, default=export.CHUNK_SIZE)
+        parser.add_argument("--keep", action="store_true", help="Keep the synthetic user for the next run")
+
+    def handle(self, *args, **options):
+        try:
+            user, last_day = self._corpus(options["years"], options["words_per_answer"])
+            self._bench(user, options["years"], last_day, options["format"], options["chunk_size"])
+        finally:
+            if not options["keep"]:
+                TelegramUser.objects.filter(telegram_id=BENCH_CHAT_ID).delete()
+
+    def _corpus(self, years: int, words_per_answer: int) -> tuple[TelegramUser, date]:
+        last_day = date(2025, 12, 31)
+        first_day = last_day - timedelta(days=365 * years - 1)
+
+        user = TelegramUser.objects.filter(telegram_id=BENCH_CHAT_ID).first()
+        if user and DailyEntry.objects.filter(user=user, date=first_day).exists():
+            self.stdout.write(f"reusing corpus: {Answer.objects.filter(daily_entry__user=user).count()} answers")
+            return user, last_day
+
+        TelegramUser.objects.filter(telegram_id=BENCH_CHAT_ID).delete()
+        started = time.perf_counter()
+        user = TelegramUser.objects.create(telegram_id=BENCH_CHAT_ID)
+        days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+        DailyEntry.objects.bulk_create(
+            (DailyEntry(user=user, date=day, completed_morning=True, completed_evening=True) for day in days),
+            batch_size=2000,
+        )
+
+        rnd = random.Random(42)
+        questions = [
+            (period, text)
+            for period in (QuestionTemplate.PERIOD_MORNING, QuestionTemplate.PERIOD_EVENING)
+            for _, text in DEFAULT_QUESTIONS[period]
+        ]
+        answers = (
+            Answer(
+                daily_entry_id=entry_id, period=period, question_text=text,
+                answer_text=" ".join(rnd.choices(WORDS, k=words_per_answer)),
+            )
+            for entry_id in DailyEntry.objects.filter(user=user).order_by("date").values_list("id", flat=True)
+            for period, text in questions
+        )
+        Answer.objects.bulk_create(answers, batch_size=5000)
+
+        week = first_day - timedelta(days=first_day.weekday())
+        WeeklyCycle.objects.bulk_create(
+            WeeklyCycle(
+                user=user, week_start=week + timedelta(weeks=i), week_end=week + timedelta(weeks=i, days=6),
+                mid_reflection=" ".join(rnd.choices(WORDS, k=words_per_answer)),
+                final_reflection=" ".join(rnd.choices(WORDS, k=words_per_answer)), is_completed=True,
+            )
+            for i in range((last_day - week).days // 7 + 1)
+        )
+
+        total = Answer.objects.filter(daily_entry__user=user).count()
+        self.stdout.write(
+            f"corpus: {len(days)} days, {total} answers in {time.perf_counter() - started:.1f}s"
+        )
+        return user, last_day
+
+    def _bench(self, user: TelegramUser, years: int, last_day: date, fmt: str, chunk_size: int):
+        def in_memory(start: date) -> tuple[int, int]:
+            # всё сразу: строки одной выборкой, документ целиком в памяти
+            buf = io.StringIO()
+            counts = export.write_export(buf, user.id, start, last_day, fmt, chunk_size=10**9)
+            return counts.answers, len(buf.getvalue().encode())
+
+        def streamed(start: date) -> tuple[int, int]:
+            with export.export_file(user.id, start, last_day, fmt, chunk_size) as (document, counts):
+                return counts.answers, document.seek(0, 2)
+
+        for years_back in sorted({1, years}):
+            start = last_day - timedelta(days=365 * years_back - 1)
+            for name, run in (("in-memory", in_memory), ("streamed", streamed)):
+                tracemalloc.start()
+                started = time.perf_counter()
+                total, size = run(start)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{years_back}y {name:9} answers={total} document={size / 1024 / 1024:.1f}MiB "
+                    f"time={elapsed:.2f}s peak_python_mem={peak / 1024 / 1024:.1f}MiB"
+                )
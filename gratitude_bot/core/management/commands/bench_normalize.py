@@ -0,0 +1,76 @@
+# gratitude_bot/core/management/commands/bench_normalize.py
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import normalize
+from core.services.stemmer import stem as stem_uncached
+
+# основы и окончания синтетических ответов: разные формы одних слов
+BASES = [
+    "мам", "пап", "сестр", "брат", "друг", "подруг", "работ", "проект", "коллег", "отпуск",
+    "мор", "солнц", "прогулк", "парк", "кофе", "завтрак", "ужин", "книг", "фильм", "музык",
+    "спорт", "йог", "отдых", "здоровь", "спокойстви", "радост", "поддержк", "помощ", "тишин", "дом",
+    "кошк", "собак", "дожд", "цвет", "подарк", "звонк", "встреч", "благодарн", "тепл", "семь",
+]
+ENDINGS = ["", "а", "е", "у", "ой", "ы", "ам", "ами", "ах", "ие", "ия", "ю", "ом", "ость", "ую", "ые"]
+FILLERS = ["и", "за", "сегодня", "очень", "что", "спасибо", "было", "день", "вечер", "утро"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the topic/search text pipeline on a synthetic corpus: "
+        "tokenizing alone, Snowball stemming without cache and with the LRU cache"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--answers", type=int, default=100_000)
+        parser.add_argument("--words-per-answer", type=int, default=12)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        vocab = [base + ending for base in BASES for ending in ENDINGS] + FILLERS
+        # частота слов падает с рангом (Ципф) — как в живых ответах
+        weights = [1 / rank for rank in range(1, len(vocab) + 1)]
+        rnd.shuffle(vocab)
+        texts = [
+            " ".join(rnd.choices(vocab, weights, k=options["words_per_answer"]))
+            for _ in range(options["answers"])
+        ]
+        tokens = sum(1 for text in texts for _ in normalize.words(text))
+        self.stdout.write(f"corpus: {len(texts)} answers, {tokens} tokens, vocabulary {len(vocab)}")
+
+        def tokenize_only():
+            for text in texts:
+                for _ in normalize.words(text):
+                    pass
+
+        def uncached():
+            for text in texts:
+                for w in normalize.words(text):
+                    stem_uncached(w)
+
+        def cached():
+            for text in texts:
+                for w in normalize.words(text):
+                    normalize.stem(w)
+
+        normalize.stem.cache_clear()
+        for name, run in (
+            ("tokenize", tokenize_only),
+            ("stem", uncached),
+            ("stem+lru cold", cached),
+            ("stem+lru warm", cached),
+        ):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name:14} {tokens / elapsed:>12,.0f} tokens/s  {elapsed:.2f}s")
+
+        info = normalize.stem.cache_info()
+        self.stdout.write(
+            f"lru: hits={info.hits} misses={info.misses} size={info.currsize}/{info.maxsize} "
+            f"hit_rate={info.hits / max(1, info.hits + info.misses):.1%}"
+        )
@@ -0,0 +1,131 @@
+# gratitude_bot/core/management/commands/bench_router.py
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from telegram import Update
+from telegram.ext import ConversationHandler
+
+from core.bot.bot import build_updater
+from core.bot.handlers.evening_flow import EVENING_ANSWER
+from core.bot.handlers.morning_flow import MORNING_ANSWER
+from core.bot.handlers.settings_flow import SETTINGS_MENU, TOGGLE_MISSED_BUTTON
+from core.bot.handlers.statistics_flow import STATS_MENU, STATS_WEEKDAYS_BUTTON
+from core.bot.handlers.week_flow import WEEK_REDO_BUTTON
+from core.bot.keyboards.main_menu import BACK_BUTTON
+from core.bot.router import ExactTextHandler
+
+# (текст, в каком диалоге и на каком шаге пользователь) — смесь кнопок и свободных ответов
+SAMPLES = [
+    ("Сегодня", None),
+    ("Настройки", None),
+    (WEEK_REDO_BUTTON, None),
+    (BACK_BUTTON, None),
+    ("просто текст вне диалога", None),
+    (TOGGLE_MISSED_BUTTON, ("settings", SETTINGS_MENU)),
+    (STATS_WEEKDAYS_BUTTON, ("statistics", STATS_MENU)),
+    ("Сегодня благодарю за солнечное утро", ("morning", MORNING_ANSWER)),
+    ("За поддержку друга", ("evening", EVENING_ANSWER)),
+    (BACK_BUTTON, ("evening", EVENING_ANSWER)),
+]
+
+
+def _update(update_id: int, chat_id: int, text: str) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }, None)
+
+
+def _expand_to_regex(handlers: list) -> None:
+    # «как было»: каждый ExactTextHandler обратно в цепочку регулярок, на том же месте
+    handlers[:] = [
+        h for handler in handlers
+        for h in (handler.as_regex_handlers() if isinstance(handler, ExactTextHandler) else [handler])
+    ]
+
+
+def _legacy(handlers: list) -> list:
+    _expand_to_regex(handlers)
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            _expand_to_regex(handler.entry_points)
+            for state_handlers in handler.states.values():
+                _expand_to_regex(state_handlers)
+    return handlers
+
+
+def _callback(handler, check):
+    # какой колбэк в итоге вызовется — чтобы сверить, что роутер ничего не поменял
+    if handler is None:
+        return None
+    if isinstance(handler, ConversationHandler):
+        _, inner, inner_check = check
+        return _callback(inner, inner_check)
+    if isinstance(handler, ExactTextHandler):
+        return check.__name__
+    return handler.callback.__name__
+
+
+class Command(BaseCommand):
+    help = "Measure per-update handler dispatch cost: exact-text router vs the old regex chain"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--updates", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=500)
+
+    def handle(self, *args, **options):
+        settings.TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN or "123456:bench"
+        settings.BOT_PERSISTENCE = ""  # только диспетчеризация, без хранилищ
+
+        rnd = random.Random(42)
+        plan = [(n, rnd.randrange(options["users"]) + 1, rnd.choice(SAMPLES)) for n in range(options["updates"])]
+
+        results = {}
+        for variant in ("regex", "router"):
+            handlers = build_updater().dispatcher.handlers[0]
+            if variant == "regex":
+                handlers = _legacy(handlers)
+            conversations = {h.name: h for h in handlers if isinstance(h, ConversationHandler)}
+
+            updates = [(_update(n, chat_id, text), state) for n, chat_id, (text, state) in plan]
+
+            # состояния выставляем заново перед каждым апдейтом — время этого не входит в замер
+            elapsed = 0.0
+            chosen = []
+            for update, state in updates:
+                chat_id = update.effective_chat.id
+                for conv in conversations.values():
+                    conv.conversations.pop((chat_id, chat_id), None)
+                if state:
+                    conversations[state[0]].conversations[(chat_id, chat_id)] = state[1]
+
+                started = time.perf_counter()
+                for handler in handlers:
+                    check = handler.check_update(update)
+                    if check is not None and check is not False:
+                        break
+                else:
+                    handler = check = None
+                elapsed += time.perf_counter() - started
+                chosen.append(_callback(handler, check))
+
+            results[variant] = (elapsed, chosen)
+            self.stdout.write(
+                f"{variant:6} {len(updates)} updates: {elapsed / len(updates) * 1e6:.1f} us/update, "
+                f"{len(handlers)} top-level handlers"
+            )
+
+        regex_time, regex_chosen = results["regex"]
+        router_time, router_chosen = results["router"]
+        same = sum(1 for a, b in zip(regex_chosen, router_chosen) if a == b)
+        self.stdout.write(
+            f"speedup x{regex_time / router_time:.1f}; same callback chosen for {same}/{len(plan)} updates"
+        )
@@ -0,0 +1,134 @@
+# gratitude_bot/core/management/commands/bench_search.py
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Answer, DailyEntry, QuestionTemplate, TelegramUser
+from core.services import search
+from core.services.questions import DEFAULT_QUESTIONS
+
+# заведомо не пересекается с настоящими telegram_id
+FIRST_CHAT_ID = 9_200_000_000
+
+# словарь синтетических ответов: разные формы одних слов — чтобы было видно стемминг
+WORDS = [
+    "мама", "маме", "мамой", "папа", "папе", "сестра", "сестре", "брат", "друг", "друзьям", "подруга",
+    "работа", "работе", "проект", "коллеги", "коллегам", "отпуск", "море", "морем", "солнце", "солнечное",
+    "утро", "утром", "вечер", "прогулка", "прогулку", "парк", "кофе", "чай", "завтрак", "ужин",
+    "книга", "книгу", "фильм", "музыка", "музыку", "спорт", "йога", "бег", "сон", "отдых",
+    "здоровье", "спокойствие", "радость", "поддержка", "поддержку", "помощь", "тишина", "дом", "дома",
+    "кошка", "собака", "собакой", "дождь", "снег", "цветы", "подарок", "звонок", "встреча", "встречу",
+    "благодарна", "благодарю", "спасибо", "за", "и", "с", "на", "в", "сегодня", "очень", "тёплый", "тёплую",
+]
+# что ищем: часть — словарные формы, которых нет в тексте дословно (находит только полнотекстовый)
+QUERIES = ["мама", "маму", "работа", "море", "прогулки", "книги", "поддержка", "встреча", "собака", "друзья"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark history search on a synthetic corpus: the old icontains scan "
+        "vs Postgres full-text search (GIN on Answer.search_vector)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--answers", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--keep", action="store_true", help="Keep the corpus for the next run")
+
+    def handle(self, *args, **options):
+        if not search.full_text_available():
+            raise CommandError("Full-text search needs PostgreSQL (DATABASES['default'])")
+
+        chat_ids = range(FIRST_CHAT_ID, FIRST_CHAT_ID + options["users"])
+        try:
+            user_ids = self._corpus(chat_ids, options["answers"])
+            self._bench(user_ids, options["queries"])
+        finally:
+            if not options["keep"]:
+                TelegramUser.objects.filter(telegram_id__in=chat_ids).delete()
+
+    def _corpus(self, chat_ids, answers: int) -> list[int]:
+        existing = Answer.objects.filter(daily_entry__user__telegram_id__in=chat_ids).count()
+        if existing >= answers:
+            self.stdout.write(f"reusing corpus: {existing} answers")
+            return list(TelegramUser.objects.filter(telegram_id__in=chat_ids).values_list("id", flat=True))
+
+        TelegramUser.objects.filter(telegram_id__in=chat_ids).delete()
+        started = time.perf_counter()
+        TelegramUser.objects.bulk_create([TelegramUser(telegram_id=chat_id) for chat_id in chat_ids])
+        user_ids = list(TelegramUser.objects.filter(telegram_id__in=chat_ids).values_list("id", flat=True))
+
+        # 4 вечерних ответа в день
+        questions = [text for _, text in DEFAULT_QUESTIONS[QuestionTemplate.PERIOD_EVENING]]
+        days = max(1, -(-answers // (len(user_ids) * len(questions))))
+        first_day = date(2020, 1, 1)
+        DailyEntry.objects.bulk_create(
+            (
+                DailyEntry(user_id=user_id, date=first_day + timedelta(days=day), completed_evening=True)
+                for user_id in user_ids
+                for day in range(days)
+            ),
+            batch_size=5000,
+        )
+
+        # тексты генерирует сама БД — миллион строк через ORM заняли бы минуты;
+        # search_vector заполняет триггер, как и в бою
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO core_answer (daily_entry_id, question_text, answer_text, period, created_at)
+                SELECT e.id, (%(questions)s::text[])[g],
+                    (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(n_words)s)::int], ' ')
+                     FROM generate_series(1, 5 + (e.id + g) %% 8)),
+                    %(period)s, now()
+                FROM core_dailyentry e CROSS JOIN generate_series(1, %(per_day)s) g
+                WHERE e.user_id = ANY(%(user_ids)s)
+                """,
+                {
+                    "questions": questions, "words": WORDS, "n_words": len(WORDS),
+                    "per_day": len(questions), "user_ids": user_ids,
+                    "period": QuestionTemplate.PERIOD_EVENING,
+                },
+            )
+            cursor.execute("ANALYZE core_dailyentry")
+            cursor.execute("ANALYZE core_answer")
+
+        total = Answer.objects.filter(daily_entry__user_id__in=user_ids).count()
+        self.stdout.write(f"corpus: {total} answers, {len(user_ids)} users in {time.perf_counter() - started:.1f}s")
+        return user_ids
+
+    def _bench(self, user_ids: list[int], queries: int):
+        rnd = random.Random(42)
+        plan = [(rnd.choice(user_ids), rnd.choice(QUERIES)) for _ in range(queries)]
+
+        def legacy(user_id: int, text: str) -> list:
+            # как было в history_search_input
+            return list(
+                Answer.objects.filter(daily_entry__user_id=user_id)
+                .filter(Q(answer_text__icontains=text) | Q(question_text__icontains=text))
+                .select_related("daily_entry", "question")
+                .order_by("-daily_entry__date", "-created_at")[:10]
+            )
+
+        def full_text(user_id: int, text: str) -> list:
+            return search.search_answers(user_id, text)[0]
+
+        for name, run in (("icontains", legacy), ("full-text", full_text)):
+            timings, empty = [], 0
+            for user_id, text in plan:
+                started = time.perf_counter()
+                found = run(user_id, text)
+                timings.append((time.perf_counter() - started) * 1000)
+                empty += not found
+            timings.sort()
+            self.stdout.write(
+                f"{name:9} queries={len(plan)} p50={statistics.median(timings):.1f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.1f}ms max={timings[-1]:.1f}ms "
+                f"no_results={empty}"
+            )
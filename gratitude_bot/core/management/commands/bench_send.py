@@ -0,0 +1,64 @@
+# gratitude_bot/core/management/commands/bench_send.py
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.services import telegram_sender
+from core.services.fake_telegram import FakeTelegramServer
+from core.services.outbox import OutboundQueue
+
+MODES = ("sync", "async")
+
+# заведомо не пересекается с настоящими telegram_id
+FIRST_CHAT_ID = 9_100_000_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare reminder send modes (sync flush vs asyncio flush_async) "
+        "against a local fake Telegram API with latency and injected 429s"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=MODES, action="append", help="Default: both modes")
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--rate", type=float, default=30, help="Token bucket rate, messages per second")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--latency", type=float, default=0.05, help="Fake API latency per request, seconds")
+        parser.add_argument("--flood-every", type=int, default=40, help="Every N-th request answers 429, 0 = never")
+
+    def handle(self, *args, **options):
+        server = FakeTelegramServer(
+            ("127.0.0.1", 0), latency=options["latency"], flood_every=options["flood_every"],
+        ).start()
+        settings.TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN or "123456:bench"
+        settings.TELEGRAM_API_BASE_URL = server.base_url
+        # пул соединений не должен быть узким местом асинхронного режима
+        settings.TELEGRAM_POOL_SIZE = max(settings.TELEGRAM_POOL_SIZE, options["concurrency"])
+        bot = telegram_sender.init_bot()
+        try:
+            for mode in options["mode"] or MODES:
+                self._run(mode, bot, server, options)
+        finally:
+            server.stop()
+
+    def _run(self, mode: str, bot, server: FakeTelegramServer, options):
+        queue = OutboundQueue(bot=bot, rate=options["rate"])
+        for i in range(options["messages"]):
+            queue.put(FIRST_CHAT_ID + i, "🌿 bench")
+
+        server.reset()
+        started = time.perf_counter()
+        if mode == "async":
+            report = asyncio.run(queue.flush_async(options["concurrency"]))
+        else:
+            report = queue.flush()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{mode:5} messages={options['messages']} time={elapsed:.2f}s rate={report.sent / elapsed:.1f}/s "
+            f"sent={report.sent} retried={report.retried} failed={report.failed} "
+            f"requests={server.stats()['requests']} connections={server.stats()['connections']}"
+        )
@@ -0,0 +1,17 @@
+# gratitude_bot/core/management/commands/dump_metrics.py
+from django.core.management.base import BaseCommand
+
+from core.services import metrics
+
+
+class Command(BaseCommand):
+    help = "Print reminder scheduler metrics in Prometheus text format"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset all metrics after printing")
+
+    def handle(self, *args, **options):
+        self.stdout.write(metrics.render(), ending="")
+        if options["reset"]:
+            metrics.reset()
+            self.stderr.write("Metrics reset")
@@ -0,0 +1,47 @@
+# gratitude_bot/core/management/commands/export_history.py
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bot.handlers.utils import user_local_date
+from core.models import TelegramUser
+from core.services import export
+
+
+def _date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Bad date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Export a user's entries for a date range as TXT, Markdown or JSON (streamed, flat memory)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("telegram_id", type=int)
+        parser.add_argument("--from", dest="start", type=_date, help="YYYY-MM-DD, default: first entry")
+        parser.add_argument("--to", dest="end", type=_date, help="YYYY-MM-DD, default: today in the user's timezone")
+        parser.add_argument("--format", choices=export.FORMATS, default="md")
+        parser.add_argument("--output", "-o", help="File path, default: stdout")
+        parser.add_argument("--chunk-size", type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = TelegramUser.objects.filter(telegram_id=options["telegram_id"]).first()
+        if user is None:
+            raise CommandError(f"No user with telegram_id={options['telegram_id']}")
+
+        # «сегодня» — по часовому поясу пользователя, а не сервера
+        start, end = options["start"], options["end"] or user_local_date(user)
+        if start and start > end:
+            raise CommandError("--from is after --to")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="\n") as out:
+                counts = export.write_export(out, user.id, start, end, options["format"], options["chunk_size"])
+            where = f" to {options['output']}"
+        else:
+            counts = export.write_export(sys.stdout, user.id, start, end, options["format"], options["chunk_size"])
+            where = ""
+        self.stderr.write(self.style.SUCCESS(f"Exported {counts.answers} answers and {counts.weeks} weeks{where}"))
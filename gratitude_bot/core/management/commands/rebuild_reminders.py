@@ -0,0 +1,15 @@
+# gratitude_bot/core/management/commands/rebuild_reminders.py
+from django.core.management.base import BaseCommand
+
+from core.services.reminders import rebuild_all_reminders
+
+
+class Command(BaseCommand):
+    help = "Rebuild ReminderSchedule (next reminder time in UTC) for all users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_all_reminders(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} reminder rows"))
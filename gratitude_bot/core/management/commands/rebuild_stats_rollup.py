@@ -0,0 +1,15 @@
+# gratitude_bot/core/management/commands/rebuild_stats_rollup.py
+from django.core.management.base import BaseCommand
+
+from core.services.stats_rollup import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild StatsRollup (per-user statistics summary) for all users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} statistics rollups"))
@@ -0,0 +1,15 @@
+# gratitude_bot/core/management/commands/rebuild_term_counts.py
+from django.core.management.base import BaseCommand
+
+from core.services.topics import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild TermCount (per-day word frequencies of evening answers) for all users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = rebuild_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} term counts"))
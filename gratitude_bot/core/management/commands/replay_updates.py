@@ -0,0 +1,58 @@
+# gratitude_bot/core/management/commands/replay_updates.py
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "POST recorded Telegram updates (JSON lines) to the webhook endpoint "
+        "and report the accepted rate"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File with one Update JSON object per line")
+        parser.add_argument("--url", default="http://127.0.0.1:8000/telegram/webhook")
+        parser.add_argument("--concurrency", type=int, default=8, help="Parallel HTTP connections, like max_connections")
+        parser.add_argument("--repeat", type=int, default=1, help="Send the file N times with fresh update_id")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], encoding="utf-8") as f:
+                recorded = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read updates: {e}")
+
+        updates = []
+        for i in range(options["repeat"]):
+            for n, data in enumerate(recorded):
+                updates.append({**data, "update_id": i * len(recorded) + n + 1})
+
+        secret = getattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+
+        def post(data: dict) -> int:
+            req = urllib.request.Request(options["url"], data=json.dumps(data).encode(), headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=10) as resp:
+                    return resp.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            statuses = list(pool.map(post, updates))
+        elapsed = time.perf_counter() - started
+
+        ok = sum(1 for s in statuses if s == 200)
+        self.stdout.write(
+            f"{len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.0f}/s), "
+            f"accepted={ok} rejected={len(updates) - ok}"
+        )
@@ -1,13 +1,64 @@
 # gratitude_bot/core/management/commands/run_bot.py
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
 from core.bot.bot import build_updater
+from core.bot.webhook import RUNTIMES, make_pipeline
 
 
 class Command(BaseCommand):
-    help = "Run Telegram bot (polling)"
+    help = "Run Telegram bot (polling) or register a webhook served by the Django app"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--set-webhook",
+            action="store_true",
+            help="Register TELEGRAM_WEBHOOK_URL with Telegram and exit (updates go to /telegram/webhook)",
+        )
+        parser.add_argument(
+            "--delete-webhook",
+            action="store_true",
+            help="Remove the webhook and exit (needed before switching back to polling)",
+        )
+        parser.add_argument("--max-connections", type=int, default=40)
+        parser.add_argument(
+            "--runtime",
+            choices=RUNTIMES,
+            default=getattr(settings, "BOT_RUNTIME", "threads"),
+            help="threads: PTB Updater polling; asyncio: event loop + bounded handler pool",
+        )
 
     def handle(self, *args, **options):
-        updater = build_updater()
+        workers = getattr(settings, "BOT_UPDATE_WORKERS", 8)
+        updater = build_updater(workers=workers)
+
+        if options["set_webhook"]:
+            url = getattr(settings, "TELEGRAM_WEBHOOK_URL", None)
+            if not url:
+                raise CommandError("TELEGRAM_WEBHOOK_URL is not set")
+            secret = getattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+            if not secret:
+                raise CommandError("TELEGRAM_WEBHOOK_SECRET is not set (the webhook view rejects updates without it)")
+            updater.bot.set_webhook(
+                url=url,
+                secret_token=secret,
+                max_connections=options["max_connections"],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Webhook set to {url}"))
+            return
+
+        if options["delete_webhook"]:
+            updater.bot.delete_webhook()
+            self.stdout.write(self.style.SUCCESS("Webhook deleted"))
+            return
+
+        if options["runtime"] == "asyncio":
+            runtime = make_pipeline(updater.dispatcher, runtime="asyncio", workers=workers).start()
+            try:
+                runtime.run_polling()
+            finally:
+                runtime.stop()
+            return
+
         updater.start_polling()
         updater.idle()
@@ -0,0 +1,34 @@
+# gratitude_bot/core/management/commands/run_fake_telegram.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.fake_telegram import FakeTelegramServer
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Telegram Bot API (set TELEGRAM_API_BASE_URL to its base url)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument("--latency", type=float, default=0.0, help="Artificial delay per request, seconds")
+        parser.add_argument("--flood-every", type=int, default=0, help="Answer every N-th request with 429")
+        parser.add_argument("--stats-every", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        server = FakeTelegramServer(
+            (options["host"], options["port"]),
+            latency=options["latency"],
+            flood_every=options["flood_every"],
+        ).start()
+        self.stdout.write(f"Fake Telegram API on {server.base_url}")
+        try:
+            while True:
+                time.sleep(options["stats_every"])
+                self.stdout.write(str(server.stats()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(str(server.stats()))
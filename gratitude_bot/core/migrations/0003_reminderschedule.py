@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:33
+
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Логика расписания скопирована сюда на момент миграции: миграция не должна
+# зависеть от core.services, которые потом меняются.
+MISSED_CHECK_TIME = time(12, 0)
+
+_UTC_OFFSET_RE = re.compile(r"^UTC(?:(?P<sign>[+-])(?P<h>\d{1,2})(?::(?P<m>\d{2}))?)?$")
+
+
+def parse_user_timezone(tz_value):
+    tz_value = (tz_value or "").strip()
+    if not tz_value:
+        return dt_timezone.utc
+
+    m = _UTC_OFFSET_RE.match(tz_value)
+    if m:
+        sign = m.group("sign")
+        if not sign:
+            return dt_timezone.utc
+        hours = int(m.group("h"))
+        minutes = int(m.group("m") or 0)
+        if hours > 14 or minutes not in (0, 15, 30, 45):
+            return dt_timezone.utc
+        delta = timedelta(hours=hours, minutes=minutes)
+        return dt_timezone(-delta if sign == "-" else delta)
+
+    try:
+        return ZoneInfo(tz_value)
+    except Exception:
+        return dt_timezone.utc
+
+
+def next_occurrence(tz, at, after):
+    local_day = after.astimezone(tz).date()
+    for offset in range(3):
+        candidate = datetime.combine(local_day + timedelta(days=offset), at, tzinfo=tz).astimezone(dt_timezone.utc)
+        if candidate > after:
+            return candidate
+    raise AssertionError("unreachable: no occurrence within 3 days")
+
+
+def backfill_schedule(apps, schema_editor):
+    from django.utils import timezone
+
+    UserSettings = apps.get_model("core", "UserSettings")
+    ReminderSchedule = apps.get_model("core", "ReminderSchedule")
+
+    now = timezone.now()
+    rows = []
+    for s in UserSettings.objects.all().iterator(chunk_size=1000):
+        tz = parse_user_timezone(s.timezone)
+        for kind, enabled, at in (
+            ("morning", s.morning_enabled, s.morning_time),
+            ("evening", s.evening_enabled, s.evening_time),
+            ("missed", s.notify_missed_days, MISSED_CHECK_TIME),
+        ):
+            next_run_at = next_occurrence(tz, at, now) if enabled else None
+            rows.append(ReminderSchedule(user_id=s.user_id, kind=kind, next_run_at=next_run_at))
+        if len(rows) >= 1000:
+            ReminderSchedule.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    if rows:
+        ReminderSchedule.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_weeklytask_iso_week_weeklytask_iso_year_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('morning', 'Утро'), ('evening', 'Вечер'), ('missed', 'Проверка пропуска')], max_length=16, verbose_name='Вид напоминания')),
+                ('next_run_at', models.DateTimeField(blank=True, db_index=True, help_text='Пусто, если напоминание выключено.', null=True, verbose_name='Следующее срабатывание (UTC)')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_schedules', to='core.telegramuser', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Расписание напоминания',
+                'verbose_name_plural': 'Расписание напоминаний',
+                'unique_together': {('user', 'kind')},
+            },
+        ),
+        migrations.RunPython(backfill_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_reminderschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('morning', 'Утро'), ('evening', 'Вечер'), ('missed', 'Проверка пропуска')], max_length=16, verbose_name='Вид напоминания')),
+                ('local_date', models.DateField(db_index=True, verbose_name='Локальная дата')),
+                ('tick', models.CharField(db_index=True, max_length=64, verbose_name='Tick, занявший запись')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Отправлено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_reminders', to='core.telegramuser', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Отправленное напоминание',
+                'verbose_name_plural': 'Отправленные напоминания',
+                'unique_together': {('user', 'kind', 'local_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_sentreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.BigIntegerField(db_index=True, verbose_name='Telegram ID')),
+                ('key', models.CharField(help_text='user_data или conv:<имя диалога>:<ключ диалога>', max_length=128, verbose_name='Ключ')),
+                ('value', models.TextField(verbose_name='Значение (JSON)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Состояние диалога',
+                'verbose_name_plural': 'Состояния диалогов',
+                'unique_together': {('telegram_id', 'key')},
+            },
+        ),
+    ]
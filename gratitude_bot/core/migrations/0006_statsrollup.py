@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_botstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsRollup',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats_rollup', serialize=False, to='core.telegramuser', verbose_name='Пользователь')),
+                ('total_days', models.PositiveIntegerField(default=0, verbose_name='Дней в базе')),
+                ('days_any', models.PositiveIntegerField(default=0, verbose_name='Дней с любым заполнением')),
+                ('days_full', models.PositiveIntegerField(default=0, verbose_name='Дней полностью')),
+                ('weeks_total', models.PositiveIntegerField(default=0, verbose_name='Недель создано')),
+                ('weeks_completed', models.PositiveIntegerField(default=0, verbose_name='Недель завершено')),
+                ('recent_anchor', models.DateField(blank=True, null=True, verbose_name='Последний день в масках')),
+                ('recent_entries', models.BigIntegerField(default=0, verbose_name='Маска: запись дня есть')),
+                ('recent_morning', models.BigIntegerField(default=0, verbose_name='Маска: утро заполнено')),
+                ('recent_evening', models.BigIntegerField(default=0, verbose_name='Маска: вечер заполнен')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Сводка статистики',
+                'verbose_name_plural': 'Сводки статистики',
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+BACKFILL_BATCH = 10000
+
+# Вектор считается в БД: одна функция для триггера и для заполнения старых строк.
+# Ответ весомее вопроса (A/B) — это учитывает ранжирование в core.services.search.
+CREATE_TRIGGER = """
+CREATE FUNCTION core_answer_search_vector(answer_text text, question_text text) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('pg_catalog.russian', coalesce(answer_text, '')), 'A')
+        || setweight(to_tsvector('pg_catalog.russian', coalesce(question_text, '')), 'B')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION core_answer_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := core_answer_search_vector(NEW.answer_text, NEW.question_text);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_answer_search_vector_update
+    BEFORE INSERT OR UPDATE OF answer_text, question_text ON core_answer
+    FOR EACH ROW EXECUTE FUNCTION core_answer_search_vector_trigger();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS core_answer_search_vector_update ON core_answer;
+DROP FUNCTION IF EXISTS core_answer_search_vector_trigger();
+DROP FUNCTION IF EXISTS core_answer_search_vector(text, text);
+"""
+
+
+def _postgres(schema_editor) -> bool:
+    # tsvector, триггер и GIN есть только в Postgres; на SQLite (локальная
+    # разработка) поле остаётся пустым, а поиск идёт по icontains (core.services.search)
+    return schema_editor.connection.vendor == "postgresql"
+
+
+def create_trigger(apps, schema_editor):
+    if _postgres(schema_editor):
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if _postgres(schema_editor):
+        schema_editor.execute(DROP_TRIGGER)
+
+
+def backfill_search_vector(apps, schema_editor):
+    if not _postgres(schema_editor):
+        return
+    # пачками по id: без одной длинной транзакции и блокировки всей таблицы
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(min(id), 0), coalesce(max(id), 0) FROM core_answer")
+        first_id, last_id = cursor.fetchone()
+        for start in range(first_id, last_id + 1, BACKFILL_BATCH):
+            cursor.execute(
+                "UPDATE core_answer SET search_vector = core_answer_search_vector(answer_text, question_text) "
+                "WHERE id >= %s AND id < %s AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH],
+            )
+
+
+class AddSearchIndexConcurrently(AddIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if _postgres(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if _postgres(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # пачки заполнения и CREATE INDEX CONCURRENTLY — вне общей транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_statsrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddSearchIndexConcurrently(
+            model_name='answer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_answer_search_gin'),
+        ),
+    ]
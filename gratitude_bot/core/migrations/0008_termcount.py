@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_answer_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Сколько раз')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_counts', to='core.telegramuser', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Частота слова',
+                'verbose_name_plural': 'Частоты слов',
+                'unique_together': {('user', 'date', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:06
+
+from django.db import migrations, models
+
+# Старые строки TermCount хранят слово целиком (term без основы, word пустой).
+# После миграции пересчитайте их: python manage.py rebuild_term_counts.
+# До пересчёта core.services.topics.top_terms сам приводит такие строки к основам.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_termcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termcount',
+            name='word',
+            field=models.CharField(blank=True, default='', help_text='Самая частая форма основы за день', max_length=64, verbose_name='Слово'),
+        ),
+        migrations.AlterField(
+            model_name='termcount',
+            name='term',
+            field=models.CharField(max_length=64, verbose_name='Основа слова'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:08
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+BACKFILL_BATCH = 10000
+
+# Старые ответы без шаблона — по тексту вопроса: сначала точное совпадение
+# с текстом шаблона или с вопросами, которые были зашиты в код, затем по словам.
+# Вечер до реестра вопросов сохранялся с question=None, а шаблоны вечера
+# создаются лениво (questions.ensure_defaults) и к миграции их может не быть.
+LEGACY_QUESTIONS = {
+    "morning": [
+        "☀️ Утро\n\n1) Какое намерение/фокус ты выбираешь на сегодня?",
+        "2) Положительная установка на день (1 фраза).",
+        "3) Один маленький шаг, который точно сделаешь сегодня?",
+    ],
+    "evening": [
+        "🌙 Вечер\n\n1) За что ты сегодня благодарна?",
+        "2) Прекрасные моменты дня сегодня — какие они?",
+        "3) Что я смогу сделать завтра, чтобы сделать свой день лучше?",
+        "✨ Что было самым хорошим/тёплым событием дня?",
+    ],
+}
+MORNING_TEXT = Q(question_text__icontains="утро") | Q(question_text__contains="☀️")
+EVENING_TEXT = (
+    Q(question_text__icontains="вечер")
+    | Q(question_text__contains="🌙")
+    | Q(question_text__icontains="благодар")
+)
+
+
+def backfill_period(apps, schema_editor):
+    # пачками по id: без одной длинной транзакции и блокировки всей таблицы
+    Answer = apps.get_model("core", "Answer")
+    QuestionTemplate = apps.get_model("core", "QuestionTemplate")
+    periods = [period for period, _ in QuestionTemplate._meta.get_field("period").choices]
+    # текст вопроса совпадает с нынешним шаблоном — период шаблона
+    texts = {
+        period: list(QuestionTemplate.objects.filter(period=period).values_list("text", flat=True))
+        + LEGACY_QUESTIONS.get(period, [])
+        for period in periods
+    }
+
+    bounds = Answer.objects.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return
+    for start in range(bounds["first"], bounds["last"] + 1, BACKFILL_BATCH):
+        batch = Answer.objects.filter(id__gte=start, id__lt=start + BACKFILL_BATCH, period="")
+        for period in periods:
+            batch.filter(question__period=period).update(period=period)
+        orphans = batch.filter(question__isnull=True)
+        for period in periods:
+            orphans.filter(question_text__in=texts[period]).update(period=period)
+        orphans.filter(MORNING_TEXT).update(period="morning")
+        orphans.filter(EVENING_TEXT).update(period="evening")
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    # на SQLite (локальная разработка) CONCURRENTLY нет — обычный CREATE INDEX
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # пачки заполнения и CREATE INDEX CONCURRENTLY — вне общей транзакции
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_termcount_word'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='period',
+            field=models.CharField(blank=True, choices=[('morning', 'Утро'), ('evening', 'Вечер'), ('weekly', 'Недельный вопрос')], default='', max_length=20, verbose_name='Период'),
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='answer',
+            index=models.Index(fields=['daily_entry', 'period'], name='core_answer_entry_period_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 # gratitude_bot/core/models.py
 from datetime import time
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -92,6 +94,122 @@ class UserSettings(models.Model):
         return f"Настройки {self.user}"
 
 
+class ReminderSchedule(models.Model):
+    """
+    Индекс напоминаний: когда (в UTC) пользователю в следующий раз положено
+    напоминание конкретного вида. Пересчитывается при изменении настроек
+    и после каждого срабатывания, чтобы tick не перебирал всех пользователей.
+    """
+    KIND_MORNING = "morning"
+    KIND_EVENING = "evening"
+    KIND_MISSED = "missed"
+
+    KIND_CHOICES = [
+        (KIND_MORNING, "Утро"),
+        (KIND_EVENING, "Вечер"),
+        (KIND_MISSED, "Проверка пропуска"),
+    ]
+
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name="reminder_schedules",
+        verbose_name="Пользователь",
+    )
+    kind = models.CharField(
+        "Вид напоминания",
+        max_length=16,
+        choices=KIND_CHOICES,
+    )
+    next_run_at = models.DateTimeField(
+        "Следующее срабатывание (UTC)",
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Пусто, если напоминание выключено.",
+    )
+
+    class Meta:
+        verbose_name = "Расписание напоминания"
+        verbose_name_plural = "Расписание напоминаний"
+        unique_together = ("user", "kind")
+
+    def __str__(self):
+        return f"{self.user} — {self.kind} @ {self.next_run_at}"
+
+
+class SentReminder(models.Model):
+    """
+    Журнал отправленных напоминаний: не больше одного напоминания
+    каждого вида на пользователя за локальный день.
+    Строку «занимают» до отправки — кто вставил, тот и отправляет.
+    """
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name="sent_reminders",
+        verbose_name="Пользователь",
+    )
+    kind = models.CharField(
+        "Вид напоминания",
+        max_length=16,
+        choices=ReminderSchedule.KIND_CHOICES,
+    )
+    local_date = models.DateField(
+        "Локальная дата",
+        db_index=True,
+    )
+    tick = models.CharField(
+        "Tick, занявший запись",
+        max_length=64,
+        db_index=True,
+    )
+    created_at = models.DateTimeField(
+        "Отправлено",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Отправленное напоминание"
+        verbose_name_plural = "Отправленные напоминания"
+        unique_together = ("user", "kind", "local_date")
+
+    def __str__(self):
+        return f"{self.user} — {self.kind} {self.local_date}"
+
+
+class BotState(models.Model):
+    """
+    Состояние диалогов бота (user_data и шаги ConversationHandler) в БД.
+    Используется persistence-бэкендом, когда Redis недоступен
+    (см. core.bot.persistence).
+    """
+    telegram_id = models.BigIntegerField(
+        "Telegram ID",
+        db_index=True,
+    )
+    key = models.CharField(
+        "Ключ",
+        max_length=128,
+        help_text="user_data или conv:<имя диалога>:<ключ диалога>",
+    )
+    value = models.TextField(
+        "Значение (JSON)",
+    )
+    updated_at = models.DateTimeField(
+        "Обновлено",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Состояние диалога"
+        verbose_name_plural = "Состояния диалогов"
+        unique_together = ("telegram_id", "key")
+
+    def __str__(self):
+        return f"{self.telegram_id} — {self.key}"
+
+
 class DailyEntry(models.Model):
     """
     Дневная запись: всё, что пользователь написал за конкретный день.
@@ -220,15 +338,35 @@ class Answer(models.Model):
     answer_text = models.TextField(
         "Ответ пользователя",
     )
+    # Блок, в котором дан ответ — ставится при записи (и не зависит от судьбы шаблона);
+    # пусто — не удалось определить (старые ответы без шаблона, см. миграцию 0010)
+    period = models.CharField(
+        "Период",
+        max_length=20,
+        choices=QuestionTemplate.PERIOD_CHOICES,
+        blank=True,
+        default="",
+    )
     created_at = models.DateTimeField(
         "Дата и время ответа",
         auto_now_add=True,
     )
+    # Заполняется триггером в БД (миграция 0007) из answer_text и question_text,
+    # см. core.services.search
+    search_vector = SearchVectorField(
+        "Поисковый вектор",
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Ответ"
         verbose_name_plural = "Ответы"
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="core_answer_search_gin"),
+            models.Index(fields=["daily_entry", "period"], name="core_answer_entry_period_idx"),
+        ]
 
     def __str__(self):
         return f"{self.daily_entry} — {self.question_text[:30]}..."
@@ -391,3 +529,92 @@ class StreakState(models.Model):
 
     def __str__(self):
         return f"{self.user}: {self.current_streak} дней"
+
+
+class StatsRollup(models.Model):
+    """
+    Сводка для экранов статистики — одна строка на пользователя.
+    Обновляется при создании/заполнении/сбросе дня и изменении недели
+    (core.services.stats_rollup), пересобирается командой rebuild_stats_rollup.
+
+    Последние дни хранятся битовыми масками: бит i — день (recent_anchor - i).
+    Из них считаются окна 14/30/56 дней на любую дату.
+    """
+    WINDOW_DAYS = 63  # столько бит помещается в положительный BigIntegerField
+
+    user = models.OneToOneField(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats_rollup",
+        verbose_name="Пользователь",
+    )
+
+    total_days = models.PositiveIntegerField("Дней в базе", default=0)
+    days_any = models.PositiveIntegerField("Дней с любым заполнением", default=0)
+    days_full = models.PositiveIntegerField("Дней полностью", default=0)
+
+    weeks_total = models.PositiveIntegerField("Недель создано", default=0)
+    weeks_completed = models.PositiveIntegerField("Недель завершено", default=0)
+
+    recent_anchor = models.DateField(
+        "Последний день в масках",
+        null=True,
+        blank=True,
+    )
+    recent_entries = models.BigIntegerField("Маска: запись дня есть", default=0)
+    recent_morning = models.BigIntegerField("Маска: утро заполнено", default=0)
+    recent_evening = models.BigIntegerField("Маска: вечер заполнен", default=0)
+
+    updated_at = models.DateTimeField(
+        "Обновлено",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Сводка статистики"
+        verbose_name_plural = "Сводки статистики"
+
+    def __str__(self):
+        return f"{self.user}: {self.total_days} дней"
+
+
+class TermCount(models.Model):
+    """
+    Сколько раз слово встретилось в вечерних ответах пользователя за день.
+    Источник для «Частых тем благодарности» (core.services.topics):
+    топ за любое окно — одна сумма по строкам этой таблицы.
+    term — нормализованная форма (core.services.normalize), word — как её показывать.
+    """
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name="term_counts",
+        verbose_name="Пользователь",
+    )
+    date = models.DateField(
+        "Дата",
+    )
+    term = models.CharField(
+        "Основа слова",
+        max_length=64,
+    )
+    word = models.CharField(
+        "Слово",
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="Самая частая форма основы за день",
+    )
+    count = models.PositiveIntegerField(
+        "Сколько раз",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Частота слова"
+        verbose_name_plural = "Частоты слов"
+        unique_together = ("user", "date", "term")
+
+    def __str__(self):
+        return f"{self.user} — {self.date} — {self.term}: {self.count}"
@@ -0,0 +1,85 @@
+# gratitude_bot/core/services/answers.py
+"""
+Запись ответов утреннего/вечернего блока: по одному (save_answer) или
+буферизованно (BOT_BUFFER_ANSWERS).
+
+Без буфера каждый ответ — отдельный INSERT в автокоммите, а последний
+ещё обновляет DailyEntry и StreakState. С буфером ответы копятся в
+context.user_data (он сохраняется вместе с состоянием диалога, см.
+core.bot.persistence), а по завершении блока уходят одним bulk_create
+вместе с отметкой дня и стриком в одной транзакции.
+
+Брошенный на середине блок в этом режиме не оставляет частичных ответов.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+from django.conf import settings as dj_settings
+from django.db import transaction
+
+from core.models import Answer, DailyEntry, QuestionTemplate, TelegramUser
+from core.services import history, stats_rollup, topics
+from core.services.streak import update_streak_on_activity
+
+
+COMMIT_FAILED_TEXT = "Не получилось сохранить ответы 😔 Отправь последний ответ ещё раз."
+
+# отметка дня → период его ответов (Answer.period)
+BLOCK_PERIODS = {
+    "completed_morning": QuestionTemplate.PERIOD_MORNING,
+    "completed_evening": QuestionTemplate.PERIOD_EVENING,
+}
+
+
+def buffering_enabled() -> bool:
+    return getattr(dj_settings, "BOT_BUFFER_ANSWERS", False)
+
+
+def save_answer(entry_id: int, question: QuestionTemplate, answer_text: str) -> tuple[int, date]:
+    """
+    Записать один ответ сразу. Возвращает (user_id, date) его дня.
+    Кэш «Истории» для дня сбрасываем на каждый ответ: день может быть уже
+    прошедшим (блок начат до полуночи) или блок так и не закончат.
+    """
+    Answer.objects.create(
+        daily_entry_id=entry_id,
+        question=question,
+        question_text=question.text,
+        answer_text=answer_text,
+        period=question.period,
+    )
+    user_id, day = DailyEntry.objects.values_list("user_id", "date").get(id=entry_id)
+    history.day_changed(user_id, day)
+    return user_id, day
+
+
+def buffer_answer(user_data: dict, key: str, question_id: int | None, question_text: str, answer_text: str) -> None:
+    # списки, а не Answer: user_data сериализуется в JSON
+    user_data.setdefault(key, []).append([question_id, question_text, answer_text])
+
+
+def commit_block(user: TelegramUser, entry_id: int, completed_field: str, buffered: list) -> DailyEntry:
+    """
+    Записать накопленные ответы, отметить блок дня (completed_morning/completed_evening),
+    обновить сводку статистики (и частоты слов вечера) и засчитать день в стрик — одной транзакцией.
+    """
+    period = BLOCK_PERIODS[completed_field]
+    with transaction.atomic():
+        Answer.objects.bulk_create([
+            Answer(
+                daily_entry_id=entry_id, question_id=question_id, question_text=question_text,
+                answer_text=answer_text, period=period,
+            )
+            for question_id, question_text, answer_text in buffered
+        ])
+        entry = DailyEntry.objects.get(id=entry_id)
+        setattr(entry, completed_field, True)
+        entry.save(update_fields=[completed_field])
+        stats_rollup.entry_changed(entry)
+        if completed_field == "completed_evening":
+            topics.refresh_day(entry.user_id, entry.date)
+        update_streak_on_activity(user, entry.date)
+    # после коммита: иначе «История» успеет закэшировать день без этих ответов
+    history.day_changed(entry.user_id, entry.date)
+    return entry
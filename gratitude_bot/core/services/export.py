@@ -0,0 +1,221 @@
+# gratitude_bot/core/services/export.py
+"""
+Выгрузка записей пользователя за период: TXT, Markdown или JSON.
+
+Ответы читаются курсором (iterator(chunk_size=…); на Postgres — серверный
+курсор) и сразу пишутся во временный файл, поэтому память не растёт с длиной
+истории: в ней одна пачка строк и один день. Готовый файл уходит документом
+(«История» → «Экспорт записей») или на диск (manage.py export_history).
+"""
+from __future__ import annotations
+
+import io
+import json
+import re
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from typing import IO, Iterator
+
+from core.models import Answer, QuestionTemplate, WeeklyCycle
+from core.services.history import clean_question_text
+
+FORMATS = ("txt", "md", "json")
+CHUNK_SIZE = 2000
+
+PERIOD_TITLES = {
+    QuestionTemplate.PERIOD_MORNING: "☀️ Утро",
+    QuestionTemplate.PERIOD_EVENING: "🌙 Вечер",
+    QuestionTemplate.PERIOD_WEEKLY: "🗓️ Неделя",
+}
+OTHER_TITLE = "📝 Другое"
+
+# символы разметки Markdown и маркеры списков/заголовков в начале строки
+_MD_SPECIAL_RE = re.compile(r"([\\`*_#\[\]<>|~])")
+_MD_LINE_START_RE = re.compile(r"^(\s*)([-+]|\d+\.)(?=\s)", re.MULTILINE)
+
+
+@dataclass
+class ExportCounts:
+    answers: int = 0
+    weeks: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.answers or self.weeks)
+
+
+def _md(text: str) -> str:
+    """
+    Текст пользователя — как есть, а не как разметка («*важно*», «#1», «- пункт»).
+    """
+    text = _MD_SPECIAL_RE.sub(r"\\\1", text or "")
+    return _MD_LINE_START_RE.sub(_escape_marker, text)
+
+
+def _escape_marker(m: re.Match) -> str:
+    indent, marker = m.groups()
+    # «1.» → «1\.», «-» → «\-»
+    return indent + (marker[:-1] + "\\." if marker[0].isdigit() else "\\" + marker)
+
+
+def _days(user_id: int, start: date | None, end: date, chunk_size: int) -> Iterator[tuple[date, list[tuple]]]:
+    """
+    (день, [(period, question_text, answer_text), ...]) по возрастанию дат.
+    """
+    rows = Answer.objects.filter(daily_entry__user_id=user_id, daily_entry__date__lte=end)
+    if start is not None:
+        rows = rows.filter(daily_entry__date__gte=start)
+    rows = (
+        rows.order_by("daily_entry__date", "created_at", "id")
+        .values_list("daily_entry__date", "period", "question_text", "answer_text")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    day, answers = None, []
+    for row_day, period, question_text, answer_text in rows:
+        if row_day != day:
+            if answers:
+                yield day, answers
+            day, answers = row_day, []
+        answers.append((period, question_text, answer_text))
+    if answers:
+        yield day, answers
+
+
+def _weeks(user_id: int, start: date | None, end: date, chunk_size: int) -> Iterator[WeeklyCycle]:
+    cycles = WeeklyCycle.objects.filter(user_id=user_id, week_start__lte=end)
+    if start is not None:
+        cycles = cycles.filter(week_end__gte=start)
+    return cycles.select_related("task").order_by("week_start").iterator(chunk_size=chunk_size)
+
+
+def _by_period(answers: list[tuple]) -> list[tuple[str, list[tuple]]]:
+    groups: dict[str, list[tuple]] = {}
+    for period, question_text, answer_text in answers:
+        groups.setdefault(period, []).append((question_text, answer_text))
+    # утро, вечер, неделя, затем остальное — как в «Истории»
+    order = list(PERIOD_TITLES)
+    return sorted(groups.items(), key=lambda item: order.index(item[0]) if item[0] in order else len(order))
+
+
+def _title(start: date | None, end: date) -> str:
+    since = f"{start:%d.%m.%Y}" if start else "начала"
+    return f"Дневник благодарности: с {since} по {end:%d.%m.%Y}"
+
+
+def _write_txt(out: IO[str], user_id: int, start: date | None, end: date, chunk_size: int) -> ExportCounts:
+    out.write(_title(start, end) + "\n")
+    counts = ExportCounts()
+    for day, answers in _days(user_id, start, end, chunk_size):
+        out.write(f"\n📅 {day:%d.%m.%Y}\n")
+        for period, items in _by_period(answers):
+            out.write(f"\n{PERIOD_TITLES.get(period, OTHER_TITLE)}:\n")
+            for question_text, answer_text in items:
+                out.write(f"❓ {clean_question_text(question_text)}\n→ {answer_text}\n")
+        counts.answers += len(answers)
+
+    for cycle in _weeks(user_id, start, end, chunk_size):
+        counts.weeks += 1
+        out.write(f"\n🗓️ Неделя: {cycle.week_start:%d.%m.%Y} — {cycle.week_end:%d.%m.%Y}\n")
+        if cycle.task:
+            out.write(f"🎯 Задание недели: {cycle.task.title}\n")
+        out.write(f"🧩 Промежуточный итог: {(cycle.mid_reflection or '').strip() or '—'}\n")
+        out.write(f"🏁 Итог недели: {(cycle.final_reflection or '').strip() or '—'}\n")
+    return counts
+
+
+def _write_md(out: IO[str], user_id: int, start: date | None, end: date, chunk_size: int) -> ExportCounts:
+    out.write(f"# {_title(start, end)}\n")
+    counts = ExportCounts()
+    for day, answers in _days(user_id, start, end, chunk_size):
+        out.write(f"\n## {day:%d.%m.%Y}\n")
+        for period, items in _by_period(answers):
+            out.write(f"\n### {PERIOD_TITLES.get(period, OTHER_TITLE)}\n\n")
+            for question_text, answer_text in items:
+                out.write(f"**{_md(clean_question_text(question_text))}**  \n{_md(answer_text)}\n\n")
+        counts.answers += len(answers)
+
+    for cycle in _weeks(user_id, start, end, chunk_size):
+        counts.weeks += 1
+        if counts.weeks == 1:
+            out.write("\n## Недели\n")
+        out.write(f"\n### {cycle.week_start:%d.%m.%Y} — {cycle.week_end:%d.%m.%Y}\n\n")
+        if cycle.task:
+            out.write(f"🎯 **{_md(cycle.task.title)}**\n\n")
+        out.write(f"**Промежуточный итог:** {_md((cycle.mid_reflection or '').strip()) or '—'}  \n")
+        out.write(f"**Итог недели:** {_md((cycle.final_reflection or '').strip()) or '—'}\n")
+    return counts
+
+
+def _write_json(out: IO[str], user_id: int, start: date | None, end: date, chunk_size: int) -> ExportCounts:
+    # документ собирается по элементам — целиком в памяти его нет
+    def dump(value) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    out.write(f'{{"from": {dump(start.isoformat() if start else None)}, "to": {dump(end.isoformat())}, "days": [')
+    counts = ExportCounts()
+    for i, (day, answers) in enumerate(_days(user_id, start, end, chunk_size)):
+        out.write(("," if i else "") + "\n  " + dump({
+            "date": day.isoformat(),
+            "answers": [
+                {"period": period or None, "question": question_text, "answer": answer_text}
+                for period, question_text, answer_text in answers
+            ],
+        }))
+        counts.answers += len(answers)
+
+    out.write('\n], "weeks": [')
+    for i, cycle in enumerate(_weeks(user_id, start, end, chunk_size)):
+        counts.weeks += 1
+        out.write(("," if i else "") + "\n  " + dump({
+            "week_start": cycle.week_start.isoformat(),
+            "week_end": cycle.week_end.isoformat(),
+            "task": cycle.task.title if cycle.task else None,
+            "mid_reflection": cycle.mid_reflection,
+            "final_reflection": cycle.final_reflection,
+            "is_completed": cycle.is_completed,
+        }))
+    out.write("\n]}\n")
+    return counts
+
+
+WRITERS = {
+    "txt": _write_txt,
+    "md": _write_md,
+    "json": _write_json,
+}
+
+
+def write_export(
+    out: IO[str], user_id: int, start: date | None, end: date, fmt: str, chunk_size: int = CHUNK_SIZE,
+) -> ExportCounts:
+    """
+    Записать выгрузку в текстовый поток. start=None — с первой записи.
+    Возвращает, сколько выгружено ответов и недель.
+    """
+    try:
+        writer = WRITERS[fmt]
+    except KeyError:
+        raise ValueError(f"Unknown export format: {fmt!r} (expected one of {FORMATS})")
+    return writer(out, user_id, start, end, chunk_size)
+
+
+def filename(start: date | None, end: date, fmt: str) -> str:
+    since = start.isoformat() if start else "all"
+    return f"gratitude_{since}_{end.isoformat()}.{fmt}"
+
+
+@contextmanager
+def export_file(user_id: int, start: date | None, end: date, fmt: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Временный файл с выгрузкой (бинарный, с начала) и ExportCounts; удаляется на выходе.
+    """
+    with tempfile.TemporaryFile() as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+        counts = write_export(text, user_id, start, end, fmt, chunk_size)
+        text.flush()
+        text.detach()
+        raw.seek(0)
+        yield raw, counts
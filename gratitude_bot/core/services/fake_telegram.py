@@ -0,0 +1,145 @@
+# gratitude_bot/core/services/fake_telegram.py
+"""
+Локальный фейковый Telegram Bot API для проверок без сети.
+
+Отвечает на sendMessage/getMe как настоящий API и считает TCP-соединения
+и запросы, чтобы было видно, переиспользует ли клиент keep-alive соединения:
+при нормальной работе пула connections << requests.
+
+    server = FakeTelegramServer(("127.0.0.1", 0))
+    server.start()
+    # TELEGRAM_API_BASE_URL = server.base_url
+    ...
+    server.stats()  # {"connections": 1, "requests": 100, "by_method": {...}}
+    server.stop()
+
+flood_every=N заставляет каждый N-й запрос отвечать 429 с retry_after —
+так можно проверить очередь отправки (core.services.outbox).
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 — чтобы соединение не закрывалось после каждого ответа
+    protocol_version = "HTTP/1.1"
+    server: "FakeTelegramServer"
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format, *args):  # noqa: A002 — сигнатура BaseHTTPRequestHandler
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            payload = {}
+
+        # /bot<token>/<method>
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        status, body = self.server.handle_api(method, payload)
+        self._reply(status, body)
+
+    do_GET = do_POST
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8081), latency: float = 0.0, flood_every: int = 0, retry_after: int = 1):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        # каждый flood_every-й запрос отвечает 429, как настоящий API при превышении лимита
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.reset()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.requests = 0
+            self.by_method: Counter = Counter()
+            self.messages: list[dict] = []
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "requests": self.requests,
+                "by_method": dict(self.by_method),
+            }
+
+    def handle_api(self, method: str, payload: dict) -> tuple[int, dict]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+            self.by_method[method] += 1
+            message_id = self.requests
+            flood = self.flood_every and self.requests % self.flood_every == 0
+
+        if flood:
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+
+        if method == "sendMessage":
+            chat_id = int(payload.get("chat_id") or 0)
+            with self._lock:
+                self.messages.append(payload)
+            return 200, {
+                "ok": True,
+                "result": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": payload.get("text", ""),
+                },
+            }
+
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,123 @@
+# gratitude_bot/core/services/history.py
+"""
+«История» → ответы за дату.
+
+Загрузка дня — два запроса: ответы дня вместе с записью (JOIN по DailyEntry)
+и неделя, в которую попадает дата (вместе с заданием).
+
+Прошедшие дни меняются только при «заполнить заново», поэтому готовый текст
+дня кэшируется в Redis: hash history:days:v<RENDER_VERSION>:<user_id>, поле — дата.
+Поменялось оформление дня (history_flow._render_day) — увеличьте RENDER_VERSION,
+и старые тексты просто перестанут читаться, а истекут сами по TTL.
+Сбрасывается при записи ответов дня (day_changed) и при изменении недели
+(user_changed — неделя видна на каждом дне). Redis недоступен — рендерим заново.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from datetime import date
+
+from django.conf import settings as dj_settings
+
+from core.models import Answer, WeeklyCycle
+from core.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# версия оформления дня: входит в ключ, чтобы после деплоя не показывать текст старого вида
+RENDER_VERSION = 1
+CACHE_KEY = "history:days:v{version}:{user_id}"
+
+_NUM_PREFIX_RE = re.compile(r"^\s*\d+\)\s*")
+
+
+def clean_question_text(text: str) -> str:
+    """
+    Вопрос без заголовка блока и номера: «☀️ Утро / 1) Какое намерение…» → «Какое намерение…».
+    """
+    text = (text or "").strip()
+    if not text:
+        return "—"
+
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    if not lines:
+        return "—"
+
+    if len(lines) >= 2 and lines[0] in ("☀️ Утро", "🌙 Вечер", "🗓️ Неделя", "Неделя"):
+        candidate = lines[1]
+    else:
+        candidate = lines[0]
+
+    candidate = _NUM_PREFIX_RE.sub("", candidate).strip()
+    return candidate or "—"
+
+
+def load_day(user_id: int, day: date) -> tuple[list[Answer], WeeklyCycle | None]:
+    """
+    Ответы за день (в порядке записи) и неделя, покрывающая день.
+    """
+    answers = list(
+        Answer.objects.filter(daily_entry__user_id=user_id, daily_entry__date=day)
+        # у ответов одного блока, записанных пачкой, created_at совпадает — порядок по id
+        .order_by("created_at", "id")
+    )
+    cycle = (
+        WeeklyCycle.objects.filter(user_id=user_id, week_start__lte=day, week_end__gte=day)
+        .select_related("task")
+        .first()
+    )
+    return answers, cycle
+
+
+def _key(user_id: int) -> str:
+    return CACHE_KEY.format(version=RENDER_VERSION, user_id=user_id)
+
+
+def _ttl() -> int:
+    return int(getattr(dj_settings, "HISTORY_CACHE_TTL", 0))
+
+
+def get_cached(user_id: int, day: date) -> str | None:
+    if not _ttl():
+        return None
+    try:
+        raw = get_redis().hget(_key(user_id), day.isoformat())
+    except Exception:
+        logger.warning("History cache read failed for user %s", user_id)
+        return None
+    return raw.decode() if raw is not None else None
+
+
+def set_cached(user_id: int, day: date, text: str) -> None:
+    ttl = _ttl()
+    if not ttl:
+        return
+    key = _key(user_id)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(key, day.isoformat(), text)
+        pipe.expire(key, ttl)
+        pipe.execute()
+    except Exception:
+        logger.warning("History cache write failed for user %s", user_id)
+
+
+def day_changed(user_id: int, day: date) -> None:
+    """
+    Ответы дня записаны или удалены.
+    """
+    try:
+        get_redis().hdel(_key(user_id), day.isoformat())
+    except Exception:
+        logger.warning("History cache invalidation failed for user %s, %s", user_id, day)
+
+
+def user_changed(user_id: int) -> None:
+    """
+    Изменилось то, что видно на многих днях (неделя, её задание).
+    """
+    try:
+        get_redis().delete(_key(user_id))
+    except Exception:
+        logger.warning("History cache invalidation failed for user %s", user_id)
@@ -0,0 +1,77 @@
+# gratitude_bot/core/services/locks.py
+"""
+Распределённая блокировка (аренда) на Redis.
+
+Аренда — ключ с токеном владельца и TTL: если процесс упал, ключ сам
+истечёт, и следующий tick не останется заблокированным навсегда.
+Отпустить/продлить аренду может только владелец токена, в том числе
+из другого процесса (токен можно передать, например, в задачу Celery).
+"""
+from __future__ import annotations
+
+import logging
+import uuid
+from contextlib import contextmanager
+
+from core.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# удаляем/продлеваем, только если ключ всё ещё наш
+_RELEASE_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_EXTEND_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+LOCK_PREFIX = "lock:"
+
+
+class Lease:
+    def __init__(self, name: str, ttl: float, token: str | None = None, client=None):
+        self.key = LOCK_PREFIX + name
+        self.ttl_ms = int(ttl * 1000)
+        self.token = token or uuid.uuid4().hex
+        self.client = client or get_redis()
+
+    def acquire(self) -> bool:
+        return bool(self.client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    def release(self) -> bool:
+        return bool(self.client.eval(_RELEASE_LUA, 1, self.key, self.token))
+
+    def extend(self, ttl: float | None = None) -> bool:
+        ttl_ms = int(ttl * 1000) if ttl is not None else self.ttl_ms
+        return bool(self.client.eval(_EXTEND_LUA, 1, self.key, self.token, ttl_ms))
+
+
+@contextmanager
+def lease(name: str, ttl: float):
+    """
+    with lease("reminders:shard:0", ttl=120) as acquired:
+        if not acquired:
+            return  # кто-то уже работает
+    """
+    held = Lease(name, ttl)
+    acquired = held.acquire()
+    try:
+        yield acquired
+    finally:
+        if acquired and not held.release():
+            logger.warning("lease %s expired before release (ttl too short?)", name)
+
+
+def once_per_key(name: str, ttl: float) -> bool:
+    """
+    True только для первого вызова с этим именем за ttl секунд.
+    Нужен, чтобы несколько реплик beat не запускали один и тот же tick.
+    """
+    return bool(get_redis().set(LOCK_PREFIX + name, "1", nx=True, px=int(ttl * 1000)))
+
@@ -0,0 +1,150 @@
+# gratitude_bot/core/services/metrics.py
+"""
+Метрики планировщика напоминаний в формате Prometheus.
+
+Tick и шарды выполняются в разных процессах Celery, поэтому значения
+копятся в Redis (хэши metrics:*), а отдаёт их любой процесс:
+GET /metrics или `python manage.py dump_metrics`.
+
+    count("reminders_tick_duplicate")
+    count("reminder_send_errors", type="TimedOut")
+    observe("reminder_tick_duration_seconds", 1.7)
+"""
+from __future__ import annotations
+
+import math
+from collections.abc import Iterable
+
+from core.services.redis_client import get_redis
+
+PREFIX = "gratitude_"
+COUNTERS_KEY = "metrics:counters"
+HIST_KEY = "metrics:hist:"
+
+_LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+_USERS_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# имя -> (границы корзин, описание)
+HISTOGRAMS: dict[str, tuple[tuple[float, ...], str]] = {
+    "reminder_tick_duration_seconds": (
+        (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+        "Время от старта tick до итога по всем шардам",
+    ),
+    "reminder_shard_duration_seconds": (
+        (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+        "Время обработки одного шарда",
+    ),
+    "reminder_tick_scanned_users": (
+        _USERS_BUCKETS,
+        "Сколько строк расписания tick взял из индекса",
+    ),
+    "reminder_tick_due_users": (
+        _USERS_BUCKETS,
+        "Сколько напоминаний tick решил отправить",
+    ),
+    "reminder_send_latency_seconds": (
+        _LATENCY_BUCKETS,
+        "Задержка от запланированного локального времени до ответа API",
+    ),
+}
+
+COUNTERS_HELP = {
+    "reminders_tick_duplicate": "Повторный запуск tick на ту же минуту (несколько beat)",
+    "reminders_tick_overlapped": "Tick пропущен: предыдущий ещё не закончился",
+    "reminders_shard_overlapped": "Шард пропущен: занят предыдущим tick",
+    "reminders_shard_failed": "Шард упал с ошибкой (итог tick всё равно собран)",
+    "reminders_sent": "Отправлено напоминаний",
+    "reminder_send_errors": "Ошибки отправки по типу исключения",
+}
+
+
+def _field(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def count(name: str, amount: int = 1, **labels) -> None:
+    """
+    Увеличить счётчик; метки (type="TimedOut") становятся частью имени поля.
+    """
+    get_redis().hincrby(COUNTERS_KEY, _field(name, labels), amount)
+
+
+def observe(name: str, value: float) -> None:
+    observe_many(name, [value])
+
+
+def observe_many(name: str, values: Iterable[float]) -> None:
+    """
+    Записать пачку наблюдений одним pipeline (например, лаги всех сообщений шарда).
+    """
+    buckets, _ = HISTOGRAMS[name]
+    values = list(values)
+    if not values:
+        return
+
+    per_bucket: dict[str, int] = {}
+    for v in values:
+        # храним некумулятивно: в корзину с первой подходящей границей
+        le = next((b for b in buckets if v <= b), math.inf)
+        key = "+Inf" if le == math.inf else repr(float(le))
+        per_bucket[key] = per_bucket.get(key, 0) + 1
+
+    pipe = get_redis().pipeline(transaction=False)
+    key = HIST_KEY + name
+    for le, n in per_bucket.items():
+        pipe.hincrby(key, le, n)
+    pipe.hincrby(key, "count", len(values))
+    pipe.hincrbyfloat(key, "sum", sum(values))
+    pipe.execute()
+
+
+def _decode(raw: dict) -> dict[str, str]:
+    return {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in raw.items()
+    }
+
+
+def render() -> str:
+    """
+    Все метрики в текстовом формате Prometheus (exposition format 0.0.4).
+    """
+    client = get_redis()
+    lines: list[str] = []
+
+    counters = _decode(client.hgetall(COUNTERS_KEY))
+    by_name: dict[str, list[tuple[str, str]]] = {}
+    for field, value in counters.items():
+        name, _, labels = field.partition("{")
+        by_name.setdefault(name, []).append((labels and "{" + labels, value))
+    for name in sorted(by_name):
+        metric = f"{PREFIX}{name}_total"
+        if name in COUNTERS_HELP:
+            lines.append(f"# HELP {metric} {COUNTERS_HELP[name]}")
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in sorted(by_name[name]):
+            lines.append(f"{metric}{labels} {value}")
+
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        data = _decode(client.hgetall(HIST_KEY + name))
+        metric = PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for b in buckets:
+            cumulative += int(data.get(repr(float(b)), 0))
+            lines.append(f'{metric}_bucket{{le="{b}"}} {cumulative}')
+        cumulative += int(data.get("+Inf", 0))
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{metric}_sum {float(data.get('sum', 0))}")
+        lines.append(f"{metric}_count {int(data.get('count', 0))}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    client = get_redis()
+    client.delete(COUNTERS_KEY, *(HIST_KEY + name for name in HISTOGRAMS))
@@ -0,0 +1,68 @@
+# gratitude_bot/core/services/normalize.py
+"""
+Разбор текста ответов на слова и приведение слов к общей форме.
+
+Один конвейер для «Частых тем» (core.services.topics) и для поиска
+без Postgres (core.services.search): слова → нижний регистр → без коротких
+и стоп-слов → нормализатор (TEXT_NORMALIZER):
+- "stem" — основа по Snowball (core.services.stemmer): «маме», «мама», «маму» → «мам»;
+- "lower" — слово как есть (прежнее поведение).
+
+Словарь ответов небольшой и всё время повторяется, поэтому основы
+кэшируются (LRU, TEXT_STEM_CACHE_SIZE слов на процесс).
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Callable, Iterator
+
+from django.conf import settings
+
+from core.services.stemmer import stem as _snowball_stem
+
+_WORD_RE = re.compile(r"[A-Za-zА-Яа-яЁё]+", re.UNICODE)
+
+MIN_WORD_LEN = 3
+
+# Можно расширить,
+RU_STOPWORDS = {
+    "и", "а", "но", "или", "что", "это", "как", "я", "мы", "ты", "он", "она", "они",
+    "в", "во", "на", "за", "к", "ко", "с", "со", "у", "о", "об", "от", "для", "по",
+    "из", "до", "без", "при", "же", "ли", "бы", "то", "там", "тут", "здесь",
+    "сегодня", "вчера", "завтра", "очень", "просто", "еще", "уже", "все", "всё",
+    "мне", "меня", "мой", "моя", "мои", "тебя", "твой", "твоя", "его", "ее", "её",
+    "быть", "была", "был", "были",
+}
+
+
+def words(text: str) -> Iterator[str]:
+    """
+    Значимые слова текста в нижнем регистре.
+    """
+    for w in _WORD_RE.findall((text or "").lower()):
+        if len(w) >= MIN_WORD_LEN and w not in RU_STOPWORDS:
+            yield w
+
+
+@lru_cache(maxsize=getattr(settings, "TEXT_STEM_CACHE_SIZE", 50000))
+def stem(word: str) -> str:
+    return _snowball_stem(word)
+
+
+def _as_is(word: str) -> str:
+    return word
+
+
+NORMALIZERS: dict[str, Callable[[str], str]] = {
+    "stem": stem,
+    "lower": _as_is,
+}
+
+
+def get_normalizer() -> Callable[[str], str]:
+    name = getattr(settings, "TEXT_NORMALIZER", "stem")
+    try:
+        return NORMALIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown TEXT_NORMALIZER: {name!r} (expected one of {sorted(NORMALIZERS)})")
@@ -0,0 +1,319 @@
+# gratitude_bot/core/services/outbox.py
+"""
+Очередь исходящих сообщений с учётом лимитов Telegram.
+
+- глобальный token bucket (~30 сообщений/сек на бота);
+- не чаще одного сообщения в секунду в один чат;
+- на 429 (RetryAfter) ставим на паузу всю отправку на указанное время и повторяем;
+- на сетевые ошибки/таймауты — повтор с экспоненциальной задержкой;
+- считаем лаг: от запланированного времени сообщения до ответа API,
+  и ошибки по типу исключения (для core.services.metrics).
+
+Используется в core.tasks для напоминаний; из хендлеров можно вызывать
+OutboundQueue(bot=context.bot).send(chat_id, text).
+
+flush() отправляет последовательно, flush_async() — асинхронно с ограничением
+параллельности (REMINDER_SEND_CONCURRENCY) через тот же пул соединений.
+Как и в core.bot.aio_runtime, ожидание и порядок держит event loop, а сам
+синхронный вызов PTB идёт в ограниченном пуле потоков. Лимиты у обоих путей
+общие: один token bucket на очередь и один промежуток на чат.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings as dj_settings
+from django.utils import timezone
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError, TimedOut
+
+from core.services import telegram_sender
+
+logger = logging.getLogger(__name__)
+
+SENT, RETRY, FAILED = "sent", "retry", "failed"
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket: `rate` токенов в секунду, запас до `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """
+        Остановить выдачу токенов (используем на RetryAfter от API).
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._tokens = 0.0
+
+    def _reserve(self) -> float:
+        # сколько ждать до своего токена (0 — можно прямо сейчас)
+        with self._lock:
+            now = self._clock()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # допуск на округление: после сна ровно на wait токенов может выйти 0.999…,
+            # а следующее ожидание окажется меньше шага часов — и acquire зациклится
+            if self._tokens >= 1.0 - 1e-9:
+                self._tokens = max(0.0, self._tokens - 1.0)
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            self._sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+@dataclass(order=True)
+class OutgoingMessage:
+    ready_at: float
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    scheduled_at: datetime | None = field(default=None, compare=False)
+    kwargs: dict = field(default_factory=dict, compare=False)
+    attempts: int = field(default=0, compare=False)
+    # тип исключения последней неудачной попытки
+    error: str | None = field(default=None, compare=False)
+
+
+@dataclass
+class SendReport:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    max_lag: float = 0.0
+    total_lag: float = 0.0
+    # для гистограмм: лаг каждого отправленного сообщения и ошибки по типу
+    lags: list[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def avg_lag(self) -> float:
+        return self.total_lag / self.sent if self.sent else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "max_lag": round(self.max_lag, 3),
+            "avg_lag": round(self.avg_lag, 3),
+        }
+
+
+class OutboundQueue:
+    def __init__(
+        self,
+        bot=None,
+        rate: float | None = None,
+        per_chat_interval: float | None = None,
+        max_retries: int | None = None,
+        backoff: float = 0.5,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.bot = bot if bot is not None else telegram_sender.get_bot()
+        rate = rate if rate is not None else getattr(dj_settings, "TELEGRAM_GLOBAL_RATE", 30)
+        self.bucket = TokenBucket(rate, clock=clock, sleep=sleep)
+        self.per_chat_interval = (
+            per_chat_interval if per_chat_interval is not None
+            else getattr(dj_settings, "TELEGRAM_PER_CHAT_INTERVAL", 1.0)
+        )
+        self.max_retries = (
+            max_retries if max_retries is not None
+            else getattr(dj_settings, "TELEGRAM_SEND_MAX_RETRIES", 3)
+        )
+        self.backoff = backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._seq = itertools.count()
+        self._heap: list[OutgoingMessage] = []
+        self._chat_next: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, chat_id: int, text: str, scheduled_at: datetime | None = None, **kwargs) -> None:
+        msg = OutgoingMessage(self._clock(), next(self._seq), chat_id, text, scheduled_at, kwargs)
+        heapq.heappush(self._heap, msg)
+
+    def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """
+        Отправить одно сообщение сразу (с лимитами и повторами), не трогая очередь.
+        """
+        msg = OutgoingMessage(self._clock(), next(self._seq), chat_id, text, None, kwargs)
+        return self._drain([msg]).sent == 1
+
+    def flush(self) -> SendReport:
+        """
+        Отправить всё, что накопилось. Возвращает отчёт по отправке.
+        """
+        heap, self._heap = self._heap, []
+        return self._drain(heap)
+
+    def _drain(self, heap: list[OutgoingMessage]) -> SendReport:
+        report = SendReport()
+
+        if self.bot is None:
+            logger.warning("NO TELEGRAM_BOT_TOKEN in settings. Dropping %s messages", len(heap))
+            report.failed = len(heap)
+            return report
+
+        while heap:
+            msg = heapq.heappop(heap)
+            now = self._clock()
+            if msg.ready_at > now:
+                self._sleep(msg.ready_at - now)
+
+            if not self._chat_slot_free(msg):
+                heapq.heappush(heap, msg)
+                continue
+
+            self.bucket.acquire()
+            status, delay = self._try_send(msg)
+            self._account(msg, status, report)
+            if status == RETRY:
+                msg.ready_at = self._clock() + delay
+                heapq.heappush(heap, msg)
+
+        return report
+
+    async def flush_async(self, concurrency: int | None = None) -> SendReport:
+        """
+        Асинхронная отправка всей очереди: до `concurrency` запросов в полёте
+        одновременно, через общий пул соединений Bot. Лимиты те же, что и в flush().
+        """
+        heap, self._heap = self._heap, []
+        report = SendReport()
+
+        if self.bot is None:
+            logger.warning("NO TELEGRAM_BOT_TOKEN in settings. Dropping %s messages", len(heap))
+            report.failed = len(heap)
+            return report
+
+        concurrency = concurrency or getattr(dj_settings, "REMINDER_SEND_CONCURRENCY", 8)
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def deliver(msg: OutgoingMessage):
+            while True:
+                # ждём вне семафора, чтобы отложенные сообщения не занимали слоты
+                await self._wait_ready_async(msg)
+                async with semaphore:
+                    await self.bucket.acquire_async()
+                    status, delay = await loop.run_in_executor(executor, self._try_send, msg)
+                self._account(msg, status, report)
+                if status != RETRY:
+                    return
+                msg.ready_at = self._clock() + delay
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tg-send") as executor:
+            await asyncio.gather(*(deliver(msg) for msg in sorted(heap)))
+        return report
+
+    async def _wait_ready_async(self, msg: OutgoingMessage) -> None:
+        while True:
+            now = self._clock()
+            if msg.ready_at > now:
+                await asyncio.sleep(msg.ready_at - now)
+                continue
+            if self._chat_slot_free(msg):
+                return
+
+    def _chat_slot_free(self, msg: OutgoingMessage) -> bool:
+        # лимит на чат: пока слот занят — откладываем это сообщение, а не всю очередь
+        with self._lock:
+            now = self._clock()
+            next_free = self._chat_next.get(msg.chat_id, 0.0)
+            if next_free > now:
+                msg.ready_at = next_free
+                return False
+            self._chat_next[msg.chat_id] = now + self.per_chat_interval
+            return True
+
+    def _try_send(self, msg: OutgoingMessage) -> tuple[str, float]:
+        """
+        Одна попытка отправки. Возвращает (SENT | RETRY | FAILED, задержка перед повтором).
+        """
+        msg.attempts += 1
+        msg.error = None
+        try:
+            self.bot.send_message(chat_id=msg.chat_id, text=msg.text, **msg.kwargs)
+        except RetryAfter as e:
+            # 429: Telegram сам говорит, сколько ждать — тормозим всю отправку
+            msg.error = type(e).__name__
+            logger.warning("429 for chat_id=%s, retry after %ss", msg.chat_id, e.retry_after)
+            self.bucket.pause(e.retry_after)
+            return self._retry_or_fail(msg, e.retry_after)
+        except BadRequest as e:
+            # в PTB 13 BadRequest — подкласс NetworkError, но повтор тут не поможет
+            msg.error = type(e).__name__
+            logger.exception("FAILED sending to chat_id=%s", msg.chat_id)
+            return FAILED, 0.0
+        except (TimedOut, NetworkError) as e:
+            msg.error = type(e).__name__
+            logger.warning("network error for chat_id=%s (attempt %s)", msg.chat_id, msg.attempts, exc_info=True)
+            return self._retry_or_fail(msg, self.backoff * 2 ** (msg.attempts - 1))
+        except TelegramError as e:
+            # Unauthorized (бот заблокирован и т.п.) — повтор не поможет
+            msg.error = type(e).__name__
+            logger.exception("FAILED sending to chat_id=%s", msg.chat_id)
+            return FAILED, 0.0
+
+        logger.info("SENT to chat_id=%s: %s", msg.chat_id, msg.text[:50])
+        return SENT, 0.0
+
+    def _retry_or_fail(self, msg: OutgoingMessage, delay: float) -> tuple[str, float]:
+        if msg.attempts > self.max_retries:
+            logger.error("giving up on chat_id=%s after %s attempts", msg.chat_id, msg.attempts)
+            return FAILED, 0.0
+        return RETRY, delay
+
+    def _account(self, msg: OutgoingMessage, status: str, report: SendReport) -> None:
+        if msg.error:
+            report.errors[msg.error] += 1
+        if status == RETRY:
+            report.retried += 1
+        elif status == FAILED:
+            report.failed += 1
+        else:
+            report.sent += 1
+            if msg.scheduled_at is not None:
+                lag = max(0.0, (timezone.now() - msg.scheduled_at).total_seconds())
+                report.max_lag = max(report.max_lag, lag)
+                report.total_lag += lag
+                report.lags.append(lag)
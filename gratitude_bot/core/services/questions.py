@@ -0,0 +1,149 @@
+# gratitude_bot/core/services/questions.py
+"""
+Реестр вопросов (QuestionTemplate) в памяти процесса.
+
+Утренний и вечерний опросники раньше читали шаблоны из БД на каждом шаге
+(get по id на ответ и ещё раз на следующий вопрос), а вечерние вопросы
+были захардкожены в EVENING_QUESTIONS. Теперь оба блока берут вопросы
+отсюда: все шаблоны грузятся одним запросом, дальше — ноль запросов.
+
+Инвалидация по версии: сохранение/удаление QuestionTemplate (админка, shell)
+увеличивает счётчик questions:version в Redis (см. core.signals). Процесс
+сверяет версию не чаще раза в QUESTION_REGISTRY_CHECK_SECONDS и при
+расхождении перечитывает шаблоны. Если Redis недоступен — перечитывает
+по тому же интервалу.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from django.conf import settings as dj_settings
+
+from core.models import QuestionTemplate
+from core.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "questions:version"
+
+# создаются, если для периода в БД нет ни одного шаблона
+DEFAULT_QUESTIONS = {
+    QuestionTemplate.PERIOD_MORNING: [
+        ("morning_intention", "☀️ Утро\n\n1) Какое намерение/фокус ты выбираешь на сегодня?"),
+        ("morning_affirmation", "2) Положительная установка на день (1 фраза)."),
+        ("morning_one_step", "3) Один маленький шаг, который точно сделаешь сегодня?"),
+    ],
+    QuestionTemplate.PERIOD_EVENING: [
+        ("gratitude_1", "🌙 Вечер\n\n1) За что ты сегодня благодарна?"),
+        ("gratitude_2", "2) Прекрасные моменты дня сегодня — какие они?"),
+        ("gratitude_3", "3) Что я смогу сделать завтра, чтобы сделать свой день лучше?"),
+        ("best_event", "✨ Что было самым хорошим/тёплым событием дня?"),
+    ],
+}
+
+# RLock: создание шаблонов по умолчанию внутри _load дёргает сигнал -> invalidate()
+_lock = threading.RLock()
+_by_id: dict[int, QuestionTemplate] = {}
+_by_period: dict[str, list[QuestionTemplate]] = {}
+_loaded = False
+_version: int | None = None
+_checked_at = 0.0
+
+
+def _check_interval() -> float:
+    return getattr(dj_settings, "QUESTION_REGISTRY_CHECK_SECONDS", 5)
+
+
+def _remote_version() -> int | None:
+    try:
+        return int(get_redis().get(VERSION_KEY) or 0)
+    except Exception:
+        logger.warning("Cannot read %s, question registry falls back to periodic reload", VERSION_KEY)
+        return None
+
+
+def ensure_defaults() -> None:
+    for period, defaults in DEFAULT_QUESTIONS.items():
+        if QuestionTemplate.objects.filter(period=period).exists():
+            continue
+        for order, (code, text) in enumerate(defaults, start=1):
+            QuestionTemplate.objects.get_or_create(
+                code=code,
+                defaults={"text": text, "period": period, "order": order, "is_active": True},
+            )
+
+
+def _load(version: int | None) -> None:
+    global _by_id, _by_period, _loaded, _version
+    ensure_defaults()
+    templates = list(QuestionTemplate.objects.order_by("period", "order", "id"))
+
+    by_period: dict[str, list[QuestionTemplate]] = {}
+    for q in templates:
+        by_period.setdefault(q.period, []).append(q)
+
+    _by_id = {q.id: q for q in templates}
+    _by_period = by_period
+    _version = version
+    _loaded = True
+    logger.info("Question registry loaded: %s templates (version %s)", len(templates), version)
+
+
+def _ensure_fresh() -> None:
+    global _checked_at
+    if _loaded and time.monotonic() - _checked_at < _check_interval():
+        return
+    with _lock:
+        now = time.monotonic()
+        if _loaded and now - _checked_at < _check_interval():
+            return
+        version = _remote_version()
+        _checked_at = now
+        if _loaded and version is not None and version == _version:
+            return
+        _load(version)
+
+
+def for_period(period: str, active_only: bool = True) -> list[QuestionTemplate]:
+    """
+    Вопросы блока по порядку. Шаблоны общие для всех — не менять их на месте.
+    """
+    _ensure_fresh()
+    questions = _by_period.get(period, [])
+    if active_only:
+        return [q for q in questions if q.is_active]
+    return list(questions)
+
+
+def get(question_id: int) -> QuestionTemplate | None:
+    """
+    Шаблон по id — в том числе неактивный: пользователь мог начать
+    опросник до того, как вопрос выключили. None, если шаблон удалён.
+    """
+    _ensure_fresh()
+    q = _by_id.get(question_id)
+    if q is None:
+        # создан после загрузки, а версия ещё не сверялась
+        q = QuestionTemplate.objects.filter(id=question_id).first()
+        if q is not None:
+            invalidate()
+    return q
+
+
+def invalidate() -> None:
+    global _loaded
+    with _lock:
+        _loaded = False
+
+
+def bump_version() -> None:
+    """
+    Шаблоны изменились: перечитать здесь сразу, в остальных процессах — при следующей сверке.
+    """
+    invalidate()
+    try:
+        get_redis().incr(VERSION_KEY)
+    except Exception:
+        logger.warning("Cannot bump %s, other processes will reload by interval", VERSION_KEY)
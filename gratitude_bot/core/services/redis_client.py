@@ -0,0 +1,26 @@
+# gratitude_bot/core/services/redis_client.py
+from __future__ import annotations
+
+import redis
+from django.conf import settings as dj_settings
+
+_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Общий клиент Redis процесса (тот же Redis, что и брокер Celery, если REDIS_URL не задан).
+    """
+    global _client
+    if _client is None:
+        url = getattr(dj_settings, "REDIS_URL", None) or dj_settings.CELERY_BROKER_URL
+        _client = redis.Redis.from_url(url)
+    return _client
+
+
+def set_redis(client: redis.Redis | None) -> None:
+    """
+    Подменить клиент (например, на fakeredis в проверках).
+    """
+    global _client
+    _client = client
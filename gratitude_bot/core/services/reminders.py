@@ -0,0 +1,138 @@
+# gratitude_bot/core/services/reminders.py
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from core.models import ReminderSchedule, UserSettings
+from core.services.timezones import parse_user_timezone
+
+# в 12:00 локального времени проверяем, не было ли пропуска вчера
+MISSED_CHECK_TIME = time(12, 0)
+
+KINDS = (
+    ReminderSchedule.KIND_MORNING,
+    ReminderSchedule.KIND_EVENING,
+    ReminderSchedule.KIND_MISSED,
+)
+
+
+def local_to_utc(day: date, at: time, tz) -> datetime:
+    """
+    Локальные дата+время -> aware datetime в UTC.
+
+    Переходы на летнее/зимнее время:
+    - если время попало в «дыру» (часы перевели вперёд), zoneinfo берёт
+      смещение до перевода, и напоминание уходит сразу после перевода
+      (02:30 -> 03:30 по новому времени);
+    - если время повторяется (часы перевели назад), берём первое вхождение (fold=0).
+    """
+    return datetime.combine(day, at, tzinfo=tz).astimezone(dt_timezone.utc)
+
+
+def next_occurrence(tz, at: time, after: datetime) -> datetime:
+    """
+    Ближайший момент (UTC) строго после `after`, когда на локальных часах будет `at`.
+    """
+    local_day = after.astimezone(tz).date()
+    # трёх дней хватает с запасом даже при переводе часов
+    for offset in range(3):
+        candidate = local_to_utc(local_day + timedelta(days=offset), at, tz)
+        if candidate > after:
+            return candidate
+    raise AssertionError("unreachable: no occurrence within 3 days")
+
+
+def latest_occurrence(tz, at: time, now: datetime) -> datetime:
+    """
+    Последний момент (UTC) не позже `now`, когда на локальных часах было `at`.
+    Нужен для догоняющей отправки после простоя воркеров.
+    """
+    candidate = next_occurrence(tz, at, now - timedelta(days=2))
+    while True:
+        following = next_occurrence(tz, at, candidate)
+        if following > now:
+            return candidate
+        candidate = following
+
+
+def kind_time(s: UserSettings, kind: str) -> time | None:
+    """
+    Локальное время напоминания нужного вида или None, если оно выключено.
+    """
+    if kind == ReminderSchedule.KIND_MORNING:
+        return s.morning_time if s.morning_enabled else None
+    if kind == ReminderSchedule.KIND_EVENING:
+        return s.evening_time if s.evening_enabled else None
+    if kind == ReminderSchedule.KIND_MISSED:
+        return MISSED_CHECK_TIME if s.notify_missed_days else None
+    raise ValueError(f"Unknown reminder kind: {kind}")
+
+
+def next_run_for(s: UserSettings, kind: str, after: datetime | None = None, tz=None) -> datetime | None:
+    at = kind_time(s, kind)
+    if at is None:
+        return None
+    # tz можно передать заранее (tick группирует пользователей по часовому поясу)
+    tz = tz or parse_user_timezone(s.timezone)
+    return next_occurrence(tz, at, after or timezone.now())
+
+
+def sync_user_reminders(s: UserSettings, now: datetime | None = None) -> None:
+    """
+    Пересчитать индекс напоминаний пользователя после изменения настроек.
+    """
+    now = now or timezone.now()
+    existing = {r.kind: r for r in ReminderSchedule.objects.filter(user_id=s.user_id)}
+
+    to_create: list[ReminderSchedule] = []
+    to_update: list[ReminderSchedule] = []
+    for kind in KINDS:
+        next_run_at = next_run_for(s, kind, now)
+        row = existing.get(kind)
+        if row is None:
+            to_create.append(ReminderSchedule(user_id=s.user_id, kind=kind, next_run_at=next_run_at))
+        elif row.next_run_at != next_run_at:
+            row.next_run_at = next_run_at
+            to_update.append(row)
+
+    if to_create:
+        ReminderSchedule.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        ReminderSchedule.objects.bulk_update(to_update, ["next_run_at"])
+
+
+def rebuild_all_reminders(batch_size: int = 1000) -> int:
+    """
+    Полностью пересобрать индекс для всех пользователей (после миграции или сбоя).
+    """
+    now = timezone.now()
+    rows: list[ReminderSchedule] = []
+    total = 0
+
+    qs = UserSettings.objects.only(
+        "user", "timezone",
+        "morning_enabled", "morning_time",
+        "evening_enabled", "evening_time",
+        "notify_missed_days",
+    )
+    for s in qs.iterator(chunk_size=batch_size):
+        for kind in KINDS:
+            rows.append(ReminderSchedule(user_id=s.user_id, kind=kind, next_run_at=next_run_for(s, kind, now)))
+        if len(rows) >= batch_size:
+            total += _upsert(rows)
+            rows = []
+    if rows:
+        total += _upsert(rows)
+    return total
+
+
+def _upsert(rows: list[ReminderSchedule]) -> int:
+    ReminderSchedule.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["user", "kind"],
+        update_fields=["next_run_at"],
+    )
+    return len(rows)
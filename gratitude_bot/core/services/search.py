@@ -0,0 +1,62 @@
+# gratitude_bot/core/services/search.py
+"""
+Поиск по ответам пользователя («История» → «Поиск по записям»).
+
+Раньше — answer_text/question_text ILIKE '%…%' по всем ответам пользователя:
+последовательный просмотр, который дорожает с каждым днём записей.
+Теперь — полнотекстовый поиск Postgres: Answer.search_vector (tsvector,
+русская конфигурация со стеммингом: «маме» находит «мама») с GIN-индексом.
+Вектор заполняет триггер при вставке и изменении текста — в том числе для
+bulk_create (core.services.answers), минуя ORM.
+
+Результаты ранжируются (совпадение в ответе весомее, чем в вопросе) и
+отдаются страницами.
+
+На других СУБД (локальный SQLite) миграция 0007 не создаёт ни триггера, ни
+индекса, и поиск идёт по icontains с основами слов запроса
+(core.services.normalize — тот же Snowball, что у Postgres): без ранжирования,
+новые записи первыми.
+"""
+from __future__ import annotations
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+
+from core.models import Answer
+from core.services import normalize
+
+SEARCH_CONFIG = "russian"
+PAGE_SIZE = 10
+
+
+def full_text_available() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def search_answers(user_id: int, text: str, page: int = 0, page_size: int = PAGE_SIZE) -> tuple[list[Answer], bool]:
+    """
+    Страница результатов и флаг «есть ещё».
+    """
+    qs = Answer.objects.filter(daily_entry__user_id=user_id).select_related("daily_entry", "question")
+
+    if full_text_available():
+        # websearch: «мама папа», "точная фраза", -исключить — как в поисковиках
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        qs = (
+            qs.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "-daily_entry__date", "-created_at")
+        )
+    else:
+        # каждое слово запроса — своей основой; без значимых слов — строка целиком
+        norm = normalize.get_normalizer()
+        stems = [norm(w) for w in normalize.words(text)] or [text]
+        for part in stems:
+            qs = qs.filter(Q(answer_text__icontains=part) | Q(question_text__icontains=part))
+        qs = qs.order_by("-daily_entry__date", "-created_at")
+
+    # на одну строку больше — чтобы знать, показывать ли «Ещё»
+    start = page * page_size
+    rows = list(qs[start:start + page_size + 1])
+    return rows[:page_size], len(rows) > page_size
@@ -0,0 +1,80 @@
+# gratitude_bot/core/services/stats.py
+"""
+Подсчёты для экранов статистики и прогресса прямо по DailyEntry/WeeklyCycle.
+
+Каждая функция — один агрегирующий запрос с условными Count(filter=Q(...))
+вместо отдельного .count() на каждую цифру. Используются там, где сводки
+StatsRollup нет или она выключена (STATS_USE_ROLLUP = False), и в
+history_progress.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from django.db.models import Count, Max, Q
+
+from core.models import DailyEntry, TelegramUser
+
+ANY_FILLED = Q(completed_morning=True) | Q(completed_evening=True)
+FULLY_FILLED = Q(completed_morning=True, completed_evening=True)
+
+
+def entry_counts(user_id: int, today: date, recent_days: int) -> dict:
+    """
+    Дни за всё время и за recent_days дней по today включительно:
+    total/any/full и recent_total/recent_any/recent_full.
+    """
+    recent = Q(date__gte=today - timedelta(days=recent_days - 1), date__lte=today)
+    return DailyEntry.objects.filter(user_id=user_id).aggregate(
+        total=Count("id"),
+        any=Count("id", filter=ANY_FILLED),
+        full=Count("id", filter=FULLY_FILLED),
+        recent_total=Count("id", filter=recent),
+        recent_any=Count("id", filter=recent & ANY_FILLED),
+        recent_full=Count("id", filter=recent & FULLY_FILLED),
+    )
+
+
+def day_flags(user_id: int, start: date, end: date) -> dict[date, tuple[bool, bool]]:
+    """
+    {день: (утро заполнено, вечер заполнен)} за [start, end] — дни с записью.
+    """
+    rows = DailyEntry.objects.filter(user_id=user_id, date__gte=start, date__lte=end)
+    return {
+        day: (morning, evening)
+        for day, morning, evening in rows.values_list("date", "completed_morning", "completed_evening")
+    }
+
+
+def week_counts(user_id: int, since: date | None = None) -> dict:
+    """
+    Недельные циклы (с недели since, если задана) и стрик:
+    weeks_total/weeks_completed/current_streak/best_streak (стрик None, если его нет).
+    """
+    weeks = Q(weekly_cycles__isnull=False)
+    if since is not None:
+        weeks &= Q(weekly_cycles__week_start__gte=since)
+    # стрик — один к одному, Max просто достаёт значение в том же запросе
+    return TelegramUser.objects.filter(id=user_id).aggregate(
+        weeks_total=Count("weekly_cycles", filter=weeks),
+        weeks_completed=Count("weekly_cycles", filter=weeks & Q(weekly_cycles__is_completed=True)),
+        current_streak=Max("streak_state__current_streak"),
+        best_streak=Max("streak_state__best_streak"),
+    )
+
+
+def general_summary(user_id: int, today: date) -> dict:
+    """
+    Цифры «Общей статистики» — два запроса.
+    """
+    days = entry_counts(user_id, today, recent_days=30)
+    weeks = week_counts(user_id)
+    return {
+        "total_days": days["total"],
+        "days_any": days["any"],
+        "days_full": days["full"],
+        "last30_total": days["recent_total"],
+        "last30_any": days["recent_any"],
+        "last30_full": days["recent_full"],
+        **weeks,
+    }
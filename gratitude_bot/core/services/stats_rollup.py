@@ -0,0 +1,257 @@
+# gratitude_bot/core/services/stats_rollup.py
+"""
+Сводка статистики пользователя (StatsRollup).
+
+Экраны статистики раньше считали всё заново на каждое нажатие: около
+девяти COUNT по DailyEntry и WeeklyCycle в «Общей статистике», сырые
+строки за 14/56 дней в графике и по дням недели. Теперь каждый экран —
+одно чтение StatsRollup по первичному ключу (вместе со стриком).
+
+Сводка обновляется инкрементально:
+- entry_changed(entry) — день создан, заполнен или сброшен («заново»);
+- weeks_changed(user_id) — неделя создана, завершена или сброшена.
+
+Последние StatsRollup.WINDOW_DAYS дней лежат битовыми масками, поэтому
+для них известно прежнее состояние дня и счётчики двигаются на разницу.
+Если прежнее состояние неизвестно (день старше окна, сводки ещё нет) —
+сводка пользователя пересобирается из БД. Для всех сразу — команда
+rebuild_stats_rollup.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from core.models import DailyEntry, StatsRollup, StreakState, TelegramUser, WeeklyCycle
+from core.services.stats import ANY_FILLED, FULLY_FILLED
+
+WINDOW_DAYS = StatsRollup.WINDOW_DAYS
+MASK = (1 << WINDOW_DAYS) - 1
+
+
+# --- битовые маски ---
+
+def _bit(rollup: StatsRollup, day: date) -> int | None:
+    if rollup.recent_anchor is None:
+        return None
+    offset = (rollup.recent_anchor - day).days
+    if 0 <= offset < WINDOW_DAYS:
+        return 1 << offset
+    return None
+
+
+def _move_anchor(rollup: StatsRollup, day: date) -> None:
+    # окно всегда заканчивается последним известным днём
+    if rollup.recent_anchor is None or day <= rollup.recent_anchor:
+        return
+    shift = (day - rollup.recent_anchor).days
+    for field in ("recent_entries", "recent_morning", "recent_evening"):
+        value = getattr(rollup, field)
+        setattr(rollup, field, (value << shift) & MASK if shift < WINDOW_DAYS else 0)
+    rollup.recent_anchor = day
+
+
+def day_flags(rollup: StatsRollup, day: date) -> tuple[bool, bool, bool]:
+    """
+    (запись есть, утро заполнено, вечер заполнен) для дня из окна.
+    """
+    bit = _bit(rollup, day)
+    if bit is None:
+        return False, False, False
+    return bool(rollup.recent_entries & bit), bool(rollup.recent_morning & bit), bool(rollup.recent_evening & bit)
+
+
+def window(rollup: StatsRollup, today: date, days: int) -> tuple[int, int, int]:
+    """
+    (дней с записью, с любым заполнением, полностью) за days дней по today включительно.
+    """
+    entries = any_ = full = 0
+    for i in range(days):
+        exists, morning, evening = day_flags(rollup, today - timedelta(days=i))
+        entries += exists
+        any_ += morning or evening
+        full += morning and evening
+    return entries, any_, full
+
+
+# --- пересборка из БД ---
+
+def build(user_ids) -> list[StatsRollup]:
+    """
+    Сводки для user_ids, посчитанные из DailyEntry/WeeklyCycle (без записи в БД).
+    """
+    rollups = {user_id: StatsRollup(user_id=user_id) for user_id in user_ids}
+
+    days = (
+        DailyEntry.objects.filter(user_id__in=rollups)
+        .values("user_id")
+        .annotate(
+            total=Count("id"),
+            any=Count("id", filter=ANY_FILLED),
+            full=Count("id", filter=FULLY_FILLED),
+            last=Max("date"),
+        )
+    )
+    for row in days:
+        rollup = rollups[row["user_id"]]
+        rollup.total_days, rollup.days_any, rollup.days_full = row["total"], row["any"], row["full"]
+        rollup.recent_anchor = row["last"]
+
+    weeks = (
+        WeeklyCycle.objects.filter(user_id__in=rollups)
+        .values("user_id")
+        .annotate(total=Count("id"), completed=Count("id", filter=Q(is_completed=True)))
+    )
+    for row in weeks:
+        rollup = rollups[row["user_id"]]
+        rollup.weeks_total, rollup.weeks_completed = row["total"], row["completed"]
+
+    # маски: у каждого пользователя своё окно, читаем от самого раннего из них
+    anchors = [r.recent_anchor for r in rollups.values() if r.recent_anchor is not None]
+    if anchors:
+        recent_since = min(anchors) - timedelta(days=WINDOW_DAYS - 1)
+        recent = DailyEntry.objects.filter(user_id__in=rollups, date__gte=recent_since).values_list(
+            "user_id", "date", "completed_morning", "completed_evening",
+        )
+        for user_id, day, morning, evening in recent.iterator():
+            rollup = rollups[user_id]
+            bit = _bit(rollup, day)
+            if bit is None:
+                continue
+            rollup.recent_entries |= bit
+            if morning:
+                rollup.recent_morning |= bit
+            if evening:
+                rollup.recent_evening |= bit
+
+    return list(rollups.values())
+
+
+def save_all(rollups: list[StatsRollup]) -> None:
+    StatsRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[
+            "total_days", "days_any", "days_full", "weeks_total", "weeks_completed",
+            "recent_anchor", "recent_entries", "recent_morning", "recent_evening", "updated_at",
+        ],
+    )
+
+
+def rebuild_all(batch_size: int = 1000) -> int:
+    """
+    Пересобрать сводки всех пользователей (после миграции или сбоя).
+    """
+    user_ids = TelegramUser.objects.order_by("id").values_list("id", flat=True)
+    total = 0
+    batch: list[int] = []
+    for user_id in user_ids.iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            save_all(build(batch))
+            total += len(batch)
+            batch = []
+    if batch:
+        save_all(build(batch))
+        total += len(batch)
+    return total
+
+
+def rebuild_user(user_id: int) -> StatsRollup:
+    rollup, = build([user_id])
+    save_all([rollup])
+    return rollup
+
+
+# --- инкрементальные обновления ---
+
+def entry_changed(entry: DailyEntry) -> None:
+    """
+    Вызывать после создания DailyEntry и после смены completed_morning/completed_evening.
+    """
+    # savepoint=False: внутри чужой транзакции (commit_block) — без лишних SAVEPOINT
+    with transaction.atomic(savepoint=False):
+        rollup = StatsRollup.objects.select_for_update().filter(user_id=entry.user_id).first()
+        if rollup is None:
+            rebuild_user(entry.user_id)
+            return
+
+        if rollup.recent_anchor is None:
+            # у пользователя ещё не было ни одного дня
+            rollup.recent_anchor = entry.date
+        _move_anchor(rollup, entry.date)
+        bit = _bit(rollup, entry.date)
+        if bit is None:
+            # прежнее состояние дня неизвестно
+            rebuild_user(entry.user_id)
+            return
+
+        old_exists, old_morning, old_evening = day_flags(rollup, entry.date)
+        morning, evening = entry.completed_morning, entry.completed_evening
+
+        rollup.total_days += 1 - old_exists
+        rollup.days_any += (morning or evening) - (old_morning or old_evening)
+        rollup.days_full += (morning and evening) - (old_morning and old_evening)
+
+        rollup.recent_entries |= bit
+        rollup.recent_morning = rollup.recent_morning | bit if morning else rollup.recent_morning & ~bit
+        rollup.recent_evening = rollup.recent_evening | bit if evening else rollup.recent_evening & ~bit
+        rollup.save()
+
+
+def weeks_changed(user_id: int) -> None:
+    """
+    Вызывать после создания WeeklyCycle и смены is_completed — недель мало, считаем заново.
+    """
+    counts = WeeklyCycle.objects.filter(user_id=user_id).aggregate(
+        total=Count("id"), completed=Count("id", filter=Q(is_completed=True)),
+    )
+    updated = StatsRollup.objects.filter(user_id=user_id).update(
+        weeks_total=counts["total"], weeks_completed=counts["completed"], updated_at=timezone.now(),
+    )
+    if not updated:
+        rebuild_user(user_id)
+
+
+# --- чтение ---
+
+def get_rollup(user: TelegramUser) -> StatsRollup:
+    """
+    Сводка вместе со стриком — один запрос по первичному ключу.
+    """
+    rollup = StatsRollup.objects.select_related("user__streak_state").filter(user_id=user.id).first()
+    if rollup is None:
+        rollup = rebuild_user(user.id)
+    return rollup
+
+
+def get_streak(rollup: StatsRollup) -> StreakState | None:
+    try:
+        return rollup.user.streak_state
+    except StreakState.DoesNotExist:
+        return None
+
+
+def general_summary(user: TelegramUser, today: date) -> dict:
+    """
+    Цифры «Общей статистики» из сводки — те же ключи, что у stats.general_summary.
+    """
+    rollup = get_rollup(user)
+    last30_total, last30_any, last30_full = window(rollup, today, 30)
+    streak = get_streak(rollup)
+    return {
+        "total_days": rollup.total_days,
+        "days_any": rollup.days_any,
+        "days_full": rollup.days_full,
+        "last30_total": last30_total,
+        "last30_any": last30_any,
+        "last30_full": last30_full,
+        "weeks_total": rollup.weeks_total,
+        "weeks_completed": rollup.weeks_completed,
+        "current_streak": streak.current_streak if streak else None,
+        "best_streak": streak.best_streak if streak else None,
+    }
@@ -0,0 +1,137 @@
+# gratitude_bot/core/services/stemmer.py
+"""
+Стеммер русского языка по алгоритму Snowball (Porter), без зависимостей:
+https://snowballstem.org/algorithms/russian/stemmer.html
+
+Тот же алгоритм стоит за конфигурацией 'russian' полнотекстового поиска
+Postgres (core.services.search), поэтому основы у тем и у поиска совпадают.
+
+Слово ожидается в нижнем регистре и из одних букв (см. core.services.normalize).
+"""
+from __future__ import annotations
+
+VOWELS = "аеиоуыэюя"
+
+PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")  # после а/я
+PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+
+ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")  # после а/я
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+
+REFLEXIVE = ("ся", "сь")
+
+VERB_1 = (  # после а/я
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно",
+)
+VERB_2 = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым", "ен",
+    "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+)
+
+NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой", "ий",
+    "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю",
+    "ия", "ья", "я",
+)
+
+SUPERLATIVE = ("ейш", "ейше")
+DERIVATIONAL = ("ост", "ость")
+
+
+def _regions(word: str) -> tuple[int, int]:
+    """
+    Начало RV (после первой гласной) и R2 (R1 внутри R1).
+    """
+    def after_vowel_consonant(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in VOWELS:
+            rv = i + 1
+            break
+    r1 = after_vowel_consonant(0)
+    r2 = after_vowel_consonant(r1)
+    return rv, r2
+
+
+def _longest(rv: str, endings: tuple[str, ...]) -> str:
+    found = ""
+    for ending in endings:
+        if len(ending) > len(found) and rv.endswith(ending):
+            found = ending
+    return found
+
+
+def _strip(rv: str, after_a: tuple[str, ...], plain: tuple[str, ...]) -> str | None:
+    """
+    Отрезать самое длинное из окончаний. Окончания after_a — только после «а»/«я»
+    (сама буква остаётся). None — ничего не подошло.
+    """
+    ending_1 = _longest(rv, after_a)
+    ending_2 = _longest(rv, plain)
+    if ending_2 and len(ending_2) >= len(ending_1):
+        return rv[:-len(ending_2)]
+    if ending_1:
+        head = rv[:-len(ending_1)]
+        # как в Snowball: нашли самое длинное, но условие не выполнено — окончания нет
+        return head if head.endswith(("а", "я")) else None
+    return None
+
+
+def _step_1(rv: str) -> str:
+    stripped = _strip(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        return stripped
+
+    stripped = _strip(rv, (), REFLEXIVE)
+    if stripped is not None:
+        rv = stripped
+
+    # прилагательное, возможно с суффиксом причастия перед ним
+    stripped = _strip(rv, (), ADJECTIVE)
+    if stripped is not None:
+        participle = _strip(stripped, PARTICIPLE_1, PARTICIPLE_2)
+        return stripped if participle is None else participle
+
+    for after_a, plain in ((VERB_1, VERB_2), ((), NOUN)):
+        stripped = _strip(rv, after_a, plain)
+        if stripped is not None:
+            return stripped
+    return rv
+
+
+def stem(word: str) -> str:
+    word = word.replace("ё", "е")
+    rv_start, r2_start = _regions(word)
+    head, rv = word[:rv_start], word[rv_start:]
+
+    rv = _step_1(rv)
+
+    # шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # шаг 3: словообразовательный суффикс — только в R2
+    ending = _longest(rv, DERIVATIONAL)
+    if ending and len(head) + len(rv) - len(ending) >= r2_start:
+        rv = rv[:-len(ending)]
+
+    # шаг 4
+    ending = _longest(rv, SUPERLATIVE)
+    if ending:
+        rv = rv[:-len(ending)]
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif not ending and rv.endswith("ь"):
+        rv = rv[:-1]
+
+    return head + rv
@@ -0,0 +1,55 @@
+# gratitude_bot/core/services/telegram_sender.py
+from __future__ import annotations
+
+import logging
+import threading
+
+from django.conf import settings as dj_settings
+
+from telegram import Bot
+from telegram.utils.request import Request
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_bot: Bot | None = None
+
+
+def _build_bot() -> Bot | None:
+    token = getattr(dj_settings, "TELEGRAM_BOT_TOKEN", None)
+    if not token:
+        return None
+
+    # один пул keep-alive соединений на процесс: TLS-рукопожатие делается
+    # один раз на соединение, а не на каждое сообщение
+    request = Request(
+        con_pool_size=getattr(dj_settings, "TELEGRAM_POOL_SIZE", 8),
+        connect_timeout=getattr(dj_settings, "TELEGRAM_CONNECT_TIMEOUT", 5.0),
+        read_timeout=getattr(dj_settings, "TELEGRAM_READ_TIMEOUT", 10.0),
+    )
+    base_url = getattr(dj_settings, "TELEGRAM_API_BASE_URL", None) or None
+    return Bot(token=token, base_url=base_url, request=request)
+
+
+def init_bot() -> Bot | None:
+    """
+    (Пере)создать Bot процесса. Вызывается на worker_process_init,
+    чтобы дочерний процесс не унаследовал сокеты родителя после fork.
+    """
+    global _bot
+    with _lock:
+        if _bot is not None:
+            _bot.request.stop()
+        _bot = _build_bot()
+        if _bot is not None:
+            logger.info("Telegram sender initialised (pool=%s)", _bot.request.con_pool_size)
+        return _bot
+
+
+def get_bot() -> Bot | None:
+    """
+    Bot с общим пулом соединений; None, если токен не задан.
+    """
+    if _bot is None:
+        return init_bot()
+    return _bot
@@ -0,0 +1,58 @@
+# gratitude_bot/core/services/timezones.py
+from __future__ import annotations
+
+import re
+from datetime import timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+_UTC_OFFSET_RE = re.compile(r"^UTC(?:(?P<sign>[+-])(?P<h>\d{1,2})(?::(?P<m>\d{2}))?)?$")
+
+UTC = ZoneInfo("UTC")
+
+
+@lru_cache(maxsize=256)
+def resolve_timezone(tz_value: str):
+    """
+    Строка часового пояса -> tzinfo, или None, если строка невалидна.
+
+    Поддерживаем:
+    - "UTC"
+    - "UTC+3", "UTC-9", "UTC+9:30"
+    - IANA: "Europe/Moscow", "Etc/GMT-3", ...
+
+    Результат кэшируется: у тысяч пользователей всего несколько десятков разных строк.
+    """
+    tz_value = (tz_value or "").strip()
+    if not tz_value:
+        return UTC
+
+    m = _UTC_OFFSET_RE.match(tz_value)
+    if m:
+        sign = m.group("sign")
+        if not sign:
+            return dt_timezone.utc
+
+        hours = int(m.group("h"))
+        minutes = int(m.group("m") or 0)
+        if hours > 14 or minutes not in (0, 15, 30, 45):
+            # чуть строже, чтобы не было мусора
+            return None
+
+        delta = timedelta(hours=hours, minutes=minutes)
+        if sign == "-":
+            delta = -delta
+        return dt_timezone(delta)
+
+    # IANA
+    try:
+        return ZoneInfo(tz_value)
+    except Exception:
+        return None
+
+
+def parse_user_timezone(tz_value: str):
+    """
+    Как resolve_timezone, но невалидная строка превращается в UTC.
+    """
+    return resolve_timezone(tz_value) or UTC
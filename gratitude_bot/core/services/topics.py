@@ -0,0 +1,159 @@
+# gratitude_bot/core/services/topics.py
+"""
+«Частые темы благодарности»: частоты слов вечерних ответов.
+
+Раньше экран при каждом нажатии читал все ответы за 31 день и заново
+разбирал тексты в Python. Теперь слова считаются один раз — когда вечер
+записан (core.bot.handlers.evening_flow, core.services.answers) — и лежат
+в TermCount по (пользователь, день, слово). Топ за любое окно —
+один запрос SUM(count) ... GROUP BY term ORDER BY ... LIMIT.
+
+Слова приводятся к основе (core.services.normalize): «маме», «мама» и
+«маму» — одна тема; в списке показывается самая частая её форма за окно.
+
+День пересчитывается целиком: вечер можно заполнить заново, и тогда его
+слова должны уйти из статистики.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from core.models import Answer, QuestionTemplate, TermCount
+from core.services import normalize
+
+TOP_LIMIT = 10
+
+EVENING_ANSWERS = Q(period=QuestionTemplate.PERIOD_EVENING)
+
+
+def count_terms(texts) -> dict[str, Counter]:
+    """
+    Основа → Counter её форм в текстах.
+    """
+    norm = normalize.get_normalizer()
+    forms: dict[str, Counter] = defaultdict(Counter)
+    for text in texts:
+        for w in normalize.words(text):
+            # TermCount.term/word — 64 символа
+            forms[norm(w)[:64]][w[:64]] += 1
+    return forms
+
+
+def _rows(user_id: int, day: date, forms: dict[str, Counter]) -> list[TermCount]:
+    return [
+        TermCount(user_id=user_id, date=day, term=term, word=counter.most_common(1)[0][0], count=counter.total())
+        for term, counter in forms.items()
+    ]
+
+
+def refresh_day(user_id: int, day: date) -> None:
+    """
+    Пересчитать слова вечерних ответов пользователя за день.
+    """
+    texts = Answer.objects.filter(
+        EVENING_ANSWERS, daily_entry__user_id=user_id, daily_entry__date=day,
+    ).values_list("answer_text", flat=True)
+    forms = count_terms(texts)
+
+    with transaction.atomic(savepoint=False):
+        TermCount.objects.filter(user_id=user_id, date=day).delete()
+        TermCount.objects.bulk_create(_rows(user_id, day, forms))
+
+
+def _display_forms(rows) -> dict[str, str]:
+    """
+    Основа → самая частая её форма по строкам (term, word, total).
+    """
+    by_form: Counter = Counter()
+    for term, word, total in rows:
+        by_form[term, word] += total
+
+    best: dict[str, tuple[int, str]] = {}
+    for (term, word), total in by_form.items():
+        current = best.get(term)
+        # при равенстве — первая по алфавиту, чтобы список не «прыгал»
+        if current is None or total > current[0] or (total == current[0] and word < current[1]):
+            best[term] = (total, word)
+    return {term: word for term, (_, word) in best.items()}
+
+
+def top_terms(user_id: int, start: date, end: date, limit: int = TOP_LIMIT) -> list[tuple[str, int]]:
+    """
+    Самые частые темы за [start, end]: [(слово, сколько раз), ...].
+    """
+    rows = TermCount.objects.filter(user_id=user_id, date__gte=start, date__lte=end)
+
+    # строки до нормализации (word пустой, term — просто слово в нижнем регистре),
+    # пока не запущен rebuild_term_counts: приводим к основам здесь
+    legacy = list(rows.filter(word="").values("term").annotate(total=Sum("count")).values_list("term", "total"))
+    if legacy:
+        return _top_terms_mixed(rows.exclude(word=""), legacy, limit)
+
+    top = list(
+        rows.values("term")
+        .annotate(total=Sum("count"))
+        .order_by("-total", "term")
+        .values_list("term", "total")[:limit]
+    )
+    forms = _display_forms(
+        rows.filter(term__in=[term for term, _ in top])
+        .values("term", "word")
+        .annotate(total=Sum("count"))
+        .values_list("term", "word", "total")
+    )
+    return [(forms.get(term) or term, total) for term, total in top]
+
+
+def _top_terms_mixed(rows, legacy: list[tuple[str, int]], limit: int) -> list[tuple[str, int]]:
+    norm = normalize.get_normalizer()
+    by_form = list(rows.values("term", "word").annotate(total=Sum("count")).values_list("term", "word", "total"))
+    by_form += [(norm(word)[:64], word, total) for word, total in legacy]
+
+    totals: Counter = Counter()
+    for term, _, total in by_form:
+        totals[term] += total
+    forms = _display_forms(by_form)
+    top = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [(forms[term], total) for term, total in top]
+
+
+def rebuild_all(batch_size: int = 5000) -> int:
+    """
+    Заполнить TermCount заново по всем вечерним ответам. Возвращает число строк.
+    """
+    answers = (
+        Answer.objects.filter(EVENING_ANSWERS)
+        .order_by("daily_entry__user_id", "daily_entry__date")
+        .values_list("daily_entry__user_id", "daily_entry__date", "answer_text")
+    )
+
+    total = 0
+    pending: list[TermCount] = []
+    current = None
+    texts: list[str] = []
+
+    def flush_day():
+        # день копится целиком: одни и те же (user, date, term) не должны попасть в две строки
+        if current is not None:
+            pending.extend(_rows(current[0], current[1], count_terms(texts)))
+
+    with transaction.atomic():
+        TermCount.objects.all().delete()
+        for user_id, day, text in answers.iterator(chunk_size=batch_size):
+            if (user_id, day) != current:
+                flush_day()
+                current, texts = (user_id, day), []
+                if len(pending) >= batch_size:
+                    TermCount.objects.bulk_create(pending, batch_size=batch_size)
+                    total += len(pending)
+                    pending = []
+            texts.append(text)
+        flush_day()
+        TermCount.objects.bulk_create(pending, batch_size=batch_size)
+        total += len(pending)
+
+    return total
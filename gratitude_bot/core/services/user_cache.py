@@ -0,0 +1,73 @@
+# gratitude_bot/core/services/user_cache.py
+"""
+Короткоживущий кэш пары TelegramUser + UserSettings в памяти процесса.
+
+Почти каждый хендлер начинает с get_or_create_tg_user(update), а потом
+ещё раз читает настройки ради часового пояса. С кэшем обычный путь — ноль
+запросов: пользователь отдаётся с уже подгруженным user.settings.
+
+Кэш только для чтения: хендлеры настроек меняют строку, перечитанную из БД
+под блокировкой (settings_flow._change_setting), и после сохранения вызывают
+forget(telegram_id). forget действует лишь на свой процесс — изменения из
+админки или другого процесса видны не позже чем через USER_CACHE_TTL.
+"""
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings as dj_settings
+
+from core.models import TelegramUser, UserSettings
+
+_lock = threading.Lock()
+# telegram_id -> (истекает, пользователь, настройки)
+_cache: OrderedDict[int, tuple[float, TelegramUser, UserSettings]] = OrderedDict()
+
+
+def _ttl() -> float:
+    return getattr(dj_settings, "USER_CACHE_TTL", 60)
+
+
+def get(telegram_id: int) -> TelegramUser | None:
+    """
+    Копия закэшированного пользователя с user.settings, или None.
+    Копии — чтобы изменения в одном хендлере не протекали в кэш без save().
+    """
+    with _lock:
+        entry = _cache.get(telegram_id)
+        if entry is None:
+            return None
+        expires, user, user_settings = entry
+        if expires < time.monotonic():
+            del _cache[telegram_id]
+            return None
+        _cache.move_to_end(telegram_id)
+
+    user = copy.copy(user)
+    user.settings = copy.copy(user_settings)
+    return user
+
+
+def put(user: TelegramUser, user_settings: UserSettings) -> None:
+    ttl = _ttl()
+    if ttl <= 0:
+        return
+    max_size = getattr(dj_settings, "USER_CACHE_SIZE", 10000)
+    with _lock:
+        _cache[user.telegram_id] = (time.monotonic() + ttl, copy.copy(user), copy.copy(user_settings))
+        _cache.move_to_end(user.telegram_id)
+        while len(_cache) > max_size:
+            _cache.popitem(last=False)
+
+
+def forget(telegram_id: int) -> None:
+    with _lock:
+        _cache.pop(telegram_id, None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,23 @@
+# gratitude_bot/core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import QuestionTemplate, UserSettings
+from core.services import questions
+from core.services.reminders import sync_user_reminders
+
+
+@receiver(post_save, sender=QuestionTemplate)
+@receiver(post_delete, sender=QuestionTemplate)
+def question_template_changed(sender, **kwargs):
+    # после коммита — чтобы другой процесс не перечитал шаблоны до того, как изменения видны
+    transaction.on_commit(questions.bump_version)
+
+
+@receiver(post_save, sender=UserSettings)
+def user_settings_created(sender, instance, created, raw=False, **kwargs):
+    # новые настройки из любого места (бот, админка, shell) сразу попадают в индекс напоминаний;
+    # дальше индекс пересчитывают хендлеры настроек
+    if created and not raw:
+        sync_user_reminders(instance)
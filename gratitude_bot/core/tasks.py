@@ -1,81 +1,351 @@
 # gratitude_bot/core/tasks.py
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
 
-from celery import shared_task
+from celery import chord, group, shared_task
+from celery.signals import worker_process_init
 from django.conf import settings as dj_settings
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
 
-from telegram import Bot
-
-from core.models import UserSettings, DailyEntry
+from core.models import DailyEntry, ReminderSchedule, SentReminder
+from core.services import telegram_sender
+from core.services import metrics
+from core.services.locks import Lease, lease, once_per_key
+from core.services.metrics import count
+from core.services.outbox import OutboundQueue, SendReport
+from core.services.reminders import kind_time, latest_occurrence, next_occurrence
+from core.services.timezones import UTC, resolve_timezone
 import logging
 logger = logging.getLogger(__name__)
 
 
-# def _send_tg(chat_id: int, text: str) -> None:
-#     token = getattr(dj_settings, "TELEGRAM_BOT_TOKEN", None)
-#     if not token:
-#         return
-#     Bot(token=token).send_message(chat_id=chat_id, text=text)
-def _send_tg(chat_id: int, text: str) -> None:
-    token = getattr(dj_settings, "TELEGRAM_BOT_TOKEN", None)
-    if not token:
-        logger.warning("NO TELEGRAM_BOT_TOKEN in settings. Can't send to %s", chat_id)
+@worker_process_init.connect
+def _init_worker_sender(**kwargs):
+    telegram_sender.init_bot()
+
+
+TICK_LEASE = "reminders:tick"
+
+
+def _lease_ttl() -> float:
+    # если воркер упал посреди tick, аренда сама истечёт через это время
+    return getattr(dj_settings, "REMINDER_TICK_LEASE_SECONDS", 300)
+
+
+def _shard_queue(shards: int) -> OutboundQueue:
+    # шарды работают параллельно, поэтому глобальный лимит API делим между ними
+    rate = getattr(dj_settings, "TELEGRAM_GLOBAL_RATE", 30) / shards
+    return OutboundQueue(rate=rate)
+
+
+MESSAGES = {
+    ReminderSchedule.KIND_MORNING: "☀️ Доброе утро! Пора заполнить утренний блок 🌿",
+    ReminderSchedule.KIND_EVENING: "🌙 Добрый вечер! Пора заполнить вечерний блок ✨",
+    ReminderSchedule.KIND_MISSED: "🫶 Вчера был пропуск. Хочешь вернуться сегодня? Я рядом.",
+}
+
+
+def _check_day(kind: str, local_day: date) -> date:
+    # пропуски (мягко): в 12:00 локального времени смотрим на вчерашний день
+    if kind == ReminderSchedule.KIND_MISSED:
+        return local_day - timedelta(days=1)
+    return local_day
+
+
+def _load_completion(user_ids_by_day: dict[date, set[int]]) -> dict[tuple[int, date], tuple[bool, bool]]:
+    """
+    (user_id, date) -> (completed_morning, completed_evening).
+    Один запрос на каждую дату; отсутствующая запись = ничего не заполнено.
+    """
+    state = {}
+    for day, user_ids in user_ids_by_day.items():
+        rows = DailyEntry.objects.filter(date=day, user_id__in=user_ids).values_list(
+            "user_id", "completed_morning", "completed_evening",
+        )
+        for user_id, morning, evening in rows:
+            state[(user_id, day)] = (morning, evening)
+    return state
+
+
+def _claim(to_send: list[tuple[ReminderSchedule, datetime, date, date]], tick: str) -> set[tuple[int, str, date]]:
+    """
+    Занять записи в журнале SentReminder одним INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает (user_id, kind, local_date), которые достались именно этому tick —
+    повторный или наложившийся tick получит пустое множество.
+    """
+    if not to_send:
+        return set()
+    SentReminder.objects.bulk_create(
+        [SentReminder(user_id=r.user_id, kind=r.kind, local_date=local_day, tick=tick) for r, _, local_day, _ in to_send],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    return set(SentReminder.objects.filter(tick=tick).values_list("user_id", "kind", "local_date"))
+
+
+def _advance(rows: list[ReminderSchedule], next_runs: dict[ReminderSchedule, datetime | None]) -> int:
+    """
+    Перенести строки индекса на следующее срабатывание — только те, что не
+    поменялись с момента выборки. Если пользователь успел изменить настройки,
+    sync_user_reminders уже записал новое время, и затирать его нельзя.
+    """
+    advanced = 0
+    for i in range(0, len(rows), 500):
+        batch = rows[i:i + 500]
+        match = Q()
+        for r in batch:
+            match |= Q(pk=r.pk, next_run_at=r.next_run_at)
+        advanced += ReminderSchedule.objects.filter(match).update(
+            next_run_at=Case(
+                *(When(pk=r.pk, then=Value(next_runs[r])) for r in batch),
+                output_field=DateTimeField(),
+            ),
+        )
+    return advanced
+
+
+def _should_send(kind: str, completed: tuple[bool, bool]) -> bool:
+    morning, evening = completed
+    if kind == ReminderSchedule.KIND_MORNING:
+        return not morning
+    if kind == ReminderSchedule.KIND_EVENING:
+        return not evening
+    return not morning and not evening
+
+
+@shared_task
+def tick_reminders():
+    """
+    Запускается по расписанию (раз в минуту) и раздаёт работу шардам.
+
+    Сам tick ничего не отправляет: он фиксирует момент "сейчас" и запускает
+    REMINDER_SHARDS подзадач параллельно на воркерах (chord),
+    а итог по всем шардам собирает summarize_reminder_tick.
+
+    Несколько реплик beat/воркеров безопасны: одна и та же минута запускается
+    один раз, а пока предыдущий tick не собрал итог (аренда в Redis),
+    новый tick пропускается и попадает в счётчик reminders_tick_overlapped.
+    Шард с ошибкой не ломает chord (см. process_reminder_shard); если chord
+    всё же упал, аренду отпускает release_tick_lease.
+    """
+    now = timezone.now()
+    now_iso = now.isoformat()
+    shards = max(1, int(getattr(dj_settings, "REMINDER_SHARDS", 1)))
+
+    if not once_per_key(f"reminders:tick:{now:%Y%m%d%H%M}", ttl=120):
+        count("reminders_tick_duplicate")
+        logger.info("tick %s already started by another beat, skipping", now_iso)
+        return
+
+    tick_lease = Lease(TICK_LEASE, ttl=_lease_ttl())
+    if not tick_lease.acquire():
+        count("reminders_tick_overlapped")
+        logger.warning("tick %s: previous tick is still running, skipping", now_iso)
         return
+
     try:
-        Bot(token=token).send_message(chat_id=chat_id, text=text)
-        logger.info("SENT to chat_id=%s: %s", chat_id, text[:50])
+        header = group(process_reminder_shard.s(shard, shards, now_iso) for shard in range(shards))
+        body = summarize_reminder_tick.s(now_iso, tick_lease.token)
+        body.link_error(release_tick_lease.si(tick_lease.token))
+        chord(header)(body)
     except Exception:
-        logger.exception("FAILED sending to chat_id=%s", chat_id)
+        tick_lease.release()
+        raise
 
-def _local_now(tz_name: str) -> datetime:
-    # tz_name должен быть валидным IANA (Europe/Moscow) или UTC+X (если ты так разрешишь)
-    return datetime.now(ZoneInfo(tz_name))
+
+@shared_task
+def release_tick_lease(lease_token: str) -> None:
+    # errback chord: без него tick-и пропускались бы до истечения аренды
+    Lease(TICK_LEASE, ttl=0, token=lease_token).release()
+
+
+def _idle_result(shard: int, skipped: bool = False, failed: bool = False) -> dict:
+    return {
+        "shard": shard, "skipped": skipped, "failed_shard": failed, "checked": 0, "due": 0, "stale": 0,
+        "duplicates": 0, "invalid_timezones": [], **SendReport().as_dict(),
+    }
 
 
 @shared_task
-def tick_reminders():
+def process_reminder_shard(shard: int, shards: int, now_iso: str) -> dict:
+    """
+    Ошибку шарда не выпускаем наружу: иначе chord не вызовет
+    summarize_reminder_tick, и аренда tick держалась бы до истечения TTL.
+    """
+    with lease(f"reminders:shard:{shard}", ttl=_lease_ttl()) as acquired:
+        if not acquired:
+            count("reminders_shard_overlapped")
+            logger.warning("shard %s is still busy with a previous tick, skipping", shard)
+            return _idle_result(shard, skipped=True)
+        try:
+            return _process_shard(shard, shards, now_iso)
+        except Exception:
+            count("reminders_shard_failed")
+            logger.exception("shard %s failed on tick %s", shard, now_iso)
+            return _idle_result(shard, failed=True)
+
+
+def _process_shard(shard: int, shards: int, now_iso: str) -> dict:
+    """
+    Обрабатывает свою часть наступивших напоминаний: user_id % shards == shard.
+
+    Берём из индекса ReminderSchedule только те строки, чьё время уже наступило,
+    и до отправки переносим их на следующее срабатывание (если настройки за это
+    время не поменялись). Пропущенные из-за простоя
+    срабатывания догоняем в пределах REMINDER_CATCHUP_MINUTES; перед отправкой
+    пачкой занимаем записи в SentReminder, так что повторный или наложившийся
+    tick не отправит то же напоминание второй раз за день.
+    """
+    started = perf_counter()
+    now = datetime.fromisoformat(now_iso)
+    due = list(
+        ReminderSchedule.objects
+        .annotate(shard=F("user_id") % shards)
+        .filter(next_run_at__lte=now, shard=shard)
+        .select_related("user", "user__settings")
+        .order_by("next_run_at")
+    )
+
+    # у тысяч пользователей несколько десятков разных поясов:
+    # разбираем пояс и считаем локальные даты/следующие срабатывания один раз на пояс
+    by_zone: dict[str, list[ReminderSchedule]] = defaultdict(list)
+    for r in due:
+        by_zone[r.user.settings.timezone].append(r)
+
+    catchup = timedelta(minutes=getattr(dj_settings, "REMINDER_CATCHUP_MINUTES", 180))
+
+    invalid_zones: list[str] = []
+    # (строка индекса, момент срабатывания в UTC, локальная дата напоминания, проверяемая дата)
+    candidates: list[tuple[ReminderSchedule, datetime, date, date]] = []
+    user_ids_by_day: dict[date, set[int]] = defaultdict(set)
+    next_runs: dict[ReminderSchedule, datetime | None] = {}
+    stale = 0
+    for tz_name, rows in by_zone.items():
+        tz = resolve_timezone(tz_name)
+        if tz is None:
+            # бот для такой строки тоже считает UTC — напоминаем по UTC, но сообщаем
+            invalid_zones.append(tz_name)
+            tz = UTC
+
+        latest: dict[time, datetime] = {}
+        upcoming: dict[time, datetime] = {}
+        for r in rows:
+            at = kind_time(r.user.settings, r.kind)
+            if at is None:
+                next_runs[r] = None
+                continue
+            if at not in latest:
+                latest[at] = latest_occurrence(tz, at, now)
+                upcoming[at] = next_occurrence(tz, at, now)
+            next_runs[r] = upcoming[at]
+
+            # после простоя догоняем только последнее пропущенное срабатывание
+            scheduled_at = latest[at]
+            if now - scheduled_at > catchup:
+                stale += 1
+                logger.warning(
+                    "stale reminder user=%s kind=%s scheduled=%s, skipping",
+                    r.user.telegram_id, r.kind, scheduled_at,
+                )
+                continue
+
+            local_day = scheduled_at.astimezone(tz).date()
+            day = _check_day(r.kind, local_day)
+            candidates.append((r, scheduled_at, local_day, day))
+            user_ids_by_day[day].add(r.user_id)
+
+    completion = _load_completion(user_ids_by_day)
+
+    to_send = [
+        c for c in candidates
+        if _should_send(c[0].kind, completion.get((c[0].user_id, c[3]), (False, False)))
+    ]
+    # отправка большой пачки может идти минутами — индекс двигаем до неё
+    _advance(due, next_runs)
+
+    tick = f"{now_iso}#{shard}#{uuid.uuid4().hex[:12]}"
+    claimed = _claim(to_send, tick)
+
+    queue = _shard_queue(shards)
+    for r, scheduled_at, local_day, _ in to_send:
+        if (r.user_id, r.kind, local_day) in claimed:
+            queue.put(r.user.telegram_id, MESSAGES[r.kind], scheduled_at=scheduled_at)
+    if getattr(dj_settings, "REMINDER_SEND_MODE", "sync") == "async":
+        report = asyncio.run(queue.flush_async())
+    else:
+        report = queue.flush()
+
+    metrics.observe_many("reminder_send_latency_seconds", report.lags)
+    for error_type, n in report.errors.items():
+        count("reminder_send_errors", n, type=error_type)
+    if report.sent:
+        count("reminders_sent", report.sent)
+    metrics.observe("reminder_shard_duration_seconds", perf_counter() - started)
+
+    return {
+        "shard": shard,
+        "skipped": False,
+        "failed_shard": False,
+        "checked": len(due),
+        "due": len(to_send),
+        "stale": stale,
+        "duplicates": len(to_send) - len(claimed),
+        "invalid_timezones": invalid_zones,
+        **report.as_dict(),
+    }
+
+
+@shared_task
+def summarize_reminder_tick(results: list[dict], now_iso: str, lease_token: str | None = None) -> dict:
+    if lease_token:
+        Lease(TICK_LEASE, ttl=0, token=lease_token).release()
+
+    summary = {
+        "tick": now_iso,
+        "shards": len(results),
+        "skipped_shards": sum(1 for r in results if r["skipped"]),
+        "failed_shards": sum(1 for r in results if r["failed_shard"]),
+        "checked": sum(r["checked"] for r in results),
+        "due": sum(r["due"] for r in results),
+        "sent": sum(r["sent"] for r in results),
+        "failed": sum(r["failed"] for r in results),
+        "retried": sum(r["retried"] for r in results),
+        "stale": sum(r["stale"] for r in results),
+        "duplicates": sum(r["duplicates"] for r in results),
+        "max_lag": max((r["max_lag"] for r in results), default=0.0),
+        "invalid_timezones": sorted({tz for r in results for tz in r["invalid_timezones"]}),
+        # от момента tick до сбора итога, включая ожидание в очереди Celery
+        "duration": (timezone.now() - datetime.fromisoformat(now_iso)).total_seconds(),
+    }
+    metrics.observe("reminder_tick_duration_seconds", summary["duration"])
+    metrics.observe("reminder_tick_scanned_users", summary["checked"])
+    metrics.observe("reminder_tick_due_users", summary["due"])
+    if summary["invalid_timezones"]:
+        logger.warning(
+            "tick %s: invalid timezones (treated as UTC): %s",
+            summary["tick"], ", ".join(summary["invalid_timezones"]),
+        )
+    logger.info(
+        "tick %s: shards=%s skipped_shards=%s failed_shards=%s checked=%s due=%s sent=%s failed=%s retried=%s "
+        "stale=%s duplicates=%s max_lag=%.1fs duration=%.1fs",
+        summary["tick"], summary["shards"], summary["skipped_shards"], summary["failed_shards"], summary["checked"],
+        summary["due"], summary["sent"], summary["failed"], summary["retried"], summary["stale"], summary["duplicates"],
+        summary["max_lag"], summary["duration"],
+    )
+    return summary
+
+
+@shared_task
+def purge_sent_reminders(keep_days: int = 7) -> int:
     """
-    Запускается по расписанию (например раз в минуту) и решает,
-    кому надо отправить напоминание прямо сейчас.
+    Журналу SentReminder нужны только последние дни — старое удаляем.
     """
-    qs = UserSettings.objects.select_related("user").all()
-
-    for s in qs:
-        user = s.user
-        now = _local_now(s.timezone)
-        hhmm = now.strftime("%H:%M")
-        today = now.date()
-        
-        logger.info("tick user=%s tz=%s local=%s morning=%s evening=%s",
-            user.telegram_id, s.timezone, now.strftime("%Y-%m-%d %H:%M:%S"),
-            s.morning_time.strftime("%H:%M"),
-            s.evening_time.strftime("%H:%M"))
-
-
-        # --- утро ---
-        target = datetime.combine(today, s.morning_time, tzinfo=ZoneInfo(s.timezone))
-        if s.morning_enabled and 0 <= (now - target).total_seconds() < 60:
-        # if s.morning_enabled and hhmm == s.morning_time.strftime("%H:%M"):
-            entry, _ = DailyEntry.objects.get_or_create(user=user, date=today)
-            if not entry.completed_morning:
-                _send_tg(user.telegram_id, "☀️ Доброе утро! Пора заполнить утренний блок 🌿")
-
-
-        # --- вечер ---
-        target = datetime.combine(today, s.evening_time, tzinfo=ZoneInfo(s.timezone))
-        if s.evening_enabled and 0 <= (now - target).total_seconds() < 60:
-        # if s.evening_enabled and hhmm == s.evening_time.strftime("%H:%M"):
-            entry, _ = DailyEntry.objects.get_or_create(user=user, date=today)
-            if not entry.completed_evening:
-                _send_tg(user.telegram_id, "🌙 Добрый вечер! Пора заполнить вечерний блок ✨")
-
-        # --- пропуски (мягко) ---
-        # пример: в 12:00 локального времени напоминаем, если вчера не заполнено ничего
-        if s.notify_missed_days and hhmm == "12:00":
-            yesterday = today - timedelta(days=1)
-            e = DailyEntry.objects.filter(user=user, date=yesterday).first()
-            if not e or (not e.completed_morning and not e.completed_evening):
-                _send_tg(user.telegram_id, "🫶 Вчера был пропуск. Хочешь вернуться сегодня? Я рядом.")
+    cutoff = timezone.now().date() - timedelta(days=keep_days)
+    deleted, _ = SentReminder.objects.filter(local_date__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,1081 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+import fakeredis
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from telegram import Bot, Update
+from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+from telegram.utils.request import Request
+
+from core import tasks
+from core.bot.bot import build_updater
+from core.bot.handlers import evening_flow, settings_flow, statistics_flow
+from core.bot.handlers.utils import get_or_create_tg_user, get_user_settings, user_local_date
+from core.bot.persistence import RedisStateStore, StatePersistence, conv_field
+from core.bot.webhook import UpdatePipeline
+from core.bot.keyboards.main_menu import BACK_BUTTON
+from core.bot.router import ExactTextHandler
+from core.models import (
+    Answer, DailyEntry, QuestionTemplate, ReminderSchedule, SentReminder, TelegramUser, TermCount, UserSettings,
+    WeeklyCycle,
+)
+from core.services import answers as answer_buffer
+from core.services import export, history, questions, search, stats_rollup, telegram_sender, topics, user_cache
+from core.management.commands import bench_router
+from core.services.fake_telegram import FakeTelegramServer
+from core.services.locks import LOCK_PREFIX, Lease, once_per_key
+from core.services.metrics import COUNTERS_KEY
+from core.services.outbox import OutboundQueue
+from core.services.redis_client import set_redis
+from core.services.reminders import latest_occurrence, local_to_utc, next_occurrence
+from core.services.timezones import resolve_timezone
+
+
+class FakeRedisMixin:
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        set_redis(self.redis)
+        self.addCleanup(set_redis, None)
+
+
+class TelegramSenderConnectionReuseTests(SimpleTestCase):
+    """
+    Общий Bot процесса держит keep-alive соединения: сообщений много, соединений единицы.
+    """
+
+    def setUp(self):
+        self.server = FakeTelegramServer(("127.0.0.1", 0)).start()
+        self.addCleanup(self.server.stop)
+
+        overridden = override_settings(
+            TELEGRAM_BOT_TOKEN="123:fake",
+            TELEGRAM_API_BASE_URL=self.server.base_url,
+            TELEGRAM_POOL_SIZE=2,
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        # порядок cleanup обратный: Bot пересоздаётся уже с исходными настройками
+        self.addCleanup(telegram_sender.init_bot)
+        telegram_sender.init_bot()
+
+    def test_messages_reuse_connections(self):
+        n = 50
+        bot = telegram_sender.get_bot()
+        for i in range(n):
+            bot.send_message(chat_id=1000 + i, text=f"message {i}")
+
+        stats = self.server.stats()
+        self.assertEqual(stats["by_method"].get("sendMessage"), n)
+        self.assertEqual(len(self.server.messages), n)
+        self.assertLessEqual(stats["connections"], 2)
+        self.assertLess(stats["connections"] * 10, stats["requests"])
+
+    def test_get_bot_returns_same_instance(self):
+        self.assertIs(telegram_sender.get_bot(), telegram_sender.get_bot())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+
+class ScriptedBot:
+    """
+    send_message по сценарию: errors[chat_id] — исключения для первых попыток.
+    """
+
+    def __init__(self, clock: FakeClock, errors: dict | None = None):
+        self.clock = clock
+        self.errors = {chat_id: list(e) for chat_id, e in (errors or {}).items()}
+        self.calls: list[tuple[float, int]] = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.calls.append((self.clock(), chat_id))
+        pending = self.errors.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+
+
+class OutboundQueueTests(SimpleTestCase):
+    def make_queue(self, errors=None, **kwargs) -> OutboundQueue:
+        self.clock = FakeClock()
+        self.bot = ScriptedBot(self.clock, errors)
+        kwargs.setdefault("rate", 1000)
+        kwargs.setdefault("per_chat_interval", 0)
+        kwargs.setdefault("max_retries", 3)
+        return OutboundQueue(bot=self.bot, clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_global_rate_is_never_exceeded(self):
+        rate = 5
+        queue = self.make_queue(rate=rate)
+        for i in range(40):
+            queue.put(100 + i, "hi")
+        self.assertEqual(queue.flush().sent, 40)
+
+        times = [t for t, _ in self.bot.calls]
+        # token bucket: за любой отрезок — не больше запаса (rate) плюс rate в секунду
+        for i in range(len(times)):
+            for j in range(i, len(times)):
+                self.assertLessEqual(j - i + 1, rate + rate * (times[j] - times[i]) + 1e-9)
+        self.assertGreaterEqual(times[-1], (40 - rate) / rate - 1e-9)
+
+    def test_per_chat_gap_does_not_hold_other_chats(self):
+        queue = self.make_queue(per_chat_interval=1.0)
+        for chat_id in (1, 1, 1, 2):
+            queue.put(chat_id, "hi")
+        queue.flush()
+
+        chat1 = [t for t, chat_id in self.bot.calls if chat_id == 1]
+        self.assertEqual(len(chat1), 3)
+        self.assertTrue(all(b - a >= 1.0 for a, b in zip(chat1, chat1[1:])))
+        self.assertEqual([t for t, chat_id in self.bot.calls if chat_id == 2], [0.0])
+
+    def test_retry_after_pauses_whole_queue_then_retries(self):
+        queue = self.make_queue(errors={1: [RetryAfter(3)]})
+        for chat_id in (1, 2, 3):
+            queue.put(chat_id, "hi")
+        with self.assertLogs("core.services.outbox", "WARNING"):
+            report = queue.flush()
+
+        self.assertEqual((report.sent, report.retried, report.failed), (3, 1, 0))
+        self.assertEqual(report.errors["RetryAfter"], 1)
+        # после 429 в t=0 до t=3 — ни одного запроса, ни в какой чат
+        self.assertEqual(self.bot.calls[0], (0.0, 1))
+        self.assertTrue(all(t >= 3.0 for t, _ in self.bot.calls[1:]))
+        self.assertEqual(sorted(chat_id for _, chat_id in self.bot.calls[1:]), [1, 2, 3])
+
+    def test_transient_errors_back_off_up_to_max_retries(self):
+        queue = self.make_queue(errors={1: [NetworkError("reset")] * 10}, max_retries=3, backoff=0.5)
+        queue.put(1, "hi")
+        with self.assertLogs("core.services.outbox", "WARNING"):
+            report = queue.flush()
+
+        times = [t for t, _ in self.bot.calls]
+        self.assertEqual(len(times), 4)
+        self.assertEqual([b - a for a, b in zip(times, times[1:])], [0.5, 1.0, 2.0])
+        self.assertEqual((report.sent, report.retried, report.failed), (0, 3, 1))
+        self.assertEqual(report.errors["NetworkError"], 4)
+
+    def test_bad_request_and_unauthorized_fail_without_retry(self):
+        queue = self.make_queue(errors={1: [BadRequest("chat not found")], 2: [Unauthorized("blocked")]})
+        queue.put(1, "hi")
+        queue.put(2, "hi")
+        with self.assertLogs("core.services.outbox", "ERROR"):
+            report = queue.flush()
+
+        self.assertEqual([chat_id for _, chat_id in self.bot.calls], [1, 2])
+        self.assertEqual((report.sent, report.retried, report.failed), (0, 0, 2))
+
+
+class AsyncSendTests(SimpleTestCase):
+    """
+    flush_async (REMINDER_SEND_MODE = "async") держит те же лимиты, что и flush().
+    """
+
+    def setUp(self):
+        # каждый 7-й запрос — 429 с retry_after=0: повтор без паузы
+        self.server = FakeTelegramServer(("127.0.0.1", 0), flood_every=7, retry_after=0).start()
+        self.addCleanup(self.server.stop)
+        self.bot = Bot("123:fake", base_url=self.server.base_url, request=Request(con_pool_size=4))
+
+    def test_async_flush_respects_rate_and_retries(self):
+        n, rate = 30, 20
+        queue = OutboundQueue(bot=self.bot, rate=rate)
+        for i in range(n):
+            queue.put(1000 + i, f"message {i}")
+
+        started = time.monotonic()
+        with self.assertLogs("core.services.outbox", "WARNING"):
+            report = asyncio.run(queue.flush_async(concurrency=4))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual((report.sent, report.failed), (n, 0))
+        self.assertEqual(report.retried, self.server.stats()["requests"] - n)
+        self.assertGreater(report.retried, 0)
+        self.assertEqual(sorted(int(m["chat_id"]) for m in self.server.messages), list(range(1000, 1000 + n)))
+        # запас bucket — rate токенов, остальное (включая повторы) — не быстрее rate в секунду
+        self.assertGreaterEqual(elapsed, (n + report.retried - rate) / rate * 0.9)
+
+
+class LeaseTests(FakeRedisMixin, SimpleTestCase):
+    def test_acquire_and_release(self):
+        held = Lease("test", ttl=10)
+        self.assertTrue(held.acquire())
+        self.assertEqual(self.redis.get(LOCK_PREFIX + "test"), held.token.encode())
+        self.assertFalse(Lease("test", ttl=10).acquire())
+
+        self.assertTrue(held.release())
+        self.assertIsNone(self.redis.get(LOCK_PREFIX + "test"))
+        self.assertTrue(Lease("test", ttl=10).acquire())
+
+    def test_expires_by_itself(self):
+        held = Lease("test", ttl=0.05)
+        self.assertTrue(held.acquire())
+        time.sleep(0.1)
+        self.assertTrue(Lease("test", ttl=10).acquire())
+        # ключ уже чужой — отпускать нечего
+        self.assertFalse(held.release())
+
+    def test_release_with_wrong_token_keeps_lease(self):
+        held = Lease("test", ttl=10)
+        self.assertTrue(held.acquire())
+
+        self.assertFalse(Lease("test", ttl=10, token="not-mine").release())
+        self.assertEqual(self.redis.get(LOCK_PREFIX + "test"), held.token.encode())
+        # владелец может отпустить и из другого процесса, зная токен
+        self.assertTrue(Lease("test", ttl=10, token=held.token).release())
+
+    def test_once_per_key(self):
+        self.assertTrue(once_per_key("tick:1", ttl=10))
+        self.assertFalse(once_per_key("tick:1", ttl=10))
+        self.assertTrue(once_per_key("tick:2", ttl=10))
+
+
+class TickOverlapTests(FakeRedisMixin, SimpleTestCase):
+    def test_tick_skipped_while_previous_holds_lease(self):
+        with mock.patch.object(tasks, "chord") as chord:
+            tasks.tick_reminders()
+            self.assertEqual(chord.call_count, 1)
+
+            # следующая минута, а предыдущий tick ещё не собрал итог
+            later = timezone.now() + timedelta(minutes=1)
+            with mock.patch.object(timezone, "now", return_value=later), self.assertLogs("core.tasks", "WARNING"):
+                tasks.tick_reminders()
+            self.assertEqual(chord.call_count, 1)
+
+        self.assertEqual(self.redis.hget(COUNTERS_KEY, "reminders_tick_overlapped"), b"1")
+        self.assertIsNone(self.redis.hget(COUNTERS_KEY, "reminders_tick_duplicate"))
+
+    def test_same_minute_counted_as_duplicate(self):
+        now = timezone.now()
+        with mock.patch.object(tasks, "chord") as chord, \
+                mock.patch.object(timezone, "now", return_value=now):
+            tasks.tick_reminders()
+            tasks.tick_reminders()
+        self.assertEqual(chord.call_count, 1)
+        self.assertEqual(self.redis.hget(COUNTERS_KEY, "reminders_tick_duplicate"), b"1")
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class ReminderTimeTests(SimpleTestCase):
+    """
+    Локальное время напоминания -> UTC на переводах часов и в зонах Etc/GMT±N.
+    """
+    berlin = resolve_timezone("Europe/Berlin")
+    at = dt_time(2, 30)
+
+    def test_spring_forward_gap_fires_right_after_the_switch(self):
+        # 29.03.2026 в 02:00 часы переведены на 03:00 — 02:30 не существует
+        self.assertEqual(local_to_utc(date(2026, 3, 29), self.at, self.berlin), utc(2026, 3, 29, 1, 30))
+        self.assertEqual(next_occurrence(self.berlin, self.at, utc(2026, 3, 28, 12)), utc(2026, 3, 29, 1, 30))
+        # на следующий день — уже по летнему времени
+        self.assertEqual(next_occurrence(self.berlin, self.at, utc(2026, 3, 29, 1, 30)), utc(2026, 3, 30, 0, 30))
+        self.assertEqual(latest_occurrence(self.berlin, self.at, utc(2026, 3, 29, 2)), utc(2026, 3, 29, 1, 30))
+
+    def test_autumn_fold_fires_once_on_first_occurrence(self):
+        # 25.10.2026 в 03:00 часы переведены на 02:00 — 02:30 бывает дважды
+        self.assertEqual(local_to_utc(date(2026, 10, 25), self.at, self.berlin), utc(2026, 10, 25, 0, 30))
+        self.assertEqual(next_occurrence(self.berlin, self.at, utc(2026, 10, 24, 12)), utc(2026, 10, 25, 0, 30))
+        # второе 02:30 (01:30 UTC) пропускаем — следующее срабатывание уже завтра
+        self.assertEqual(next_occurrence(self.berlin, self.at, utc(2026, 10, 25, 0, 30)), utc(2026, 10, 26, 1, 30))
+        self.assertEqual(latest_occurrence(self.berlin, self.at, utc(2026, 10, 25, 1, 45)), utc(2026, 10, 25, 0, 30))
+
+    def test_etc_gmt_zones_have_inverted_sign(self):
+        # Etc/GMT-3 — это UTC+3, Etc/GMT+5 — UTC-5
+        at = dt_time(8, 0)
+        day = date(2026, 6, 1)
+        self.assertEqual(local_to_utc(day, at, resolve_timezone("Etc/GMT-3")), utc(2026, 6, 1, 5))
+        self.assertEqual(local_to_utc(day, at, resolve_timezone("Etc/GMT+5")), utc(2026, 6, 1, 13))
+        self.assertEqual(
+            next_occurrence(resolve_timezone("Etc/GMT-3"), at, utc(2026, 6, 1, 5)),
+            next_occurrence(resolve_timezone("UTC+3"), at, utc(2026, 6, 1, 5)),
+        )
+
+
+class ReminderScheduleCreationTests(TestCase):
+    def test_new_settings_get_a_schedule(self):
+        user = TelegramUser.objects.create(telegram_id=4343)
+        UserSettings.objects.create(user=user, timezone="UTC", notify_missed_days=False)
+
+        schedule = dict(ReminderSchedule.objects.filter(user=user).values_list("kind", "next_run_at"))
+        self.assertEqual(set(schedule), {"morning", "evening", "missed"})
+        self.assertIsNotNone(schedule["morning"])
+        self.assertIsNotNone(schedule["evening"])
+        self.assertIsNone(schedule["missed"])
+
+    def test_get_user_settings_fallback_creates_schedule(self):
+        user = TelegramUser.objects.create(telegram_id=4344)
+        get_user_settings(user)
+        self.assertEqual(ReminderSchedule.objects.filter(user=user, next_run_at__isnull=False).count(), 3)
+
+
+@override_settings(REMINDER_CATCHUP_MINUTES=180)
+class ReminderShardTests(FakeRedisMixin, TestCase):
+    """
+    _process_shard: не больше одного напоминания вида в локальный день,
+    после простоя — только последнее срабатывание, старое — пропускается.
+    """
+    morning = datetime(2026, 3, 10, 8, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeTelegramServer(("127.0.0.1", 0)).start()
+        self.addCleanup(self.server.stop)
+        overridden = override_settings(TELEGRAM_BOT_TOKEN="123:fake", TELEGRAM_API_BASE_URL=self.server.base_url)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.addCleanup(telegram_sender.init_bot)
+        telegram_sender.init_bot()
+
+        self.user = TelegramUser.objects.create(telegram_id=4242)
+        UserSettings.objects.create(
+            user=self.user, timezone="UTC", morning_time=dt_time(8, 0), evening_enabled=False, notify_missed_days=False,
+        )
+
+    def schedule(self, next_run_at: datetime) -> ReminderSchedule:
+        row, _ = ReminderSchedule.objects.update_or_create(
+            user=self.user, kind=ReminderSchedule.KIND_MORNING, defaults={"next_run_at": next_run_at},
+        )
+        return row
+
+    def run_shard(self, now: datetime) -> dict:
+        return tasks._process_shard(0, 1, now.isoformat())
+
+    def sent_texts(self) -> list[str]:
+        return [m["text"] for m in self.server.messages if int(m["chat_id"]) == 4242]
+
+    def test_duplicated_and_overlapping_ticks_send_once(self):
+        row = self.schedule(self.morning)
+        first = self.run_shard(self.morning)
+        self.assertEqual(first["sent"], 1)
+
+        # наложившийся tick успел прочитать строку до того, как первый её передвинул:
+        # та же минута и следующая — в журнале уже есть запись за этот локальный день
+        for now in (self.morning, self.morning + timedelta(minutes=1)):
+            row.next_run_at = self.morning
+            row.save(update_fields=["next_run_at"])
+            report = self.run_shard(now)
+            self.assertEqual((report["sent"], report["duplicates"]), (0, 1))
+
+        self.assertEqual(self.sent_texts(), [tasks.MESSAGES[ReminderSchedule.KIND_MORNING]])
+        self.assertEqual(
+            list(SentReminder.objects.values_list("user_id", "kind", "local_date")),
+            [(self.user.id, ReminderSchedule.KIND_MORNING, date(2026, 3, 10))],
+        )
+
+    def test_catch_up_sends_only_latest_occurrence(self):
+        # воркеры простояли: срабатывания за два прошлых дня пропущены
+        row = self.schedule(self.morning - timedelta(days=2))
+        report = self.run_shard(self.morning + timedelta(minutes=30))
+
+        self.assertEqual((report["sent"], report["stale"]), (1, 0))
+        self.assertEqual(len(self.sent_texts()), 1)
+        self.assertEqual(
+            list(SentReminder.objects.values_list("local_date", flat=True)), [date(2026, 3, 10)],
+        )
+        row.refresh_from_db()
+        self.assertEqual(row.next_run_at, self.morning + timedelta(days=1))
+
+    def test_settings_changed_during_send_are_kept(self):
+        row = self.schedule(self.morning)
+        changed = self.morning + timedelta(hours=13)
+        flush = OutboundQueue.flush
+
+        def flush_while_user_changes_settings(queue):
+            # sync_user_reminders из хендлера настроек, пока шард отправляет пачку
+            ReminderSchedule.objects.filter(pk=row.pk).update(next_run_at=changed)
+            return flush(queue)
+
+        with mock.patch.object(OutboundQueue, "flush", flush_while_user_changes_settings):
+            self.assertEqual(self.run_shard(self.morning)["sent"], 1)
+        row.refresh_from_db()
+        self.assertEqual(row.next_run_at, changed)
+
+    def test_row_changed_after_selection_is_not_overwritten(self):
+        row = self.schedule(self.morning)
+        changed = self.morning + timedelta(hours=13)
+        load_completion = tasks._load_completion
+
+        def load_while_user_changes_settings(user_ids_by_day):
+            ReminderSchedule.objects.filter(pk=row.pk).update(next_run_at=changed)
+            return load_completion(user_ids_by_day)
+
+        with mock.patch.object(tasks, "_load_completion", load_while_user_changes_settings):
+            self.run_shard(self.morning)
+        row.refresh_from_db()
+        self.assertEqual(row.next_run_at, changed)
+
+    def test_reminder_path_creates_no_daily_entries(self):
+        UserSettings.objects.filter(user=self.user).update(notify_missed_days=True)
+        self.schedule(self.morning)
+        ReminderSchedule.objects.filter(user=self.user, kind=ReminderSchedule.KIND_MISSED).update(
+            next_run_at=self.morning + timedelta(hours=4),
+        )
+
+        self.run_shard(self.morning)
+        report = self.run_shard(self.morning + timedelta(hours=4))
+
+        # утро и проверка пропуска ушли, но ни одной пустой записи дня не появилось
+        self.assertEqual(report["sent"], 1)
+        self.assertEqual(len(self.sent_texts()), 2)
+        self.assertFalse(DailyEntry.objects.exists())
+
+    def test_completed_block_is_not_reminded(self):
+        DailyEntry.objects.create(user=self.user, date=date(2026, 3, 10), completed_morning=True)
+        self.schedule(self.morning)
+        report = self.run_shard(self.morning)
+        self.assertEqual((report["due"], report["sent"]), (0, 0))
+        self.assertEqual(DailyEntry.objects.count(), 1)
+
+    def test_invalid_timezone_is_reported_and_treated_as_utc(self):
+        UserSettings.objects.filter(user=self.user).update(timezone="Mars/Olympus")
+        self.schedule(self.morning)
+        report = self.run_shard(self.morning)
+
+        # 08:00 по UTC — напоминание ушло, а пояс попал в отчёт
+        self.assertEqual(report["sent"], 1)
+        self.assertEqual(report["invalid_timezones"], ["Mars/Olympus"])
+        with self.assertLogs("core.tasks", "WARNING") as logs:
+            summary = tasks.summarize_reminder_tick([report], self.morning.isoformat())
+        self.assertEqual(summary["invalid_timezones"], ["Mars/Olympus"])
+        self.assertTrue(any("Mars/Olympus" in line for line in logs.output))
+
+    def test_stale_reminder_is_skipped(self):
+        row = self.schedule(self.morning)
+        with self.assertLogs("core.tasks", "WARNING"):
+            report = self.run_shard(self.morning + timedelta(hours=4))
+
+        self.assertEqual((report["sent"], report["stale"]), (0, 1))
+        self.assertEqual(self.sent_texts(), [])
+        self.assertFalse(SentReminder.objects.exists())
+        row.refresh_from_db()
+        self.assertEqual(row.next_run_at, self.morning + timedelta(days=1))
+
+
+def _eager_chord(header):
+    # chord без брокера: шарды по очереди, затем итог — как сделал бы воркер
+    def run(body):
+        results = [sig.apply().get() for sig in header.tasks]
+        return body.clone(args=(results,)).apply()
+    return run
+
+
+@override_settings(REMINDER_SHARDS=2)
+class FailingShardTests(FakeRedisMixin, SimpleTestCase):
+    def test_failing_shard_still_releases_tick_lease(self):
+        def process(shard, shards, now_iso):
+            if shard == 1:
+                raise RuntimeError("db is down")
+            return tasks._idle_result(shard)
+
+        with mock.patch.object(tasks, "chord", _eager_chord), \
+                mock.patch.object(tasks, "_process_shard", side_effect=process), \
+                self.assertLogs("core.tasks", "ERROR"):
+            tasks.tick_reminders()
+
+        self.assertEqual(self.redis.hget(COUNTERS_KEY, "reminders_shard_failed"), b"1")
+        # итог собран, аренда отпущена — следующая минута не считается наложением
+        self.assertIsNone(self.redis.get(LOCK_PREFIX + tasks.TICK_LEASE))
+        self.assertTrue(Lease(tasks.TICK_LEASE, ttl=10).acquire())
+
+    def test_chord_errback_releases_tick_lease(self):
+        with mock.patch.object(tasks, "chord") as chord:
+            tasks.tick_reminders()
+        body = chord.return_value.call_args.args[0]
+        [errback] = body.options["link_error"]
+        self.assertEqual(errback["task"], tasks.release_tick_lease.name)
+
+        # chord упал целиком (например, воркер убит) — срабатывает errback
+        errback.apply()
+        self.assertIsNone(self.redis.get(LOCK_PREFIX + tasks.TICK_LEASE))
+
+
+@override_settings(METRICS_TOKEN="s3cret", METRICS_ALLOWED_IPS=["10.0.0.5"])
+class MetricsAccessTests(FakeRedisMixin, SimpleTestCase):
+    def test_forbidden_without_token_from_other_address(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.7").status_code, 403)
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+    def test_allowed_by_token(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+    def test_allowed_from_listed_address(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.5").status_code, 200)
+
+
+class _RecordingDispatcher:
+    """
+    Вместо настоящих хендлеров: запоминает порядок обработки по чатам.
+    """
+    bot = None
+    persistence = None
+
+    def __init__(self):
+        self.seen: dict[int, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def process_update(self, update):
+        # разная «длительность» обработки, чтобы перемешать чаты между потоками
+        time.sleep(random.random() / 1000)
+        with self._lock:
+            self.seen.setdefault(update.effective_chat.id, []).append(int(update.effective_message.text))
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="hook-secret")
+class TelegramWebhookTests(SimpleTestCase):
+    def setUp(self):
+        self.dispatcher = _RecordingDispatcher()
+        self.pipeline = UpdatePipeline(self.dispatcher, workers=4).start()
+        self.addCleanup(self.pipeline.stop)
+        patcher = mock.patch("core.views.get_pipeline", return_value=self.pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data, secret="hook-secret"):
+        headers = {"HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN": secret} if secret else {}
+        return self.client.post("/telegram/webhook", json.dumps(data), content_type="application/json", **headers)
+
+    @staticmethod
+    def update(update_id: int, chat_id: int, text: str) -> dict:
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1760000000,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "U"},
+                "text": text,
+            },
+        }
+
+    def test_updates_of_one_chat_processed_in_order(self):
+        chats = list(range(100, 110))
+        recorded = [self.update(n + 1, chats[n % len(chats)], str(n // len(chats))) for n in range(300)]
+        for data in recorded:
+            self.assertEqual(self.post(data).status_code, 200)
+        self.pipeline.join()
+
+        self.assertEqual(sorted(self.dispatcher.seen), chats)
+        for chat_id in chats:
+            self.assertEqual(self.dispatcher.seen[chat_id], list(range(30)))
+
+    def test_rejects_wrong_or_missing_secret(self):
+        self.assertEqual(self.post(self.update(1, 100, "0"), secret="wrong").status_code, 403)
+        self.assertEqual(self.post(self.update(1, 100, "0"), secret=None).status_code, 403)
+        with override_settings(TELEGRAM_WEBHOOK_SECRET=None), self.assertLogs("core.views", "ERROR"):
+            self.assertEqual(self.post(self.update(1, 100, "0")).status_code, 403)
+        self.pipeline.join()
+        self.assertEqual(self.dispatcher.seen, {})
+
+    def test_non_object_payload_is_bad_request(self):
+        for payload in ([], 1, "update", None):
+            self.assertEqual(self.post(payload).status_code, 400)
+
+
+class StatePersistenceTests(SimpleTestCase):
+    def setUp(self):
+        self.store = RedisStateStore(client=fakeredis.FakeRedis())
+
+    def persistence(self) -> StatePersistence:
+        persistence = StatePersistence(self.store)
+        persistence.get_conversations("evening")
+        return persistence
+
+    def test_state_visible_to_other_process_without_flush(self):
+        first, second = self.persistence(), self.persistence()
+        key = (42, 42)
+
+        first.update_conversation("evening", key, 2)
+        first.update_user_data(42, {"evening_step": 1})
+
+        user_data = {}
+        second.refresh_user_data(42, user_data)
+        self.assertEqual(second.get_conversations("evening")[key], 2)
+        self.assertEqual(user_data, {"evening_step": 1})
+
+        # диалог завершился в первом процессе — второй его тоже снимает
+        first.update_conversation("evening", key, None)
+        second.refresh_user_data(42, user_data)
+        self.assertNotIn(key, second.get_conversations("evening"))
+
+    def test_failed_write_is_retried(self):
+        persistence = self.persistence()
+        with mock.patch.object(self.store, "save", side_effect=ConnectionError), \
+                self.assertLogs("core.bot.persistence", "ERROR"):
+            persistence.update_conversation("evening", (7, 7), 1)
+        self.assertEqual(self.store.load(7), {})
+
+        persistence.flush()
+        self.assertEqual(self.store.load(7), {conv_field("evening", (7, 7)): "1"})
+
+
+class BotFlowMixin(FakeRedisMixin):
+    """
+    Настоящие хендлеры бота против фейкового Telegram API; ответы бота — self.replies().
+    """
+    chat_id = 555
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeTelegramServer(("127.0.0.1", 0)).start()
+        self.addCleanup(self.server.stop)
+        overridden = override_settings(
+            TELEGRAM_BOT_TOKEN="123:fake",
+            TELEGRAM_API_BASE_URL=self.server.base_url,
+            BOT_PERSISTENCE="",
+            USER_CACHE_TTL=0,
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        questions.invalidate()
+        self.addCleanup(questions.invalidate)
+        self.dispatcher = build_updater(workers=1).dispatcher
+        self.update_id = 0
+
+    def send(self, text: str) -> None:
+        self.update_id += 1
+        self.dispatcher.process_update(Update.de_json({
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.update_id,
+                "date": 1760000000,
+                "chat": {"id": self.chat_id, "type": "private"},
+                "from": {"id": self.chat_id, "is_bot": False, "first_name": "U"},
+                "text": text,
+            },
+        }, self.dispatcher.bot))
+
+    def replies(self) -> list[str]:
+        return [m["text"] for m in self.server.messages]
+
+    def evening_answers(self) -> list[str]:
+        return list(
+            Answer.objects.filter(daily_entry__user__telegram_id=self.chat_id, period=QuestionTemplate.PERIOD_EVENING)
+            .order_by("id").values_list("answer_text", flat=True)
+        )
+
+
+class RouterParityTests(SimpleTestCase):
+    """
+    Словарь ExactTextHandler выбирает тот же колбэк, что и прежняя цепочка регулярок.
+    """
+
+    @override_settings(TELEGRAM_BOT_TOKEN="123:fake", BOT_PERSISTENCE="")
+    def test_router_matches_regex_chain(self):
+        chosen = {}
+        for variant in ("regex", "router"):
+            handlers = build_updater(workers=1).dispatcher.handlers[0]
+            if variant == "regex":
+                handlers = bench_router._legacy(handlers)
+                self.assertFalse(any(isinstance(h, ExactTextHandler) for h in handlers))
+            conversations = {h.name: h for h in handlers if hasattr(h, "conversations")}
+
+            chosen[variant] = []
+            for n, (text, state) in enumerate(bench_router.SAMPLES):
+                update = bench_router._update(n, 900, text)
+                for conv in conversations.values():
+                    conv.conversations.pop((900, 900), None)
+                if state:
+                    conversations[state[0]].conversations[(900, 900)] = state[1]
+                handler = check = None
+                for candidate in handlers:
+                    check = candidate.check_update(update)
+                    if check is not None and check is not False:
+                        handler = candidate
+                        break
+                chosen[variant].append(bench_router._callback(handler, check))
+
+        self.assertEqual(chosen["router"], chosen["regex"])
+        self.assertIn("settings_menu", chosen["router"])
+
+
+class WebhookPollingParityTests(BotFlowMixin, TransactionTestCase):
+    """
+    Webhook (UpdatePipeline) и polling (dispatcher.process_update) — один и тот же
+    диспетчер: на одинаковые сообщения бот отвечает одинаково.
+    """
+    SCRIPT = ["/start", "Настройки", settings_flow.TOGGLE_MISSED_BUTTON, BACK_BUTTON, "Статистика", BACK_BUTTON,
+              "просто текст"]
+
+    def update(self, update_id: int, chat_id: int, text: str) -> dict:
+        message = {
+            "message_id": update_id,
+            "date": 1760000000,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "U"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return {"update_id": update_id, "message": message}
+
+    def test_same_replies(self):
+        polling_chat, webhook_chat = 801, 802
+        for n, text in enumerate(self.SCRIPT, start=1):
+            self.dispatcher.process_update(Update.de_json(self.update(n, polling_chat, text), self.dispatcher.bot))
+
+        pipeline = UpdatePipeline(self.dispatcher, workers=2).start()
+        for n, text in enumerate(self.SCRIPT, start=100):
+            pipeline.submit_json(self.update(n, webhook_chat, text))
+        pipeline.join()
+        pipeline.stop()
+
+        replies = {polling_chat: [], webhook_chat: []}
+        for message in self.server.messages:
+            replies[int(message["chat_id"])].append(message["text"])
+        self.assertGreaterEqual(len(replies[polling_chat]), len(self.SCRIPT) - 1)
+        self.assertEqual(replies[webhook_chat], replies[polling_chat])
+
+
+class EveningFlowTests(BotFlowMixin, TestCase):
+    def test_steps_follow_number_of_questions(self):
+        questions.ensure_defaults()
+        QuestionTemplate.objects.filter(code__in=["gratitude_2", "gratitude_3"]).update(is_active=False)
+        questions.invalidate()
+
+        for text in ["Вечер", "маме", "прогулке"]:
+            self.send(text)
+
+        self.assertEqual(self.evening_answers(), ["маме", "прогулке"])
+        self.assertTrue(DailyEntry.objects.get(user__telegram_id=self.chat_id).completed_evening)
+        self.assertIn("✅ Вечер заполнен", self.replies()[-1])
+
+    def test_no_active_questions(self):
+        questions.ensure_defaults()
+        QuestionTemplate.objects.filter(period=QuestionTemplate.PERIOD_EVENING).update(is_active=False)
+        questions.invalidate()
+
+        self.send("Вечер")
+        self.send("просто текст")
+
+        self.assertEqual(self.replies(), [evening_flow.NO_QUESTIONS_TEXT])
+        self.assertEqual(self.evening_answers(), [])
+        self.assertFalse(DailyEntry.objects.get(user__telegram_id=self.chat_id).completed_evening)
+
+
+@override_settings(HISTORY_CACHE_TTL=3600)
+class AnswerHistoryCacheTests(BotFlowMixin, TestCase):
+    def test_each_answer_drops_cached_day(self):
+        for start in ("Утро", "Вечер"):
+            with self.subTest(start=start):
+                self.send(start)
+                entry = DailyEntry.objects.get(user__telegram_id=self.chat_id)
+                history.set_cached(entry.user_id, entry.date, "день без новых ответов")
+
+                # блок не закончен — кэш дня всё равно сброшен
+                self.send("ответ")
+                self.assertIsNone(history.get_cached(entry.user_id, entry.date))
+                entry.refresh_from_db()
+                self.assertFalse(entry.completed_morning or entry.completed_evening)
+                self.send(BACK_BUTTON)
+
+
+@override_settings(BOT_BUFFER_ANSWERS=True)
+class BufferedEveningTests(BotFlowMixin, TestCase):
+    def test_failed_commit_keeps_step(self):
+        self.send("Вечер")
+        for text in ["маме", "солнцу", "отдыху"]:
+            self.send(text)
+
+        with mock.patch("core.services.answers.update_streak_on_activity", side_effect=RuntimeError), \
+                self.assertLogs("core.bot.handlers.evening_flow", "ERROR"):
+            self.send("встрече")
+        self.assertEqual(self.replies()[-1], answer_buffer.COMMIT_FAILED_TEXT)
+        self.assertEqual(self.evening_answers(), [])
+
+        # тот же шаг: последний ответ принимается заново, без дубликата
+        self.send("встрече")
+        self.assertEqual(self.evening_answers(), ["маме", "солнцу", "отдыху", "встрече"])
+        self.assertIn("✅ Вечер заполнен", self.replies()[-1])
+
+
+class StatisticsScreensTests(BotFlowMixin, TestCase):
+    def screens(self) -> list[str]:
+        self.server.reset()
+        for text in ["Статистика", statistics_flow.STATS_CHART_BUTTON, statistics_flow.STATS_WEEKDAYS_BUTTON]:
+            self.send(text)
+        return self.replies()[1:]
+
+    def test_rollup_and_direct_queries_agree(self):
+        user = TelegramUser.objects.create(telegram_id=self.chat_id, first_name="U")
+        today = user_local_date(user)
+        for i, (morning, evening) in enumerate([(True, True), (True, False), (False, True), (False, False)] * 5):
+            entry, _ = DailyEntry.objects.update_or_create(
+                user=user, date=today - timedelta(days=i * 3),
+                defaults={"completed_morning": morning, "completed_evening": evening},
+            )
+            stats_rollup.entry_changed(entry)
+
+        with override_settings(STATS_USE_ROLLUP=True):
+            from_rollup = self.screens()
+        with override_settings(STATS_USE_ROLLUP=False), \
+                mock.patch.object(stats_rollup, "get_rollup", side_effect=AssertionError("rollup is off")):
+            direct = self.screens()
+
+        self.assertEqual(len(from_rollup), 2)
+        self.assertIn("🟩", from_rollup[0])
+        self.assertIn("🟨", from_rollup[0])
+        self.assertEqual(from_rollup, direct)
+
+
+@override_settings(USER_CACHE_TTL=60)
+class StatisticsQueryCountTests(TestCase):
+    """
+    Пользователь из user_cache: запросы экрана — только сами цифры.
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.update = mock.Mock(effective_user=mock.Mock(id=7070, username=None, first_name="U", last_name=None))
+        user = get_or_create_tg_user(self.update)
+        today = user_local_date(user)
+        for i in range(10):
+            entry = DailyEntry.objects.create(
+                user=user, date=today - timedelta(days=i), completed_morning=True, completed_evening=i % 2 == 0,
+            )
+            stats_rollup.entry_changed(entry)
+
+    def assert_screen_queries(self, handler, n: int):
+        with self.assertNumQueries(n):
+            self.assertEqual(handler(self.update, None), statistics_flow.STATS_MENU)
+
+    def test_with_rollup(self):
+        with override_settings(STATS_USE_ROLLUP=True):
+            self.assert_screen_queries(statistics_flow.statistics_general, 1)
+            self.assert_screen_queries(statistics_flow.statistics_fill_chart, 1)
+            self.assert_screen_queries(statistics_flow.statistics_weekdays, 1)
+
+    def test_with_aggregates(self):
+        with override_settings(STATS_USE_ROLLUP=False):
+            self.assert_screen_queries(statistics_flow.statistics_general, 2)
+            self.assert_screen_queries(statistics_flow.statistics_fill_chart, 1)
+            self.assert_screen_queries(statistics_flow.statistics_weekdays, 1)
+
+
+class SearchFallbackTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(telegram_id=777)
+        texts = ["Благодарна маме за ужин", "Долгая прогулка с мамой в парке", "Тихий вечер с книгой"]
+        for i, text in enumerate(texts):
+            entry = DailyEntry.objects.create(user=self.user, date=date(2026, 1, 1) + timedelta(days=i))
+            Answer.objects.create(
+                daily_entry=entry, question_text="За что ты сегодня благодарна?", answer_text=text,
+                period=QuestionTemplate.PERIOD_EVENING,
+            )
+
+    def found(self, text: str, **kwargs) -> list[str]:
+        answers, _ = search.search_answers(self.user.id, text, **kwargs)
+        return [a.answer_text for a in answers]
+
+    def test_matches_word_forms_newest_first(self):
+        self.assertFalse(search.full_text_available())
+        self.assertEqual(self.found("мама"), ["Долгая прогулка с мамой в парке", "Благодарна маме за ужин"])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.found("мамы прогулки"), ["Долгая прогулка с мамой в парке"])
+        self.assertEqual(self.found("мама книга"), [])
+
+    def test_question_text_and_paging(self):
+        answers, has_more = search.search_answers(self.user.id, "благодарна", page=0, page_size=2)
+        self.assertEqual(len(answers), 2)
+        self.assertTrue(has_more)
+        answers, has_more = search.search_answers(self.user.id, "благодарна", page=1, page_size=2)
+        self.assertEqual(len(answers), 1)
+        self.assertFalse(has_more)
+
+    def test_other_users_answers_not_found(self):
+        other = TelegramUser.objects.create(telegram_id=778)
+        self.assertEqual(search.search_answers(other.id, "мама")[0], [])
+
+
+class EveningTopicsTests(BotFlowMixin, TestCase):
+    def terms(self) -> dict[str, int]:
+        return dict(TermCount.objects.filter(user__telegram_id=self.chat_id).values_list("word", "count"))
+
+    def test_partial_evening_counted_and_redo_clears(self):
+        self.send("Вечер")
+        self.send("маме и папе")
+        self.send(BACK_BUTTON)
+        # вечер брошен на середине, но ответ записан — и темы уже посчитаны
+        self.assertEqual(self.terms(), {"маме": 1, "папе": 1})
+
+        self.send("Вечер")
+        for text in ["маме", "прогулке", "книге", "маме снова"]:
+            self.send(text)
+        self.assertEqual(self.terms()["маме"], 3)
+
+        self.send(evening_flow.EVENING_REDO_BUTTON)
+        self.assertEqual(self.terms(), {})
+        self.assertEqual(self.evening_answers(), [])
+        self.assertEqual(self.replies()[-1], questions.for_period(QuestionTemplate.PERIOD_EVENING)[0].text)
+
+
+class TopTermsTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(telegram_id=888)
+        self.day = date(2026, 3, 1)
+
+    def add(self, days_ago: int, term: str, word: str, count: int):
+        TermCount.objects.create(user=self.user, date=self.day - timedelta(days=days_ago), term=term, word=word, count=count)
+
+    def top(self):
+        return topics.top_terms(self.user.id, self.day - timedelta(days=29), self.day)
+
+    def test_shows_most_frequent_form(self):
+        # по алфавиту победила бы «маму», по частоте — «маме»
+        self.add(0, "мам", "маме", 3)
+        self.add(1, "мам", "маму", 1)
+        self.add(2, "мам", "маме", 2)
+        self.add(0, "прогулк", "прогулке", 2)
+        self.assertEqual(self.top(), [("маме", 6), ("прогулке", 2)])
+
+    def test_rows_before_normalization_are_merged(self):
+        self.add(0, "мам", "маму", 2)
+        # строки до 0009: слово целиком, без формы
+        self.add(1, "маме", "", 3)
+        self.add(1, "прогулка", "", 1)
+        self.assertEqual(self.top(), [("маме", 5), ("прогулка", 1)])
+
+
+class AnswerPeriodBackfillTests(TestCase):
+    migration = importlib.import_module("core.migrations.0010_answer_period")
+
+    def test_baseline_evening_answers_without_templates(self):
+        # так вечер писался до реестра вопросов: без шаблона, а шаблонов вечера в БД ещё нет
+        self.assertFalse(QuestionTemplate.objects.exists())
+        user = TelegramUser.objects.create(telegram_id=999)
+        entry = DailyEntry.objects.create(user=user, date=date(2025, 5, 1))
+        evening = self.migration.LEGACY_QUESTIONS["evening"]
+        for text in evening:
+            Answer.objects.create(daily_entry=entry, question=None, question_text=text, answer_text="…", period="")
+        Answer.objects.create(
+            daily_entry=entry, question=None, question_text=self.migration.LEGACY_QUESTIONS["morning"][1],
+            answer_text="…", period="",
+        )
+        Answer.objects.create(daily_entry=entry, question=None, question_text="Что-то ещё?", answer_text="…", period="")
+
+        self.migration.backfill_period(django_apps, None)
+
+        periods = dict(Answer.objects.values_list("question_text", "period"))
+        self.assertEqual([periods[text] for text in evening], ["evening"] * 4)
+        self.assertEqual(periods[self.migration.LEGACY_QUESTIONS["morning"][1]], "morning")
+        self.assertEqual(periods["Что-то ещё?"], "")
+
+
+@override_settings(HISTORY_CACHE_TTL=3600)
+class HistoryCacheTests(FakeRedisMixin, SimpleTestCase):
+    day = date(2026, 2, 1)
+
+    def test_roundtrip_and_invalidation(self):
+        history.set_cached(1, self.day, "📅 01.02.2026")
+        self.assertEqual(history.get_cached(1, self.day), "📅 01.02.2026")
+        self.assertGreater(self.redis.ttl(history._key(1)), 0)
+
+        history.day_changed(1, self.day)
+        self.assertIsNone(history.get_cached(1, self.day))
+
+    def test_render_version_is_part_of_key(self):
+        history.set_cached(1, self.day, "старый вид")
+        with mock.patch.object(history, "RENDER_VERSION", history.RENDER_VERSION + 1):
+            self.assertIsNone(history.get_cached(1, self.day))
+            history.set_cached(1, self.day, "новый вид")
+            self.assertEqual(history.get_cached(1, self.day), "новый вид")
+        self.assertEqual(history.get_cached(1, self.day), "старый вид")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(telegram_id=777)
+
+    def test_weeks_only_period_is_not_empty(self):
+        WeeklyCycle.objects.create(
+            user=self.user, week_start=date(2026, 3, 2), week_end=date(2026, 3, 8), final_reflection="Хорошая неделя",
+        )
+        with export.export_file(self.user.id, date(2026, 3, 1), date(2026, 3, 31), "md") as (document, counts):
+            body = document.read().decode()
+        self.assertEqual((counts.answers, counts.weeks), (0, 1))
+        self.assertFalse(counts.empty)
+        self.assertIn("Хорошая неделя", body)
+
+    def test_markdown_escapes_user_text(self):
+        entry = DailyEntry.objects.create(user=self.user, date=date(2026, 3, 3))
+        Answer.objects.create(
+            daily_entry=entry, period="morning", question_text="Что *важно*?",
+            answer_text="#1 _дело_\n- пункт\n2. шаг",
+        )
+        out = io.StringIO()
+        counts = export.write_export(out, self.user.id, None, date(2026, 3, 31), "md")
+
+        self.assertEqual(counts, export.ExportCounts(answers=1, weeks=0))
+        self.assertIn("**Что \\*важно\\*?**", out.getvalue())
+        self.assertIn("\\#1 \\_дело\\_\n\\- пункт\n2\\. шаг", out.getvalue())
+
+    def test_command_defaults_to_users_local_today(self):
+        UserSettings.objects.create(user=self.user, timezone="Etc/GMT-12")
+        # на сервере (UTC) ещё 15.03, у пользователя (UTC+12) уже 16.03
+        now = datetime(2026, 3, 15, 20, 0, tzinfo=dt_timezone.utc)
+        entry = DailyEntry.objects.create(user=self.user, date=date(2026, 3, 16))
+        Answer.objects.create(daily_entry=entry, period="morning", question_text="?", answer_text="утро на востоке")
+
+        with tempfile.NamedTemporaryFile("r", encoding="utf-8", suffix=".txt") as out, \
+                mock.patch.object(timezone, "now", return_value=now):
+            call_command("export_history", "777", "--format", "txt", "--output", out.name, stderr=io.StringIO())
+            body = out.read()
+        self.assertIn("утро на востоке", body)
+        self.assertIn("по 16.03.2026", body)
+
+
+@override_settings(USER_CACHE_TTL=60)
+class UserCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        tg = mock.Mock(id=6060, username="u", first_name="U", last_name=None)
+        self.update = mock.Mock(effective_user=tg)
+
+    def test_cached_hit_makes_no_queries(self):
+        get_or_create_tg_user(self.update)
+        with self.assertNumQueries(0):
+            user = get_or_create_tg_user(self.update)
+            self.assertEqual(get_user_settings(user).timezone, "Europe/Moscow")
+
+    def test_setting_change_rereads_row_instead_of_cached_copy(self):
+        user = get_or_create_tg_user(self.update)
+        # другой процесс (или админка) поменял вечер, наш кэш об этом не знает
+        UserSettings.objects.filter(user=user).update(timezone="UTC", evening_time=dt_time(22, 15))
+        self.assertEqual(get_or_create_tg_user(self.update).settings.evening_time, dt_time(21, 0))
+
+        with mock.patch.object(timezone, "now", return_value=utc(2026, 3, 10, 12)):
+            settings_flow.toggle_morning(self.update, None)
+
+        fresh = UserSettings.objects.get(user=user)
+        self.assertEqual((fresh.morning_enabled, fresh.evening_time), (False, dt_time(22, 15)))
+        schedule = dict(ReminderSchedule.objects.filter(user=user).values_list("kind", "next_run_at"))
+        self.assertIsNone(schedule["morning"])
+        self.assertEqual(schedule["evening"], utc(2026, 3, 10, 22, 15))
+        self.assertIsNone(user_cache.get(6060))
 
-# Create your tests here.
@@ -1,3 +1,66 @@
-from django.shortcuts import render
+# gratitude_bot/core/views.py
+import hmac
+import json
+import logging
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from core.bot.webhook import PipelineFull, get_pipeline
+from core.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _metrics_allowed(request) -> bool:
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        got = request.headers.get("Authorization", "")
+        if hmac.compare_digest(got, f"Bearer {token}"):
+            return True
+    return request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ())
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики планировщика для Prometheus (scrape_config: metrics_path=/metrics).
+    Доступ — по METRICS_TOKEN или с адресов из METRICS_ALLOWED_IPS.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    """
+    Принимает обновление от Telegram и сразу отвечает 200;
+    обработка идёт в фоне в UpdatePipeline (см. core.bot.webhook).
+    """
+    secret = getattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+    if not secret:
+        # без секрета любой, кто знает адрес, может слать боту «обновления»
+        logger.error("TELEGRAM_WEBHOOK_SECRET is not set, rejecting webhook update")
+        return HttpResponseForbidden()
+    got = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(got, secret):
+        return HttpResponseForbidden()
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+    if not isinstance(data, dict):
+        return HttpResponse(status=400)
+
+    try:
+        get_pipeline().submit_json(data)
+    except PipelineFull:
+        # не 200 — Telegram сам повторит доставку чуть позже
+        logger.warning("update pipeline is full, asking Telegram to retry update %s", data.get("update_id"))
+        return HttpResponse(status=503)
+    return HttpResponse()
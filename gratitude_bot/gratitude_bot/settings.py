@@ -11,6 +11,48 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Пусто = api.telegram.org; для локального фейкового сервера: http://127.0.0.1:8081/bot
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+# Пул keep-alive соединений отправщика напоминаний (на процесс воркера)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "8"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+# Лимиты Telegram для очереди исходящих (core.services.outbox)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # сообщений/сек на бота
+TELEGRAM_PER_CHAT_INTERVAL = 1.0  # секунд между сообщениями в один чат
+TELEGRAM_SEND_MAX_RETRIES = 3
+# Webhook: публичный адрес, на котором доступен /telegram/webhook этого приложения
+# (пусто = бот работает через polling, python manage.py run_bot)
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# /metrics отдаётся только с этих адресов (REMOTE_ADDR) или по токену
+# (Authorization: Bearer <токен>, в Prometheus — authorization.credentials)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+# Как обрабатывать обновления: "threads" — поток закреплён за чатом (core.bot.webhook),
+# "asyncio" — event loop + общий пул потоков для хендлеров (core.bot.aio_runtime)
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threads")
+# Потоки обработки обновлений (webhook и asyncio-рантайм)
+BOT_UPDATE_WORKERS = int(os.getenv("BOT_UPDATE_WORKERS", "8"))
+BOT_UPDATE_QUEUE_SIZE = int(os.getenv("BOT_UPDATE_QUEUE_SIZE", "1000"))
+# Где хранить user_data и шаги диалогов: "redis" (если не отвечает — БД), "db", "" = только память
+BOT_PERSISTENCE = os.getenv("BOT_PERSISTENCE", "redis")
+BOT_PERSISTENCE_FLUSH_INTERVAL = 0.2  # секунд; повтор записи состояния, если хранилище не ответило
+BOT_STATE_TTL_DAYS = 30  # брошенные диалоги в Redis удаляются сами
+# Копить ответы блока в состоянии диалога и записывать одной транзакцией (core.services.answers)
+BOT_BUFFER_ANSWERS = os.getenv("BOT_BUFFER_ANSWERS", "0") == "1"
+# Кэш пользователя+настроек в памяти процесса бота (core.services.user_cache); 0 = выключен
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = 10000
+# Как часто процесс сверяет версию шаблонов вопросов (core.services.questions), секунд
+QUESTION_REGISTRY_CHECK_SECONDS = float(os.getenv("QUESTION_REGISTRY_CHECK_SECONDS", "5"))
+# «Общая статистика» из сводки StatsRollup (1 запрос) или агрегатами по таблицам (2 запроса)
+STATS_USE_ROLLUP = os.getenv("STATS_USE_ROLLUP", "1") == "1"
+# Нормализация слов для тем и поиска без Postgres: "stem" (Snowball) или "lower" (core.services.normalize)
+TEXT_NORMALIZER = os.getenv("TEXT_NORMALIZER", "stem")
+TEXT_STEM_CACHE_SIZE = 50000  # слов в LRU-кэше основ на процесс
+# Сколько живёт в Redis готовый текст прошедшего дня «Истории» (core.services.history), секунд; 0 = без кэша
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "86400"))
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,6 +79,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
 ]
 
@@ -130,11 +173,28 @@ CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
 CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/1"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
+# Redis для блокировок/счётчиков (по умолчанию тот же, что у брокера)
+REDIS_URL = os.getenv("REDIS_URL", CELERY_BROKER_URL)
 
 
+# На сколько параллельных подзадач tick_reminders делит наступившие напоминания
+REMINDER_SHARDS = int(os.getenv("REMINDER_SHARDS", "4"))
+# Как шард отправляет пачку: "sync" (по одному) или "async" (asyncio, до N запросов сразу).
+# Для async держите TELEGRAM_POOL_SIZE >= REMINDER_SEND_CONCURRENCY.
+REMINDER_SEND_MODE = os.getenv("REMINDER_SEND_MODE", "sync")
+REMINDER_SEND_CONCURRENCY = int(os.getenv("REMINDER_SEND_CONCURRENCY", "8"))
+# После простоя воркеров догоняем пропущенные напоминания не старше этого окна
+REMINDER_CATCHUP_MINUTES = int(os.getenv("REMINDER_CATCHUP_MINUTES", "180"))
+# TTL аренды tick/шарда в Redis: дольше — tick считается зависшим, аренда истекает сама
+REMINDER_TICK_LEASE_SECONDS = int(os.getenv("REMINDER_TICK_LEASE_SECONDS", "300"))
+
 CELERY_BEAT_SCHEDULE = {
     "tick-reminders-every-minute": {
         "task": "core.tasks.tick_reminders",
         "schedule": crontab(minute="*"),
     },
+    "purge-sent-reminders-daily": {
+        "task": "core.tasks.purge_sent_reminders",
+        "schedule": crontab(minute=30, hour=3),
+    },
 }
\ No newline at end of file